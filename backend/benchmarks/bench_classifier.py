@@ -0,0 +1,106 @@
+"""Compare the LLM and embedding section classifiers on a document.
+
+Usage (from backend/, with the Azure settings in .env):
+
+    python -m benchmarks.bench_classifier documents/AdminProvisions.pdf
+
+or offline, on a synthetic document and the fake Azure clients:
+
+    python -m benchmarks.bench_classifier --fake --paragraphs 300 --tables 10 --latency 0.2
+
+Reports wall-clock throughput for each classifier, how many chunks the
+embedding classifier escalated to the LLM, and the agreement rate between
+the two labelings.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from pipeline.clients import create_document_client, create_openai_client
+from pipeline.fakes import FakeAsyncAzureOpenAI, FakeDocumentIntelligenceClient, make_text_pdf, synthetic_pages
+from pipeline.pipeline import DocumentProcessor
+
+
+def labels_by_chunk(section_chunks):
+    labels = {}
+    for section, chunks in section_chunks.items():
+        for chunk in chunks:
+            labels[(chunk.text, chunk.table_index)] = section
+    return labels
+
+
+async def compare_classifiers(processor, content, tables):
+    # Count the chunks the embedding pass leaves for the LLM as it runs,
+    # rather than embedding everything again afterwards
+    embedding_classifier = processor.embedding_classifier
+    classify = embedding_classifier.classify
+    escalated = 0
+
+    async def counting_classify(texts):
+        nonlocal escalated
+        labels, margins = await classify(texts)
+        escalated += labels.count(None)
+        return labels, margins
+
+    embedding_classifier.classify = counting_classify
+    results = {}
+    for classifier in ('llm', 'embedding'):
+        start = time.perf_counter()
+        section_chunks = await processor._classify_chunks(content, tables, classifier=classifier)
+        elapsed = time.perf_counter() - start
+        results[classifier] = (labels_by_chunk(section_chunks), elapsed)
+
+    llm_labels, _ = results['llm']
+    embedding_labels, _ = results['embedding']
+    agreed = sum(llm_labels[key] == embedding_labels.get(key) for key in llm_labels)
+    return {
+        'chunks': len(content),
+        'agreement': agreed / len(llm_labels) if llm_labels else 1.0,
+        'escalated': escalated,
+        'seconds': {name: elapsed for name, (_, elapsed) in results.items()},
+    }
+
+
+async def run(pdf_path, doc_client, openai_client):
+    processor = DocumentProcessor(doc_client, openai_client)
+    content, tables = await asyncio.to_thread(processor._extract_content, pdf_path)
+    await processor._summarize_tables(tables)
+    return await compare_classifiers(processor, content, tables)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pdf_path', nargs='?', help='document to classify; not needed with --fake')
+    parser.add_argument('--fake', action='store_true', help='use a synthetic PDF and the fake Azure clients')
+    parser.add_argument('--paragraphs', type=int, default=300)
+    parser.add_argument('--tables', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per fake OpenAI call')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if not args.fake and not args.pdf_path:
+        parser.error('pdf_path is required unless --fake is given')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.fake:
+            pdf_path = os.path.join(tmp, 'synthetic.pdf')
+            with open(pdf_path, 'wb') as f:
+                f.write(make_text_pdf(synthetic_pages(args.paragraphs, args.tables, seed=args.seed)))
+            doc_client = FakeDocumentIntelligenceClient(seed=args.seed)
+            openai_client = FakeAsyncAzureOpenAI(latency=args.latency, seed=args.seed)
+        else:
+            pdf_path = args.pdf_path
+            doc_client = create_document_client()
+            openai_client = create_openai_client()
+        report = asyncio.run(run(pdf_path, doc_client, openai_client))
+
+    print(f"Chunks: {report['chunks']}")
+    for name, seconds in report['seconds'].items():
+        print(f"{name:>9}: {seconds:.2f}s ({report['chunks'] / seconds:.1f} chunks/s)")
+    print(f"Escalated to LLM: {report['escalated']}")
+    print(f"Agreement: {report['agreement']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark page-range sharded layout analysis against a single request, offline.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_layout_shards --pages 200 --shard-pages 25
+
+Uses FakeDocumentIntelligenceClient, whose analysis time grows linearly with
+page count, and checks the sharded result matches the single-pass one.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from config import settings
+from pipeline.fakes import FakeDocumentIntelligenceClient, make_text_pdf
+from pipeline.pipeline import DocumentProcessor
+
+
+def synthetic_pages(n):
+    pages = []
+    for i in range(n):
+        lines = [f'Section {i} flood and port update', f'Fire station {i % 7} staffing report']
+        if i % 3 == 0:
+            lines += ['Facility | Staff | Budget', f'Depot {i} | {i % 40} | ${i * 1000}']
+        pages.append(lines)
+    return pages
+
+
+def timed_layout(processor, pdf_path, shard_pages):
+    settings.LAYOUT_SHARD_PAGES = shard_pages
+    start = time.perf_counter()
+    result = processor._analyze_layout(pdf_path)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--shard-pages', type=int, default=25)
+    parser.add_argument('--concurrency', type=int, default=settings.LAYOUT_SHARD_CONCURRENCY)
+    parser.add_argument('--latency-per-page', type=float, default=0.01)
+    args = parser.parse_args()
+
+    settings.LAYOUT_SHARD_CONCURRENCY = args.concurrency
+    processor = DocumentProcessor(FakeDocumentIntelligenceClient(latency_per_page=args.latency_per_page), None)
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, 'synthetic.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(make_text_pdf(synthetic_pages(args.pages)))
+
+        single, single_seconds = timed_layout(processor, pdf_path, 0)
+        sharded, sharded_seconds = timed_layout(processor, pdf_path, args.shard_pages)
+    assert sharded == single, "sharded layout differs from single-pass layout"
+
+    print(f"{args.pages} pages, {len(single[0])} chunks, {len(single[1])} tables")
+    print(f"single request: {single_seconds:.2f}s")
+    print(f"sharded ({args.shard_pages} pages x {args.concurrency} in flight): "
+          f"{sharded_seconds:.2f}s ({single_seconds / sharded_seconds:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark the memory held by extracted content and tables.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_memory --paragraphs 20000 --tables 50 --rows 500 --columns 8
+
+Builds the same synthetic extraction result twice, once in the old layout
+(a dict per chunk, a {header: cell} dict per table row) and once as Chunk
+and columnar Table objects, and reports the memory each allocates, measured
+with tracemalloc, plus the size and time of serializing it to JSON for the
+layout cache.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from pipeline.content import Chunk, Table
+
+
+def cell_text(t, r, c):
+    # Distinct strings per cell, as cell text parsed out of a layout result would be
+    return f'{t}:{r}:{c} value'
+
+
+def build_dicts(args):
+    content = [{'text': f'Paragraph {i} of the report.', 'role': None} for i in range(args.paragraphs)]
+    tables = []
+    for t in range(args.tables):
+        headers = [f'Column {c}' for c in range(args.columns)]
+        tables.append({
+            'content': {
+                'headers': headers,
+                'rows': [
+                    {header: cell_text(t, r, c) for c, header in enumerate(headers)}
+                    for r in range(args.rows)
+                ]
+            },
+            'metadata': {'summary': None, 'description': None}
+        })
+        content.append({'text': f"Table with columns: {', '.join(headers)}", 'role': 'table',
+                        'table_index': t})
+    return content, tables
+
+
+def build_columnar(args):
+    content = [Chunk(f'Paragraph {i} of the report.') for i in range(args.paragraphs)]
+    tables = []
+    for t in range(args.tables):
+        headers = [f'Column {c}' for c in range(args.columns)]
+        tables.append(Table.from_rows(
+            headers, ([cell_text(t, r, c) for c in range(args.columns)] for r in range(args.rows))
+        ))
+        content.append(Chunk(f"Table with columns: {', '.join(headers)}", 'table', t))
+    return content, tables
+
+
+def serialize_dicts(content, tables):
+    return json.dumps({'content': content, 'tables': tables})
+
+
+def serialize_columnar(content, tables):
+    return json.dumps({
+        'content': [chunk.to_list() for chunk in content],
+        'tables': [table.to_dict() for table in tables],
+    })
+
+
+def measure(build, args):
+    tracemalloc.start()
+    result = build(args)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--paragraphs', type=int, default=20000)
+    parser.add_argument('--tables', type=int, default=50)
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--columns', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f'{args.paragraphs} paragraphs, {args.tables} tables of {args.rows} x {args.columns} '
+          f'({args.tables * args.rows * args.columns:,} cells)')
+    layouts = [('dicts', build_dicts, serialize_dicts), ('columnar', build_columnar, serialize_columnar)]
+    for name, build, serialize in layouts:
+        (content, tables), allocated = measure(build, args)
+        start = time.perf_counter()
+        payload = serialize(content, tables)
+        elapsed = time.perf_counter() - start
+        print(f'{name:9} {allocated / 2 ** 20:8.1f} MB in memory  '
+              f'{len(payload) / 2 ** 20:6.1f} MB JSON in {elapsed:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
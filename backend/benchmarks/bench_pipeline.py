@@ -0,0 +1,139 @@
+"""End-to-end DocumentProcessor benchmark against offline fake Azure clients.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_pipeline --sizes 50:2,300:10,1000:40 --runs 5 \\
+        --latency 0.2 --jitter 0.1 --error-rate 0.01 --concurrency 8 --rpm 600
+
+Each size is PARAGRAPHS:TABLES. For every size the synthetic PDF is run
+through aprocess_document `runs` times against FakeDocumentIntelligenceClient
+and FakeAsyncAzureOpenAI with the given latency (seconds), jitter and error
+rate. Simulated 429s carry a Retry-After of --retry-after seconds and are
+retried by a RequestScheduler limited to --rpm/--tpm. Reports the plan the
+processor chose (with the time single-pass runs saved against the
+multi-stage runs timed so far), latency percentiles, failed runs, retries, calls per stage,
+the peak number of concurrent OpenAI calls and peak traced Python memory.
+Pass --single-pass-tokens 0 to force the multi-stage plan and compare; sizes
+run in order, so list a multi-stage size first to time the rounds.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from config import settings
+from pipeline.metrics import Trace, tracing
+from pipeline.fakes import (
+    FakeAsyncAzureOpenAI, FakeDocumentIntelligenceClient, make_text_pdf, synthetic_pages
+)
+from pipeline.evaluation import percentile
+from pipeline.pipeline import DocumentProcessor
+from pipeline.scheduler import RequestScheduler
+from pipeline.template import EXAMPLE_TEMPLATES
+
+
+async def bench_size(pdf_path, args):
+    doc_client = FakeDocumentIntelligenceClient(
+        latency=args.layout_latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    )
+    openai_client = FakeAsyncAzureOpenAI(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        retry_after=args.retry_after, seed=args.seed
+    )
+    scheduler = RequestScheduler(requests_per_minute=args.rpm, tokens_per_minute=args.tpm, seed=args.seed)
+    processor = DocumentProcessor(
+        doc_client, openai_client, max_concurrency=args.concurrency, scheduler=scheduler
+    )
+    example = EXAMPLE_TEMPLATES[args.template]
+
+    durations, failures, retries, plans, saved = [], Counter(), 0, Counter(), []
+    tracemalloc.start()
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        trace = Trace()
+        try:
+            with tracing(trace):
+                await processor.aprocess_document(pdf_path, example, classifier=args.classifier)
+        except Exception as e:
+            failures[type(e).__name__] += 1
+            continue
+        finally:
+            retries += trace.retries
+            if trace.plan:
+                plans[trace.plan['mode']] += 1
+                if 'seconds_saved' in trace.plan:
+                    saved.append(trace.plan['seconds_saved'])
+        durations.append(time.perf_counter() - start)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    calls = Counter(openai_client.calls)
+    calls['layout'] = doc_client.calls
+    return {
+        'durations': durations,
+        'failures': failures,
+        'retries': retries / args.runs,
+        'plans': plans,
+        'seconds_saved': saved,
+        'calls': {stage: count / args.runs for stage, count in sorted(calls.items())},
+        'max_in_flight': openai_client.max_in_flight,
+        'peak_memory_mb': peak_memory / 1024 / 1024,
+    }
+
+
+def print_report(size, report):
+    durations = report['durations']
+    print(f"\n== {size[0]} paragraphs, {size[1]} tables ==")
+    if durations:
+        print(f"latency  p50 {percentile(durations, 50):.2f}s  p95 {percentile(durations, 95):.2f}s  "
+              f"p99 {percentile(durations, 99):.2f}s  mean {statistics.mean(durations):.2f}s")
+    failed = sum(report['failures'].values())
+    print("plan     " + ", ".join(f"{mode} x{count}" for mode, count in report['plans'].items()))
+    if report['seconds_saved']:
+        print(f"saved    {statistics.mean(report['seconds_saved']):.2f}s per single-pass run "
+              f"against the timed multi-stage rounds")
+    print(f"runs     {len(durations)} ok, {failed} failed {dict(report['failures']) or ''}")
+    print(f"retries  {report['retries']:g} per run")
+    print("calls    " + ", ".join(f"{stage} {count:g}" for stage, count in report['calls'].items())
+          + "  (per run)")
+    print(f"openai   peak {report['max_in_flight']} in flight")
+    print(f"memory   peak {report['peak_memory_mb']:.1f} MB traced")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='50:2,300:10,1000:40',
+                        help='comma separated PARAGRAPHS:TABLES pairs')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per OpenAI call')
+    parser.add_argument('--layout-latency', type=float, default=1.0, help='seconds per layout call')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After sent with 429s')
+    parser.add_argument('--rpm', type=int, default=0, help='scheduler requests per minute, 0 for none')
+    parser.add_argument('--tpm', type=int, default=0, help='scheduler tokens per minute, 0 for none')
+    parser.add_argument('--concurrency', type=int, default=settings.OPENAI_MAX_CONCURRENCY)
+    parser.add_argument('--classifier', default=settings.SECTION_CLASSIFIER)
+    parser.add_argument('--template', default='brief', choices=sorted(EXAMPLE_TEMPLATES))
+    parser.add_argument('--single-pass-tokens', type=int, default=settings.SINGLE_PASS_MAX_TOKENS,
+                        help='SINGLE_PASS_MAX_TOKENS for the run, 0 disables single pass')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    settings.SINGLE_PASS_MAX_TOKENS = args.single_pass_tokens
+
+    sizes = [tuple(int(n) for n in size.split(':')) for size in args.sizes.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        for paragraphs, tables in sizes:
+            pdf_path = os.path.join(tmp, f'synthetic_{paragraphs}_{tables}.pdf')
+            with open(pdf_path, 'wb') as f:
+                f.write(make_text_pdf(synthetic_pages(paragraphs, tables, seed=args.seed)))
+            report = asyncio.run(bench_size(pdf_path, args))
+            print_report((paragraphs, tables), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark rendering large extracted tables into the summary .docx.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_render --rows 10000 --columns 6
+
+Compares python-docx's cell-by-cell add_row()/cell.text loop (the way
+tables used to be rendered) with add_table_bulk, and with the table
+attached as CSV. Reports render and save time and output size.
+"""
+import argparse
+import time
+
+from docx import Document as DocxDocument
+
+from config import settings
+from pipeline.content import Table
+from pipeline.pipeline import Document
+from pipeline.render import build_summary_docx, docx_bytes, summary_package
+
+
+def make_document(rows, columns):
+    headers = [f'Column {c}' for c in range(columns)]
+    table = Table.from_rows(headers, ([f'r{r} c{c} value' for c in range(columns)] for r in range(rows)))
+    return Document({'Water': 'Floods and ports.'}, [table])
+
+
+def render_cell_by_cell(document):
+    doc = DocxDocument()
+    for table_data in document.tables:
+        table = doc.add_table(rows=1, cols=len(table_data.headers))
+        table.style = 'Table Grid'
+        for cell, header in zip(table.rows[0].cells, table_data.headers):
+            cell.text = header
+        for row in table_data.rows():
+            for cell, value in zip(table.add_row().cells, row):
+                cell.text = value
+    return docx_bytes(doc), {}
+
+
+def render_bulk(document):
+    settings.DOCX_TABLE_ATTACHMENT_ROWS = 0
+    doc = build_summary_docx(document, 'bench.pdf', 'Bench', 'brief', True, {})
+    return docx_bytes(doc), {}
+
+
+def render_attached(document):
+    settings.DOCX_TABLE_ATTACHMENT_ROWS = 1
+    attachments = {}
+    doc = build_summary_docx(document, 'bench.pdf', 'Bench', 'brief', True, attachments)
+    return docx_bytes(doc), attachments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--columns', type=int, default=6)
+    parser.add_argument('--skip-cell-by-cell', action='store_true',
+                        help='skip the slow baseline for very large tables')
+    args = parser.parse_args()
+
+    document = make_document(args.rows, args.columns)
+    print(f'{args.rows} rows x {args.columns} columns')
+
+    modes = [('bulk xml', render_bulk), ('csv attachment', render_attached)]
+    if not args.skip_cell_by_cell:
+        modes.insert(0, ('cell by cell', render_cell_by_cell))
+    for name, render in modes:
+        start = time.perf_counter()
+        content, attachments = render(document)
+        package, _, _ = summary_package(content, attachments)
+        elapsed = time.perf_counter() - start
+        print(f'{name:15} {elapsed:7.2f}s  {len(package) / 1024:8.0f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Micro-benchmark: filtering table paragraphs with SpanIndex vs a linear scan.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_span_filter --paragraphs 20000 --tables 500
+
+Builds a synthetic layout result where tables are interleaved with body
+paragraphs (and their cell paragraphs), then times the linear
+any()-over-all-table-spans check that _analyze_layout used to do against the
+SpanIndex lookup, checking both select the same paragraphs.
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from pipeline.spans import SpanIndex
+
+
+def synthetic_layout(n_paragraphs, n_tables, seed=0):
+    rng = random.Random(seed)
+    paragraphs, table_spans = [], []
+    table_every = max(1, n_paragraphs // max(n_tables, 1))
+    offset = 0
+    for i in range(n_paragraphs):
+        length = rng.randint(20, 400)
+        paragraphs.append(SimpleNamespace(spans=[SimpleNamespace(offset=offset, length=length)]))
+        offset += length + 1
+        if i % table_every == 0 and len(table_spans) < n_tables:
+            # A table whose cells are reported as paragraphs, sometimes split over two spans
+            start = offset
+            for _ in range(rng.randint(4, 12)):
+                cell_length = rng.randint(3, 30)
+                paragraphs.append(SimpleNamespace(spans=[SimpleNamespace(offset=offset, length=cell_length)]))
+                offset += cell_length + 1
+            if rng.random() < 0.3:
+                middle = (start + offset) // 2
+                table_spans.append([(start, middle), (middle + 5, offset)])
+            else:
+                table_spans.append([(start, offset)])
+    return paragraphs, table_spans
+
+
+def linear_filter(paragraphs, table_spans):
+    spans = [span for table in table_spans for span in table]
+    kept = []
+    for paragraph in paragraphs:
+        if not any(
+            start < span.offset + span.length and span.offset < end
+            for span in paragraph.spans
+            for start, end in spans
+        ):
+            kept.append(paragraph)
+    return kept
+
+
+def indexed_filter(paragraphs, table_spans):
+    index = SpanIndex(span for table in table_spans for span in table)
+    return [
+        paragraph for paragraph in paragraphs
+        if not any(index.overlaps(span.offset, span.offset + span.length) for span in paragraph.spans)
+    ]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--paragraphs', type=int, default=20000)
+    parser.add_argument('--tables', type=int, default=500)
+    args = parser.parse_args()
+
+    paragraphs, table_spans = synthetic_layout(args.paragraphs, args.tables)
+    linear, linear_seconds = timed(linear_filter, paragraphs, table_spans)
+    indexed, indexed_seconds = timed(indexed_filter, paragraphs, table_spans)
+    assert linear == indexed, "SpanIndex disagrees with the linear scan"
+
+    print(f"{len(paragraphs)} paragraphs, {len(table_spans)} tables, {len(indexed)} kept")
+    print(f"linear scan: {linear_seconds * 1000:.1f} ms")
+    print(f"SpanIndex:   {indexed_seconds * 1000:.1f} ms ({linear_seconds / indexed_seconds:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark API cold start: import time and time until /ready.
+
+Usage (from backend/, with the Azure settings in .env or the environment):
+
+    python -m benchmarks.bench_startup --runs 5 --max-import-seconds 1.5
+
+Imports main in fresh interpreters and reports the median and best wall
+time, then starts the server the way startup.sh does (python main.py) and
+reports how long it takes to answer HTTP at all and to report /ready. With
+--max-import-seconds the script exits non-zero when the median import time
+is over budget, so it can gate CI against cold-start regressions.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def import_seconds():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url):
+    """Status and JSON body of a GET, or (None, None) if nothing is listening yet"""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+    except OSError:
+        return None, None
+
+
+def startup_seconds(timeout):
+    """Seconds until the server answers and until /ready is 200 (None if it never is)"""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "main.py"], env={**os.environ, "PORT": str(port)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    serving = ready = body = None
+    try:
+        while time.perf_counter() - start < timeout:
+            status, body = get(f"http://127.0.0.1:{port}/ready")
+            if status is not None and serving is None:
+                serving = time.perf_counter() - start
+            if status == 200:
+                ready = time.perf_counter() - start
+                break
+            if body and body.get("error"):
+                break
+            time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait()
+    return serving, ready, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for /ready")
+    parser.add_argument("--max-import-seconds", type=float,
+                        help="exit 1 if the median import time is above this")
+    args = parser.parse_args()
+
+    times = [import_seconds() for _ in range(args.runs)]
+    median = statistics.median(times)
+    print(f"import main    median {median:.3f}s  best {min(times):.3f}s  ({args.runs} runs)")
+
+    serving, ready, body = startup_seconds(args.timeout)
+    print(f"serving after  {serving:.3f}s" if serving is not None else "server never answered")
+    if ready is not None:
+        print(f"ready after    {ready:.3f}s")
+    else:
+        print(f"not ready: {body}")
+
+    if args.max_import_seconds is not None and median > args.max_import_seconds:
+        print(f"import time {median:.3f}s is over the {args.max_import_seconds:.3f}s budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -25,6 +25,8 @@ class Settings(BaseSettings):
     STATIC_DIR: str = "../frontend/build/static"
     ASSETS_DIR: str = "../frontend/build/assets"
     BUILD_DIR: str = "../frontend/build"
+    STATIC_MAX_MEMORY_FILE_BYTES: int = 8 * 1024 * 1024  # larger build files are streamed from disk
+    STATIC_COMPRESS_MIN_BYTES: int = 1024  # smaller files are always sent uncompressed
     
     # Azure Document Intelligence settings
     AZURE_ENDPOINT: Optional[str] = None
@@ -33,9 +35,69 @@ class Settings(BaseSettings):
     # Azure OpenAI settings
     OPENAI_ENDPOINT: Optional[str] = None
     AZURE_OPENAI_API_KEY: Optional[str] = None
+
+    # Pipeline settings
+    OPENAI_MAX_CONCURRENCY: int = 8  # max in-flight chat completions per document
+    CLASSIFICATION_BATCH_SIZE: int = 20  # paragraphs per classification call, 1 disables batching
+    CLASSIFICATION_BATCH_TOKENS: int = 3000  # estimated prompt tokens per classification batch
+    SECTION_CLASSIFIER: str = "llm"  # "llm", or "embedding" to use centroid similarity first
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_MIN_MARGIN: float = 0.03  # below this top-2 similarity gap, ask the LLM instead
+    SECTION_TOKEN_BUDGET: int = 6000  # estimated source tokens per generation prompt
+    SECTION_REDUCE_FAN_OUT: int = 8  # partial summaries merged per reduce call
+    SINGLE_PASS_MAX_TOKENS: int = 4000  # documents estimated at or below this are summarized in one call, 0 disables
+
+    # Shared OpenAI request scheduler. Quotas are the deployment's per-minute limits, 0 for none.
+    OPENAI_REQUESTS_PER_MINUTE: int = 0
+    OPENAI_TOKENS_PER_MINUTE: int = 0
+    OPENAI_COMPLETION_TOKENS_ESTIMATE: int = 400  # reply tokens charged to the quota up front
+    OPENAI_MAX_RETRIES: int = 6
+    OPENAI_BACKOFF_BASE_SECONDS: float = 1.0
+    OPENAI_BACKOFF_MAX_SECONDS: float = 60.0
+
+    # Pooled HTTP connections, shared by all requests. 0 sizes the pool to the worker concurrency.
+    OPENAI_MAX_CONNECTIONS: int = 0
+    LAYOUT_MAX_CONNECTIONS: int = 0
+    HTTP_KEEPALIVE_SECONDS: float = 30.0
+    OPENAI_TIMEOUT_SECONDS: float = 120.0
+
+    # Layout cache, keyed by SHA-256 of the uploaded file. Empty dir disables it.
+    LAYOUT_CACHE_DIR: str = "cache/layout"
+    LAYOUT_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Split PDFs longer than LAYOUT_SHARD_PAGES pages into shards analyzed in parallel. 0 disables.
+    LAYOUT_SHARD_PAGES: int = 0
+    LAYOUT_SHARD_CONCURRENCY: int = 4
+
+    # Chat completion reply cache. RESPONSE_CACHE_DB adds a persistent SQLite tier.
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_TTL_SECONDS: Optional[int] = 7 * 24 * 3600
+    RESPONSE_CACHE_DB: Optional[str] = None
+    RESPONSE_CACHE_MAX_DB_ENTRIES: int = 100000
+
+    # Latest processed version of each document_id, for incremental re-summarization. Empty disables it.
+    VERSION_STORE_DIR: str = "cache/versions"
+    VERSION_STORE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Request bodies over this are rejected by Content-Length, or as soon as that many bytes arrive
+    MAX_UPLOAD_BYTES: int = 200 * 1024 * 1024
+
+    # Summary jobs
+    JOB_WORKERS: int = 2  # documents processed concurrently per instance
+    JOB_RESULT_TTL_SECONDS: int = 3600  # how long finished jobs and their output are kept
+
+    # Tables with more rows than this are returned as CSV files zipped with the .docx. 0 disables.
+    DOCX_TABLE_ATTACHMENT_ROWS: int = 2000
     
     class Config:
         case_sensitive = True
 
 # Create settings instance
-settings = Settings() 
\ No newline at end of file
+settings = Settings()
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def resolve_path(path):
+    """Resolve a relative cache or data path against backend/, not the working directory"""
+    return os.path.join(BACKEND_DIR, path) if path else path 
\ No newline at end of file
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from pipeline.metrics import Trace, metrics, tracing
+from pipeline.progress import ProgressStream
+
+
+@dataclass
+class Job:
+    id: str
+    workdir: str
+    status: str = "queued"  # queued, running, succeeded, failed, cancelled
+    stage: Optional[str] = None
+    progress: float = 0.0
+    error: Optional[str] = None
+    result: Any = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    events: ProgressStream = field(default_factory=ProgressStream, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    trace: Trace = field(default_factory=Trace, repr=False)
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": self.trace.to_dict(),
+        }
+
+
+class JobManager:
+    """Runs summary jobs on a fixed pool of worker tasks.
+
+    Jobs are queued with submit() and picked up by `workers` coroutines, so at
+    most that many documents are processed at once. Each job gets its own
+    working directory for its upload; finished jobs, along with anything
+    left in that directory, are dropped `ttl` seconds after they finish.
+    Expired jobs are pruned on every lookup and by a background task, so
+    their results don't wait in memory for the next job to arrive.
+    """
+
+    def __init__(self, workers: int, ttl: float):
+        self.workers = workers
+        self.ttl = ttl
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._prune_periodically()))
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def create(self, workdir_root):
+        """Register a new job and its working directory without queueing it yet"""
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = Job(id=job_id, workdir=os.path.join(workdir_root, job_id))
+        self.jobs[job_id] = job
+        return job
+
+    def discard(self, job):
+        """Forget a job that was never submitted, or whose result has already been sent"""
+        self.jobs.pop(job.id, None)
+        shutil.rmtree(job.workdir, ignore_errors=True)
+
+    def submit(self, job, fn, *args):
+        """Queue fn(job, *args) to run on the worker pool; its return value becomes job.result"""
+        self._queue.put_nowait((job, fn, args))
+        return job
+
+    def get(self, job_id):
+        self._prune()
+        return self.jobs.get(job_id)
+
+    async def wait(self, job):
+        await job.finished.wait()
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued or running job; finished jobs are left alone"""
+        if job.done:
+            return
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Still queued, the worker skips it when it is dequeued
+            job.status = "cancelled"
+            self._finish(job)
+
+    def _finish(self, job):
+        job.finished_at = time.time()
+        metrics.inc("summary_jobs_total", status=job.status)
+        if job.started_at is not None:
+            metrics.observe("summary_job_queue_seconds", job.started_at - job.created_at)
+            metrics.observe("summary_job_duration_seconds", job.finished_at - job.started_at)
+        job.events.close()
+        job.finished.set()
+
+    async def _worker(self):
+        while True:
+            job, fn, args = await self._queue.get()
+            if job.done:
+                self._queue.task_done()
+                continue
+
+            job.status = "running"
+            job.started_at = time.time()
+            # The task copies the current context, so the job's trace follows it
+            with tracing(job.trace):
+                job.task = asyncio.create_task(fn(job, *args))
+            try:
+                job.result = await job.task
+                job.status = "succeeded"
+                job.progress = 1.0
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                # Stopping a worker cancels the job it is awaiting too, so
+                # job.task.cancelled() can't tell the two cases apart
+                if self._stopping:
+                    raise
+            except Exception as e:
+                print(f"Job {job.id} failed: {str(e)}")
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.task = None
+                self._finish(job)
+                self._queue.task_done()
+
+    async def _prune_periodically(self):
+        while True:
+            await asyncio.sleep(max(1, min(self.ttl, 60)))
+            self._prune()
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.done and now - job.finished_at > self.ttl:
+                shutil.rmtree(job.workdir, ignore_errors=True)
+                del self.jobs[job_id]
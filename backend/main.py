@@ -1,20 +1,92 @@
 import os
+import json
+import shutil
 import asyncio
+import tempfile
+import threading
+from contextlib import asynccontextmanager
 from typing import List
-from docx import Document as DocxDocument
-from config import settings
-from openai import AzureOpenAI
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from config import resolve_path, settings
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.core.credentials import AzureKeyCredential
+from fastapi import Depends, FastAPI, HTTPException, Request
 from pipeline.template import EXAMPLE_TEMPLATES
-from pipeline.pipeline import DocumentProcessor, Document
-from pipeline.document import Document as ProcessedDocument
+from pipeline.cache import LayoutCache, ResponseCache
+from pipeline.clients import AzureClients
+from pipeline.metrics import metrics, stage
+from pipeline.progress import ProgressEvent
+from pipeline.render import DOCX_MEDIA_TYPE, build_summary_docx, docx_bytes, summary_package
+from pipeline.versions import VersionStore
+from jobs import JobManager
+from static_assets import StaticAssets
+from uploads import bool_field, receive_upload, required_field
 
-app = FastAPI()
+job_manager = JobManager(settings.JOB_WORKERS, settings.JOB_RESULT_TTL_SECONDS)
+TEMP_DIR = "temp_uploads"
+JOBS_DIR = os.path.join(TEMP_DIR, "jobs")
+
+_processor_lock = threading.Lock()
+
+def build_processor(state):
+    """Import the pipeline and build the app's shared DocumentProcessor, once.
+
+    The pipeline pulls in the Azure SDK, openai and numpy, so it is imported
+    here instead of when the app starts.
+    """
+    with _processor_lock:
+        if state.processor is None:
+            from pipeline.pipeline import DocumentProcessor
+            state.processor = DocumentProcessor(
+                state.clients.doc_client,
+                state.clients.openai_client,
+                layout_cache=state.layout_cache,
+                response_cache=state.response_cache
+            )
+        return state.processor
+
+def create_stores(state):
+    """The layout cache, response cache and version store, under backend/ unless configured elsewhere"""
+    state.layout_cache = LayoutCache(
+        resolve_path(settings.LAYOUT_CACHE_DIR),
+        settings.LAYOUT_CACHE_MAX_BYTES
+    ) if settings.LAYOUT_CACHE_DIR else None
+    state.response_cache = ResponseCache.from_settings()
+    state.version_store = VersionStore(
+        resolve_path(settings.VERSION_STORE_DIR),
+        settings.VERSION_STORE_MAX_BYTES
+    ) if settings.VERSION_STORE_DIR else None
+
+async def warm_up(app):
+    """Build the processor and its clients in the background so /ready turns green"""
+    try:
+        await asyncio.to_thread(build_processor, app.state)
+        app.state.startup_error = None
+    except Exception as e:
+        app.state.startup_error = f"{type(e).__name__}: {e}"
+        print(f"Error creating clients: {app.state.startup_error}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clients and their connection pools live as long as the app, and every
+    # request shares one processor built on them. They are created in the
+    # background, so the app serves (and answers /ready) straight away.
+    app.state.clients = AzureClients()
+    app.state.processor = None
+    app.state.startup_error = None
+    # Created here rather than on import, so importing the app touches no disk
+    await asyncio.to_thread(create_stores, app.state)
+    warm_up_task = asyncio.create_task(warm_up(app))
+    # The frontend build is read and compressed once, off the event loop
+    app.state.static_assets = asyncio.create_task(
+        asyncio.to_thread(StaticAssets.from_settings().load)
+    )
+    await job_manager.start()
+    yield
+    warm_up_task.cancel()
+    await job_manager.stop()
+    await app.state.clients.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["http://localhost:3000"]  # Adjust this to match your frontend URL
 
@@ -25,50 +97,46 @@ app.add_middleware(
     allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
     allow_methods=["*"],
     allow_headers=["*"],
+    # The frontend names downloads after it (.docx, or .zip with table attachments)
+    expose_headers=["Content-Disposition"],
 )
 
-# Check if directories exist before mounting
-if os.path.exists(settings.STATIC_DIR):
-    app.mount("/static", StaticFiles(directory=settings.STATIC_DIR), name="static")
-if os.path.exists(settings.ASSETS_DIR):
-    app.mount("/assets", StaticFiles(directory=settings.ASSETS_DIR), name="assets")
+@app.get("/cache_stats")
+async def cache_stats(request: Request):
+    state = request.app.state
+    return {
+        "layout": state.layout_cache.stats() if state.layout_cache else None,
+        "responses": state.response_cache.stats()
+    }
 
-# Initialize Azure clients
-doc_client = DocumentIntelligenceClient(
-    endpoint=settings.AZURE_ENDPOINT,
-    credential=AzureKeyCredential(settings.AZURE_API_KEY)
-)
-
-openai_client = AzureOpenAI(
-    api_version="2024-08-01-preview",
-    azure_endpoint=settings.OPENAI_ENDPOINT,
-    api_key=settings.AZURE_OPENAI_API_KEY
-)
-
-@app.get("/{full_path:path}")
-async def serve_react_app(full_path: str):
-    file_path = os.path.join(settings.BUILD_DIR, full_path)
-    if os.path.isfile(file_path):
-        return FileResponse(file_path)
+@app.get("/ready")
+async def ready(request: Request):
+    """200 once the pipeline and its clients are ready to take work, 503 until then"""
+    state = request.app.state
+    is_ready = state.processor is not None
+    return JSONResponse(
+        {"ready": is_ready, "clients": state.clients.ready, "error": state.startup_error},
+        status_code=200 if is_ready else 503
+    )
 
-    return FileResponse(os.path.join(settings.BUILD_DIR, "index.html"))
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage, job and OpenAI call metrics in the Prometheus text exposition format"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.post("/example_generate_summary")
-async def example_generate_summary(
-    file: UploadFile = File(...),
-    type: str = Form(...),
-    summary_type: str = Form(...)):
-    
-    # Create a temporary directory for uploaded files
-    temp_dir = "temp_uploads"
-    os.makedirs(temp_dir, exist_ok=True)
+async def example_generate_summary(request: Request):
+    from docx import Document as DocxDocument
+
+    # Each request gets its own scratch directory, removed when the request ends
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(dir=TEMP_DIR)
     
     try:
-        # Save uploaded file
-        file_location = os.path.join(temp_dir, file.filename)
-        with open(file_location, "wb+") as file_object:
-            content = await file.read()
-            file_object.write(content)
+        # Save uploaded file under a unique name
+        fields, _, filename = await receive_upload(request, workdir)
+        type = required_field(fields, "type")
+        summary_type = required_field(fields, "summary_type")
 
         # Simulate processing time
         await asyncio.sleep(2)
@@ -79,116 +147,260 @@ async def example_generate_summary(
         doc.add_paragraph(f'Summary Type: {summary_type}')
         
         # Add document information
-        doc.add_heading(f'Document: {file.filename}', level=1)
+        doc.add_heading(f'Document: {filename}', level=1)
         doc.add_paragraph(f'Type: {type}')
         doc.add_paragraph('This is a sample summary for the document.')
             
-        # Save the generated summary with .docx extension
-        output_path = os.path.join(temp_dir, "generated_summary.docx")
-        doc.save(output_path)
-        
-        return FileResponse(
-            path=output_path,
-            filename="generated_summary.docx",
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
+        return docx_response(docx_bytes(doc))
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
         # Cleanup temporary files
-        if os.path.exists(file_location):
-            os.remove(file_location)
+        shutil.rmtree(workdir, ignore_errors=True)
 
-@app.post("/generate_summary")
-async def generate_summary(
-    file: UploadFile = File(...),
-    type: str = Form(...),
-    summary_type: str = Form(...),
-    include_tables: bool = Form(True)):
-    
-    temp_dir = "temp_uploads"
-    os.makedirs(temp_dir, exist_ok=True)
-    file_location = None
-    
+def docx_response(content, filename="generated_summary.docx", headers=None, media_type=DOCX_MEDIA_TYPE):
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', **(headers or {})}
+    )
+
+def timing_headers(job):
+    """Server-Timing stage breakdown plus OpenAI usage and the chosen plan for a finished job"""
+    timings = job.trace.to_dict()
+    headers = {
+        "Server-Timing": job.trace.server_timing(),
+        "X-OpenAI-Calls": str(sum(timings["openai_calls"].values())),
+        "X-OpenAI-Prompt-Tokens": str(timings["prompt_tokens"]),
+        "X-OpenAI-Completion-Tokens": str(timings["completion_tokens"]),
+    }
+    plan = timings["plan"]
+    if plan:
+        headers["X-Summary-Plan"] = plan["mode"]
+        headers["X-OpenAI-Calls-Saved"] = str(plan.get("openai_calls_saved", 0))
+        if "seconds_saved" in plan:
+            headers["X-Summary-Seconds-Saved"] = f"{plan['seconds_saved']:.3f}"
+    return headers
+
+# Share of overall job progress reached when each pipeline stage completes
+STAGE_PROGRESS = {
+    "layout_extracted": 0.1,
+    "tables_summarized": 0.2,
+    "chunks_classified": 0.6,
+    "section_generated": 0.9,
+    "docx_written": 1.0,
+}
+
+def track_progress(job):
+    """Progress callback that updates the job's stage and progress and records the event"""
+    stages = list(STAGE_PROGRESS)
+
+    def on_event(event):
+        if event.stage in STAGE_PROGRESS:
+            job.stage = event.stage
+            index = stages.index(event.stage)
+            start = STAGE_PROGRESS[stages[index - 1]] if index else 0.0
+            fraction = event.current / event.total if event.total else 1.0
+            job.progress = round(start + (STAGE_PROGRESS[event.stage] - start) * fraction, 3)
+        job.events(event)
+    return on_event
+
+async def run_summary_job(job, processor, file_location, filename, type, summary_type,
+                          include_tables, stream_sections=False, classifier=None, document_id=None,
+                          version_store=None):
+    """Process an uploaded file and return the summary as (bytes, media type, filename).
+
+    With a document_id the upload is treated as a revision of that document,
+    and only what changed since the last version in version_store is reprocessed.
+    """
+    progress = track_progress(job)
+    store = version_store if document_id else None
     try:
-        # Save uploaded file
-        file_location = os.path.join(temp_dir, file.filename)
-        with open(file_location, "wb+") as file_object:
-            content = await file.read()
-            file_object.write(content)
-
-        # Initialize pipeline with example template based on summary type
-        pipeline = DocumentProcessor(doc_client, openai_client)
+        job.stage = "processing"
         example_document = EXAMPLE_TEMPLATES.get(
-            summary_type.lower(), 
+            summary_type.lower(),
             EXAMPLE_TEMPLATES["brief"]
         )
-
-        # Process the document and create a new Document instance
-        processed_content = pipeline.process_document(
-            file_location, 
-            example_document
+        previous = await asyncio.to_thread(store.get, document_id) if store else None
+        processed_content = await processor.aprocess_document(
+            file_location,
+            example_document,
+            progress=progress,
+            stream_sections=stream_sections,
+            classifier=classifier,
+            previous=previous
         )
-        
-        # Create Word document with processed content
-        doc = DocxDocument()
-        doc.add_heading(f'Document Summary', 0)
-        doc.add_paragraph(f'Summary Type: {summary_type}')
-        
-        # Add document information
-        doc.add_heading(f'Document: {file.filename}', level=1)
-        doc.add_paragraph(f'Type: {type}')
-        
-        # Add each section to the Word document
-        for section_name, content in processed_content.sections.items():
-            doc.add_heading(section_name, level=2)
-            doc.add_paragraph(content)
-        
-        # Add tables only if include_tables is True
-        if include_tables and processed_content.tables:
-            doc.add_heading('Extracted Tables', level=1)
-            for i, table_data in enumerate(processed_content.tables):
-                doc.add_heading(f'Table {i + 1}', level=2)
-                
-                # Create table in Word document
-                table = doc.add_table(rows=1, cols=len(table_data['headers']))
-                table.style = 'Table Grid'
-                
-                # Add headers
-                header_cells = table.rows[0].cells
-                for i, header in enumerate(table_data['headers']):
-                    header_cells[i].text = header
-                
-                # Add data rows
-                for row_data in table_data['rows']:
-                    row_cells = table.add_row().cells
-                    for i, header in enumerate(table_data['headers']):
-                        row_cells[i].text = row_data[header]
-        
-        # Save the generated summary
-        output_path = os.path.join(temp_dir, "generated_summary.docx")
-        doc.save(output_path)
-        
-        return FileResponse(
-            path=output_path,
-            filename="generated_summary.docx",
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-        
-    except Exception as e:
-        print(f"Error processing document: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-    
+        if store:
+            version = processed_content.version
+            await asyncio.to_thread(store.put, document_id, version)
+            progress(ProgressEvent(
+                "document_versioned",
+                f"Stored version {version.version} of {document_id}",
+                data={"document_id": document_id, "version": version.version, "reused": version.reused}
+            ))
+
+        # Rendering is CPU bound, keep it off the event loop
+        job.stage = "rendering"
+        job.progress = 0.9
+        # Very large tables come back as CSV attachments, zipped with the .docx
+        attachments = {}
+        with stage("render"):
+            doc = await asyncio.to_thread(
+                build_summary_docx,
+                processed_content, filename, type, summary_type, include_tables, attachments
+            )
+            content = await asyncio.to_thread(docx_bytes, doc)
+            package = await asyncio.to_thread(summary_package, content, attachments)
+        progress(ProgressEvent("docx_written", "Summary document written"))
+        return package
+
     finally:
-        # Cleanup temporary files
-        if file_location and os.path.exists(file_location):
-            try:
-                os.remove(file_location)
-            except Exception as e:
-                print(f"Error cleaning up file: {str(e)}")
+        # The upload is the only thing on disk; the result is kept in memory
+        shutil.rmtree(job.workdir, ignore_errors=True)
+
+def get_processor(request: Request):
+    """The app's long-lived DocumentProcessor, built on the shared pooled clients"""
+    state = request.app.state
+    if state.processor is None:
+        # Requests that arrive before warm-up finishes build it themselves
+        try:
+            build_processor(state)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Service not ready: {type(e).__name__}: {e}")
+    return state.processor
+
+async def submit_summary_job(request, processor, stream_sections=False):
+    """Stream an upload into a fresh job workdir and queue it for processing.
+
+    Form fields: file, type, summary_type, include_tables (default true),
+    classifier and document_id, plus stream_sections where the endpoint allows it.
+    """
+    from pipeline.pipeline import SECTION_CLASSIFIERS
+
+    job = job_manager.create(JOBS_DIR)
+    os.makedirs(job.workdir, exist_ok=True)
+
+    try:
+        fields, file_location, filename = await receive_upload(request, job.workdir)
+        type = required_field(fields, "type")
+        summary_type = required_field(fields, "summary_type")
+        include_tables = bool_field(fields, "include_tables", True)
+        stream_sections = stream_sections and bool_field(fields, "stream_sections", False)
+        classifier = fields.get("classifier") or None
+        if classifier and classifier not in SECTION_CLASSIFIERS:
+            raise HTTPException(status_code=400, detail=f"classifier must be one of {SECTION_CLASSIFIERS}")
+    except BaseException:
+        job_manager.discard(job)
+        raise
+
+    return job_manager.submit(
+        job, run_summary_job,
+        processor, file_location, filename, type, summary_type, include_tables, stream_sections,
+        classifier, fields.get("document_id") or None, request.app.state.version_store
+    )
+
+def job_or_404(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request, processor=Depends(get_processor)):
+    job = await submit_summary_job(request, processor, stream_sections=True)
+    return {
+        **job.to_dict(),
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+        "result_url": f"/jobs/{job.id}/result"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return job_or_404(job_id).to_dict()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = job_or_404(job_id)
+    job_manager.cancel(job)
+    await job_manager.wait(job)
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, cancel_on_disconnect: bool = False):
+    """Server-Sent Events stream of a job's progress, ending with its final status"""
+    job = job_or_404(job_id)
+
+    async def event_source():
+        try:
+            async for event in job.events:
+                yield f"event: {event.stage}\ndata: {json.dumps(event.to_dict())}\n\n"
+            yield f"event: end\ndata: {json.dumps(job.to_dict())}\n\n"
+        finally:
+            # The client may go away before the job finishes
+            if cancel_on_disconnect and not job.done:
+                job_manager.cancel(job)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = job_or_404(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status == "cancelled":
+        raise HTTPException(status_code=410, detail="Job was cancelled")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    content, media_type, filename = job.result
+    return docx_response(content, filename, timing_headers(job), media_type)
+
+@app.post("/generate_summary")
+async def generate_summary(request: Request, processor=Depends(get_processor)):
+    # Same worker pool as /jobs, but wait for the result so the response is the .docx
+    job = await submit_summary_job(request, processor)
+    try:
+        await job_manager.wait(job)
+
+        if job.status == "failed":
+            print(f"Error processing document: {job.error}")
+            raise HTTPException(status_code=500, detail=job.error)
+        if job.status != "succeeded":
+            # The job's id is never given out, so only a shutdown can cancel it
+            raise HTTPException(status_code=503, detail="Server is shutting down")
+
+        content, media_type, filename = job.result
+        return docx_response(content, filename, timing_headers(job), media_type)
+    finally:
+        # The result goes out in this response and nobody else knows the job,
+        # so don't keep it in memory until the TTL runs out
+        job_manager.discard(job)
+
+# Catch-all for the React app, registered last so it doesn't shadow the API routes.
+# Files come from the in-memory index of the build, so no request touches the disk.
+@app.get("/{full_path:path}")
+async def serve_react_app(full_path: str, request: Request):
+    assets = await request.app.state.static_assets
+    # Client-side routes get index.html
+    asset = assets.get(full_path)
+    if asset is None and full_path.startswith(("static/", "assets/")):
+        # A missing script or stylesheet must not come back as index.html
+        raise HTTPException(status_code=404, detail="Not found")
+    asset = asset or assets.get("index.html")
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Frontend build not found")
+    return assets.response(asset, request.headers)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # startup.sh exports PORT, which App Service sets
+    uvicorn.run(app, host=settings.API_HOST, port=int(os.environ.get("PORT", settings.API_PORT)))
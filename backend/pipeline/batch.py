@@ -0,0 +1,280 @@
+"""Summarize a directory or manifest of PDFs from the command line.
+
+Usage (from backend/):
+
+    python -m pipeline.batch filings/ --output-dir out/ --workers 4
+    python -m pipeline.batch manifest.txt --output-dir out/ --format json
+
+A manifest lists one PDF path per line, relative to the manifest; blank
+lines and lines starting with # are ignored. Documents are spread over
+`--workers` processes, each with its own pooled clients and processor, and
+OpenAI quotas are split between them, never into more workers than the
+smallest quota has requests or tokens per minute. Every finished document is
+appended to a checkpoint file in the output directory, and documents
+already recorded there with an unchanged SHA-256 are skipped, so an
+interrupted run picks up where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+
+from config import resolve_path, settings
+from pipeline.cache import LayoutCache, ResponseCache, file_sha256
+from pipeline.clients import create_document_client, create_sync_openai_client
+from pipeline.layout import page_count
+from pipeline.metrics import Trace, tracing
+from pipeline.pipeline import SECTION_CLASSIFIERS, DocumentProcessor
+from pipeline.render import build_summary_docx
+from pipeline.scheduler import PRIORITY_BATCH, RequestScheduler
+from pipeline.template import EXAMPLE_TEMPLATES
+
+FORMATS = ["docx", "json"]
+CHECKPOINT_NAME = "checkpoint.jsonl"
+
+
+@dataclass
+class BatchOptions:
+    template: str = "brief"
+    classifier: str = None
+    include_tables: bool = False
+    formats: tuple = ("docx", "json")
+
+
+def discover_inputs(source):
+    """Return (path, name) pairs for a directory of PDFs or a manifest file.
+
+    name is the path relative to the directory or manifest without its
+    extension, and is where the outputs go under the output directory.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(".pdf"))
+        base = source
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            lines = [line.strip() for line in f]
+        paths = [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+
+    return [
+        (path, os.path.splitext(os.path.relpath(path, base))[0])
+        for path in sorted(paths)
+    ]
+
+
+class Checkpoint:
+    """Append-only JSON lines record of finished documents, keyed by path and SHA-256"""
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A run killed mid-write leaves a partial last line
+                        continue
+                    if record.get("status") == "ok":
+                        self.completed[record["path"]] = record["sha256"]
+
+    def is_done(self, path, sha256):
+        return self.completed.get(path) == sha256
+
+    def record(self, record):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        if record["status"] == "ok":
+            self.completed[record["path"]] = record["sha256"]
+
+
+def summarize_file(processor, path, name, sha256, output_dir, options):
+    """Summarize one PDF and write its outputs, returning its checkpoint record"""
+    start = time.perf_counter()
+    record = {"path": path, "sha256": sha256, "outputs": []}
+    trace = Trace()
+    try:
+        with tracing(trace):
+            document = asyncio.run(processor.aprocess_document(
+                path, EXAMPLE_TEMPLATES[options.template], classifier=options.classifier
+            ))
+
+        output_base = os.path.join(output_dir, name)
+        os.makedirs(os.path.dirname(output_base), exist_ok=True)
+        if "docx" in options.formats:
+            attachments = {}
+            doc = build_summary_docx(
+                document, os.path.basename(path), "batch", options.template, options.include_tables,
+                attachments
+            )
+            doc.save(output_base + ".docx")
+            record["outputs"].append(output_base + ".docx")
+            # Oversized tables go next to the .docx as CSV files
+            for attachment_name, data in attachments.items():
+                with open(f"{output_base}_{attachment_name}", "wb") as f:
+                    f.write(data)
+                record["outputs"].append(f"{output_base}_{attachment_name}")
+        if "json" in options.formats:
+            with open(output_base + ".json", "w") as f:
+                json.dump({"source": path, "sections": document.sections, "tables": [table.to_dict() for table in document.tables],
+                           "timings": trace.to_dict()}, f, indent=2)
+            record["outputs"].append(output_base + ".json")
+
+        record["status"] = "ok"
+        record["pages"] = page_count(path)
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+# Set in each worker process by _init_worker
+_worker_processor = None
+
+
+def quota_workers(workers):
+    """workers, clamped so that every worker gets at least 1 of each OpenAI per-minute quota"""
+    quotas = [q for q in (settings.OPENAI_REQUESTS_PER_MINUTE, settings.OPENAI_TOKENS_PER_MINUTE) if q]
+    return min([workers, *quotas])
+
+
+def create_batch_processor(workers=1, index=0):
+    """A batch-priority processor on fresh clients, with worker `index`'s share of the OpenAI quota.
+
+    The shares of workers 0..workers-1 add up to exactly the quota.
+    """
+    if quota_workers(workers) < workers:
+        raise ValueError(f"{workers} workers would round some OpenAI quota shares down to 0 (unlimited)")
+
+    # A quota of 0 means unlimited; the remainder goes one each to the first workers
+    def share(quota):
+        return quota // workers + (1 if index < quota % workers else 0) if quota else 0
+
+    scheduler = RequestScheduler(
+        requests_per_minute=share(settings.OPENAI_REQUESTS_PER_MINUTE),
+        tokens_per_minute=share(settings.OPENAI_TOKENS_PER_MINUTE),
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        backoff_base=settings.OPENAI_BACKOFF_BASE_SECONDS,
+        backoff_max=settings.OPENAI_BACKOFF_MAX_SECONDS
+    )
+    layout_cache = LayoutCache(
+        resolve_path(settings.LAYOUT_CACHE_DIR), settings.LAYOUT_CACHE_MAX_BYTES
+    ) if settings.LAYOUT_CACHE_DIR else None
+    response_cache = ResponseCache.from_settings()
+    # A sync OpenAI client, since each document runs in its own event loop
+    return DocumentProcessor(
+        create_document_client(),
+        create_sync_openai_client(),
+        layout_cache=layout_cache,
+        response_cache=response_cache,
+        scheduler=scheduler,
+        priority=PRIORITY_BATCH
+    )
+
+
+def _init_worker(workers, next_index):
+    global _worker_processor
+    with next_index.get_lock():
+        index = next_index.value
+        next_index.value += 1
+    _worker_processor = create_batch_processor(workers, index)
+
+
+def _summarize_in_worker(path, name, sha256, output_dir, options):
+    return summarize_file(_worker_processor, path, name, sha256, output_dir, options)
+
+
+def run_batch(inputs, output_dir, options, workers=1, processor=None, log=print):
+    """Summarize (path, name) inputs into output_dir and return the run's totals.
+
+    With workers=0 documents are processed one at a time in this process,
+    using `processor` if given.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(output_dir, CHECKPOINT_NAME))
+    totals = {"ok": 0, "failed": 0, "skipped": 0, "pages": 0}
+
+    pending = []
+    for path, name in inputs:
+        sha256 = file_sha256(path)
+        if checkpoint.is_done(path, sha256):
+            totals["skipped"] += 1
+        else:
+            pending.append((path, name, sha256))
+    log(f"{len(pending)} to process, {totals['skipped']} already done")
+
+    start = time.perf_counter()
+
+    def finished(record):
+        checkpoint.record(record)
+        totals[record["status"]] += 1
+        totals["pages"] += record.get("pages", 0)
+        done = totals["ok"] + totals["failed"]
+        detail = record.get("error") or f"{record['seconds']:.1f}s"
+        log(f"[{done}/{len(pending)}] {record['status']:6} {record['path']} ({detail})")
+
+    if workers == 0:
+        processor = processor or create_batch_processor()
+        for path, name, sha256 in pending:
+            finished(summarize_file(processor, path, name, sha256, output_dir, options))
+    else:
+        if quota_workers(workers) < workers:
+            log(f"Using {quota_workers(workers)} workers, one per request or token of the smallest OpenAI quota")
+            workers = quota_workers(workers)
+        # Each worker takes the next index, and with it its share of the quota
+        next_index = multiprocessing.Value("i", 0)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(workers, next_index)) as pool:
+            futures = [
+                pool.submit(_summarize_in_worker, path, name, sha256, output_dir, options)
+                for path, name, sha256 in pending
+            ]
+            for future in as_completed(futures):
+                finished(future.result())
+
+    elapsed = time.perf_counter() - start
+    totals["seconds"] = round(elapsed, 3)
+    totals["documents_per_hour"] = round(totals["ok"] / elapsed * 3600, 1) if elapsed else 0.0
+    totals["pages_per_minute"] = round(totals["pages"] / elapsed * 60, 1) if elapsed else 0.0
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="directory of PDFs or manifest file")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 runs in this process")
+    parser.add_argument("--template", default="brief", choices=sorted(EXAMPLE_TEMPLATES))
+    parser.add_argument("--classifier", choices=SECTION_CLASSIFIERS)
+    parser.add_argument("--format", dest="formats", action="append", choices=FORMATS,
+                        help="output formats, repeatable (default: docx and json)")
+    parser.add_argument("--include-tables", action="store_true")
+    args = parser.parse_args(argv)
+
+    options = BatchOptions(
+        template=args.template,
+        classifier=args.classifier,
+        include_tables=args.include_tables,
+        formats=tuple(args.formats or FORMATS)
+    )
+    inputs = discover_inputs(args.source)
+    totals = run_batch(inputs, args.output_dir, options, workers=args.workers)
+
+    print(f"\n{totals['ok']} ok, {totals['failed']} failed, {totals['skipped']} skipped "
+          f"in {totals['seconds']:.1f}s")
+    print(f"throughput {totals['documents_per_hour']:g} documents/hour, "
+          f"{totals['pages_per_minute']:g} pages/minute")
+    print(json.dumps({"options": asdict(options), **totals}))
+    return 1 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
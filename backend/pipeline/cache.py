@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import resolve_path, settings
+from pipeline.content import Chunk, Table
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks so large PDFs aren't buffered"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def json_entries(directory):
+    """(mtime, size, name) of every .json file in directory"""
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    return entries
+
+
+def evict_lru(directory, max_bytes):
+    """Delete the least recently used (oldest mtime) .json files until directory fits in max_bytes"""
+    entries = sorted(json_entries(directory))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            continue
+        total -= size
+
+
+class LayoutCache:
+    """On-disk cache of parsed layout results keyed by the SHA-256 of the source file.
+
+    Entries hold the (content, tables) pair produced by
+    DocumentProcessor._extract_content as compact JSON (chunks as lists,
+    tables column by column), not the raw SDK result. The
+    cache is bounded by total size on disk; when it grows past max_bytes the
+    least recently used entries (by mtime, bumped on every hit) are evicted.
+    """
+
+    # Bump when the entry layout changes; older entries are then treated as misses
+    FORMAT = 2
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached (content, tables) for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if entry.get("format") != self.FORMAT:
+                raise ValueError("layout cache entry from an older version")
+            content = [Chunk.from_list(chunk) for chunk in entry["content"]]
+            tables = [Table.from_dict(table) for table in entry["tables"]]
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return content, tables
+
+    def set(self, key, content, tables):
+        """Store a parsed layout result and evict old entries if over budget"""
+        path = self._path(key)
+        # Unique per process and thread, since batch workers share the cache directory
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "format": self.FORMAT,
+                "content": [chunk.to_list() for chunk in content],
+                "tables": [table.to_dict() for table in tables],
+            }, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _entries(self):
+        return json_entries(self.cache_dir)
+
+    def _evict(self):
+        with self._lock:
+            evict_lru(self.cache_dir, self.max_bytes)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+class ResponseCache:
+    """Memoizes chat completion replies keyed on model + prompt.
+
+    Replies live in an in-memory LRU tier of at most max_entries items and,
+    when db_path is set, in a SQLite tier that survives restarts and is
+    shared between workers. Entries older than ttl seconds are treated as
+    misses in both tiers; the SQLite tier is trimmed to max_db_entries by
+    last access time.
+    """
+
+    def __init__(self, max_entries=10000, ttl=None, db_path=None, max_db_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, reply TEXT, created_at REAL, accessed_at REAL)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_settings(cls):
+        """The cache the API, batch runs and evaluations share, backed by RESPONSE_CACHE_DB"""
+        return cls(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+            db_path=resolve_path(settings.RESPONSE_CACHE_DB),
+            max_db_entries=settings.RESPONSE_CACHE_MAX_DB_ENTRIES
+        )
+
+    @staticmethod
+    def key(model, prompt):
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, model, prompt):
+        """Return the cached reply for model + prompt, or None on a miss"""
+        key = self.key(model, prompt)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, reply = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return reply
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT reply, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    self._db.execute(
+                        "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+                    self._db.commit()
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, model, prompt, reply):
+        key = self.key(model, prompt)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, reply)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (key, reply, now, now)
+                )
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_db_entries,)
+                )
+                self._db.commit()
+
+    def _remember(self, key, created_at, reply):
+        self._memory[key] = (created_at, reply)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            db_entries = None
+            if self._db is not None:
+                db_entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "db_entries": db_entries,
+            }
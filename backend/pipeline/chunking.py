@@ -0,0 +1,41 @@
+def estimate_tokens(text):
+    """Rough token count for budgeting prompts (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def split_text(text, max_tokens):
+    """Split a single oversized text into pieces of at most max_tokens, on whitespace where possible"""
+    max_chars = max(max_tokens * 4 - 4, 1)
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(' ', 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def split_into_windows(pieces, max_tokens, max_items=None):
+    """Group consecutive text pieces into windows of at most max_tokens estimated tokens.
+
+    Order is preserved. Pieces larger than the budget on their own are split
+    with split_text. If max_items is set, no window holds more pieces than
+    that.
+    """
+    windows = []
+    window, window_tokens = [], 0
+    for piece in pieces:
+        for part in split_text(piece, max_tokens) if estimate_tokens(piece) > max_tokens else [piece]:
+            tokens = estimate_tokens(part)
+            if window and (window_tokens + tokens > max_tokens
+                           or (max_items and len(window) >= max_items)):
+                windows.append(window)
+                window, window_tokens = [], 0
+            window.append(part)
+            window_tokens += tokens
+    if window:
+        windows.append(window)
+    return windows
@@ -0,0 +1,88 @@
+import asyncio
+
+import numpy as np
+
+from pipeline.template import EXAMPLE_TEMPLATES
+
+# Short descriptions mirroring the options given to the LLM classifier
+SECTION_DESCRIPTIONS = {
+    "Water": "Water: floods, ports",
+    "Fire": "Fire: wildfires, fire stations",
+    "Administrative": "Administrative: employees, establishments, admin support",
+    "Other": "Other: anything else",
+}
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingSectionClassifier:
+    """Assigns chunks to sections by cosine similarity against section centroids.
+
+    Each section's centroid is the mean embedding of its description and of
+    that section's text in every EXAMPLE_TEMPLATES entry. A chunk is labelled
+    with the closest centroid; when the best and second best similarities
+    are within min_margin of each other the label is left as None so the
+    caller can escalate the chunk to the LLM classifier.
+    """
+
+    def __init__(self, embed, min_margin, batch_size, max_concurrency=4, templates=EXAMPLE_TEMPLATES):
+        # embed is an async callable mapping a list of strings to a list of vectors
+        self.embed = embed
+        self.min_margin = min_margin
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.templates = templates
+        self.section_names = None
+        self.centroids = None
+
+    async def _embed_all(self, texts):
+        """Embed texts in batches of batch_size, a few batches in flight at a time"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed_batch(batch):
+            async with semaphore:
+                return await self.embed(batch)
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        vectors = [vector for result in results for vector in result]
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+    async def _load_centroids(self):
+        if self.centroids is not None:
+            return
+        section_names = list(SECTION_DESCRIPTIONS)
+        texts, owners = [], []
+        for index, name in enumerate(section_names):
+            texts.append(SECTION_DESCRIPTIONS[name])
+            owners.append(index)
+            for template in self.templates.values():
+                if template.sections.get(name):
+                    texts.append(template.sections[name])
+                    owners.append(index)
+
+        vectors = _normalize(await self._embed_all(texts))
+        owners = np.asarray(owners)
+        centroids = np.stack([vectors[owners == i].mean(axis=0) for i in range(len(section_names))])
+        self.section_names = section_names
+        self.centroids = _normalize(centroids)
+
+    async def classify(self, texts):
+        """Return (labels, margins) for texts; low-margin labels are None"""
+        if not texts:
+            return [], []
+        await self._load_centroids()
+
+        similarities = _normalize(await self._embed_all(texts)) @ self.centroids.T
+        top_two = np.sort(similarities, axis=1)[:, -2:]
+        margins = top_two[:, 1] - top_two[:, 0]
+        best = similarities.argmax(axis=1)
+
+        labels = [
+            self.section_names[index] if margin >= self.min_margin else None
+            for index, margin in zip(best, margins)
+        ]
+        return labels, margins.tolist()
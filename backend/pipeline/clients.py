@@ -0,0 +1,132 @@
+import threading
+
+from config import settings
+
+# The Azure SDK, openai and httpx take most of the app's import time, so they
+# are imported by the factories below rather than when this module loads
+
+OPENAI_API_VERSION = "2024-08-01-preview"
+
+
+def openai_pool_size():
+    """Connections needed for every worker to have all its chat completions in flight"""
+    return settings.OPENAI_MAX_CONNECTIONS or settings.JOB_WORKERS * settings.OPENAI_MAX_CONCURRENCY
+
+
+def layout_pool_size():
+    """Connections needed for every worker to analyze all its layout shards at once"""
+    return settings.LAYOUT_MAX_CONNECTIONS or settings.JOB_WORKERS * settings.LAYOUT_SHARD_CONCURRENCY
+
+
+def require_settings(*names):
+    """Raise ValueError naming any of the given settings that aren't configured"""
+    missing = [name for name in names if not getattr(settings, name)]
+    if missing:
+        raise ValueError(f"Missing settings: {', '.join(missing)}")
+
+
+def _openai_http_options():
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=openai_pool_size(),
+            max_keepalive_connections=openai_pool_size(),
+            keepalive_expiry=settings.HTTP_KEEPALIVE_SECONDS
+        ),
+        "timeout": settings.OPENAI_TIMEOUT_SECONDS,
+    }
+
+
+def create_document_client():
+    """Document Intelligence client on a pooled, keep-alive requests session"""
+    require_settings("AZURE_ENDPOINT", "AZURE_API_KEY")
+    import requests
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+    from azure.core.credentials import AzureKeyCredential
+    from azure.core.pipeline.transport import RequestsTransport
+
+    # The async client needs aiohttp; layout calls already run on worker
+    # threads, so a sync client with a large enough pool serves them as well
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=layout_pool_size())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return DocumentIntelligenceClient(
+        endpoint=settings.AZURE_ENDPOINT,
+        credential=AzureKeyCredential(settings.AZURE_API_KEY),
+        transport=RequestsTransport(session=session, session_owner=True)
+    )
+
+
+def create_openai_client():
+    """AsyncAzureOpenAI client on a pooled httpx transport; retries are left to the scheduler"""
+    require_settings("OPENAI_ENDPOINT", "AZURE_OPENAI_API_KEY")
+    import openai
+
+    return openai.AsyncAzureOpenAI(
+        api_version=OPENAI_API_VERSION,
+        azure_endpoint=settings.OPENAI_ENDPOINT,
+        api_key=settings.AZURE_OPENAI_API_KEY,
+        max_retries=0,
+        http_client=openai.DefaultAsyncHttpxClient(**_openai_http_options())
+    )
+
+
+def create_sync_openai_client():
+    """Synchronous counterpart of create_openai_client for scripts"""
+    require_settings("OPENAI_ENDPOINT", "AZURE_OPENAI_API_KEY")
+    import openai
+
+    return openai.AzureOpenAI(
+        api_version=OPENAI_API_VERSION,
+        azure_endpoint=settings.OPENAI_ENDPOINT,
+        api_key=settings.AZURE_OPENAI_API_KEY,
+        max_retries=0,
+        http_client=openai.DefaultHttpxClient(**_openai_http_options())
+    )
+
+
+class AzureClients:
+    """The Document Intelligence and OpenAI clients for one process.
+
+    Each client is created the first time it is used (or by warm()) and
+    closed when the app stops, so TLS connections are set up once and then
+    kept alive and reused by every request. Creating them lazily keeps
+    imports and startup fast, and lets the app start without credentials.
+    """
+
+    def __init__(self, doc_client=None, openai_client=None):
+        self._doc_client = doc_client
+        self._openai_client = openai_client
+        self._lock = threading.Lock()
+
+    @property
+    def doc_client(self):
+        with self._lock:
+            if self._doc_client is None:
+                self._doc_client = create_document_client()
+            return self._doc_client
+
+    @property
+    def openai_client(self):
+        with self._lock:
+            if self._openai_client is None:
+                self._openai_client = create_openai_client()
+            return self._openai_client
+
+    @property
+    def ready(self):
+        return self._doc_client is not None and self._openai_client is not None
+
+    def warm(self):
+        """Create both clients now; raises if they can't be created"""
+        return self.doc_client, self.openai_client
+
+    async def aclose(self):
+        close = getattr(self._openai_client, "close", None)
+        if close is not None:
+            await close()
+        close = getattr(self._doc_client, "close", None)
+        if close is not None:
+            close()
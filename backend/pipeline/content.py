@@ -0,0 +1,91 @@
+from typing import List, Optional
+
+
+class Chunk:
+    """A paragraph of document text, or a stand-in for a table, to be classified.
+
+    Table chunks have role "table" and the index of their Table in the
+    document's table list. Slotted, since a long report has tens of
+    thousands of these.
+    """
+    __slots__ = ('text', 'role', 'table_index')
+
+    def __init__(self, text: str, role: Optional[str] = None, table_index: Optional[int] = None):
+        self.text = text
+        self.role = role
+        self.table_index = table_index
+
+    @property
+    def is_table(self):
+        return self.role == 'table'
+
+    def to_list(self):
+        return [self.text, self.role, self.table_index]
+
+    @classmethod
+    def from_list(cls, data):
+        return cls(*data)
+
+    def __eq__(self, other):
+        return isinstance(other, Chunk) and self.to_list() == other.to_list()
+
+    def __repr__(self):
+        return f"Chunk({self.text!r}, role={self.role!r}, table_index={self.table_index!r})"
+
+
+class Table:
+    """An extracted table stored column by column, with its headers stored once.
+
+    Columns are positional, so tables with repeated or empty header names
+    keep every column. `summary` and `description` are filled in by the
+    pipeline after extraction.
+    """
+    __slots__ = ('headers', 'columns', 'summary', 'description')
+
+    def __init__(self, headers: List[str], columns: List[List[str]] = None,
+                 summary: Optional[str] = None, description: Optional[str] = None):
+        self.headers = list(headers)
+        self.columns = columns if columns is not None else [[] for _ in self.headers]
+        self.summary = summary
+        self.description = description
+
+    @classmethod
+    def from_rows(cls, headers, rows):
+        """Build a table from row lists, padding short rows with empty cells"""
+        columns = [[] for _ in headers]
+        for row in rows:
+            for i, column in enumerate(columns):
+                column.append(row[i] if i < len(row) else '')
+        return cls(headers, columns)
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def rows(self, limit=None):
+        """Iterate over rows as tuples of cell text, in header order"""
+        rows = zip(*self.columns)
+        if limit is not None:
+            return (row for _, row in zip(range(limit), rows))
+        return rows
+
+    def row_dicts(self, limit=None):
+        """Rows as {header: cell} dicts, as shown to the model in prompts"""
+        return [dict(zip(self.headers, row)) for row in self.rows(limit)]
+
+    def to_dict(self):
+        return {
+            'headers': self.headers,
+            'columns': self.columns,
+            'summary': self.summary,
+            'description': self.description,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['headers'], data['columns'], data.get('summary'), data.get('description'))
+
+    def __eq__(self, other):
+        return isinstance(other, Table) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Table(headers={self.headers!r}, rows={len(self)})"
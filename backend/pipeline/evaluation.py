@@ -0,0 +1,165 @@
+"""Run a regression corpus through the pipeline and score it against templates.
+
+Usage (from backend/):
+
+    python -m pipeline.evaluation corpus/ --templates brief,detailed \\
+        --output report.json --baseline previous_report.json
+
+Every document in the corpus (a directory of PDFs or a manifest, as for
+pipeline.batch) is summarized with every template and the result scored
+by DocumentEvaluator against that template. The report has one row per
+document and template plus, per template, mean/min overall and per-section
+scores and latency percentiles. With --baseline the per-template score and
+latency changes against an earlier report are printed, which is how
+prompt and model changes are validated.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from config import settings
+from pipeline.batch import discover_inputs
+from pipeline.cache import ResponseCache
+from pipeline.clients import AzureClients
+from pipeline.pipeline import DocumentEvaluator, DocumentProcessor
+from pipeline.scheduler import PRIORITY_EVALUATION
+from pipeline.template import EXAMPLE_TEMPLATES
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def evaluate_corpus(processor, evaluator, documents, templates, concurrency=2, log=print):
+    """Summarize and score every (document, template) pair, `concurrency` at a time.
+
+    `documents` is a list of PDF paths and `templates` maps template names
+    to example Documents. Returns the report described in the module docstring.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(path, template_name):
+        row = {"document": path, "template": template_name}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                template = templates[template_name]
+                generated = await processor.aprocess_document(path, template)
+                row["latency"] = round(time.perf_counter() - start, 3)
+                evaluation = await evaluator.acompare_documents(generated, template)
+                row.update(evaluation)
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+        log(f"{template_name:10} {path} "
+            + (row.get("error") or f"score {row['overall_score']:.2f} in {row['latency']:.1f}s"))
+        return row
+
+    rows = await asyncio.gather(*(
+        run(path, template_name) for template_name in templates for path in documents
+    ))
+    return {
+        "results": rows,
+        "templates": {
+            name: summarize_template([row for row in rows if row["template"] == name])
+            for name in templates
+        }
+    }
+
+
+def summarize_template(rows):
+    scored = [row for row in rows if "error" not in row]
+    summary = {"documents": len(rows), "failures": len(rows) - len(scored)}
+    if not scored:
+        return summary
+
+    scores = [row["overall_score"] for row in scored]
+    latencies = [row["latency"] for row in scored]
+    sections = {}
+    for row in scored:
+        for name, score in row["section_scores"].items():
+            if score is not None:
+                sections.setdefault(name, []).append(score)
+
+    summary.update({
+        "mean_score": round(statistics.mean(scores), 3),
+        "min_score": round(min(scores), 3),
+        "section_mean_scores": {name: round(statistics.mean(values), 3) for name, values in sections.items()},
+        "unscored_sections": sum(len(row["unscored"]) for row in scored),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_mean": round(statistics.mean(latencies), 3),
+    })
+    return summary
+
+
+def compare_reports(report, baseline):
+    """Per-template change in mean score and latency against a baseline report"""
+    changes = {}
+    for name, summary in report["templates"].items():
+        before = baseline.get("templates", {}).get(name)
+        if not before or "mean_score" not in summary or "mean_score" not in before:
+            continue
+        changes[name] = {
+            "mean_score": round(summary["mean_score"] - before["mean_score"], 3),
+            "latency_p50": round(summary["latency_p50"] - before["latency_p50"], 3),
+            "latency_p95": round(summary["latency_p95"] - before["latency_p95"], 3),
+        }
+    return changes
+
+
+async def run_corpus(documents, templates, concurrency):
+    clients = AzureClients()
+    # Shared with the API and batch runs, so re-running an unchanged corpus costs nothing
+    response_cache = ResponseCache.from_settings()
+    try:
+        processor = DocumentProcessor(
+            clients.doc_client, clients.openai_client,
+            response_cache=response_cache, priority=PRIORITY_EVALUATION
+        )
+        evaluator = DocumentEvaluator(clients.openai_client, response_cache=response_cache)
+        return await evaluate_corpus(processor, evaluator, documents, templates, concurrency)
+    finally:
+        await clients.aclose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", help="directory of PDFs or manifest file")
+    parser.add_argument("--templates", default=",".join(EXAMPLE_TEMPLATES),
+                        help="comma separated template names")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKERS,
+                        help="documents processed at once")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args(argv)
+
+    templates = {name: EXAMPLE_TEMPLATES[name] for name in args.templates.split(",")}
+    documents = [path for path, _ in discover_inputs(args.corpus)]
+    report = asyncio.run(run_corpus(documents, templates, args.concurrency))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["changes"] = compare_reports(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print()
+    for name, summary in report["templates"].items():
+        if "mean_score" not in summary:
+            print(f"{name:10} all {summary['documents']} documents failed")
+            continue
+        change = report.get("changes", {}).get(name)
+        delta = f" ({change['mean_score']:+.2f})" if change else ""
+        print(f"{name:10} score {summary['mean_score']:.2f}{delta} min {summary['min_score']:.2f}  "
+              f"latency p50 {summary['latency_p50']:.1f}s p95 {summary['latency_p95']:.1f}s  "
+              f"{summary['failures']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""Offline stand-ins for the Azure clients used by DocumentProcessor.
+
+These let the pipeline run end to end without network access, for tests and
+benchmarks. FakeDocumentIntelligenceClient reads the text of the PDF it is
+sent with pypdf and reports it in the shape of a prebuilt-layout result:
+each text line becomes a paragraph, and runs of lines containing " | "
+become a table (the first such line is the header row).
+FakeAzureOpenAI and FakeAsyncAzureOpenAI answer the pipeline's prompts with
+keyword-based section labels and filler text.
+
+All fakes accept latency, jitter and error_rate so benchmarks can model a
+slow or flaky service; every call is counted per kind of request.
+"""
+import asyncio
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pypdf
+from azure.core.exceptions import HttpResponseError
+
+TABLE_SEPARATOR = " | "
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_text_pdf(pages):
+    """Build a minimal PDF with one page per list of text lines"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for lines in pages:
+        text_ops = " T* ".join(f"({_escape(line)}) Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 40 760 Td {text_ops} ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def _span(offset, text):
+    return SimpleNamespace(offset=offset, length=len(text))
+
+
+def _region(page_number):
+    return SimpleNamespace(page_number=page_number, polygon=None)
+
+
+def layout_from_pages(pages):
+    """Build a prebuilt-layout shaped result from per-page lists of text lines"""
+    content = []
+    offset = 0
+    paragraphs, tables, result_pages = [], [], []
+
+    def write(text):
+        nonlocal offset
+        start = offset
+        content.append(text + "\n")
+        offset += len(text) + 1
+        return start
+
+    for page_number, lines in enumerate(pages, start=1):
+        page_start = offset
+        rows = []
+        for line in lines + [None]:
+            if line is not None and TABLE_SEPARATOR in line:
+                rows.append(line)
+                continue
+            if rows:
+                tables.append(_table_from_rows(rows, page_number, write, paragraphs))
+                rows = []
+            if line is not None:
+                start = write(line)
+                paragraphs.append(SimpleNamespace(
+                    content=line, role=None,
+                    spans=[_span(start, line)], bounding_regions=[_region(page_number)]
+                ))
+        result_pages.append(SimpleNamespace(
+            page_number=page_number,
+            spans=[SimpleNamespace(offset=page_start, length=offset - page_start)]
+        ))
+
+    return SimpleNamespace(
+        content="".join(content), pages=result_pages, paragraphs=paragraphs, tables=tables
+    )
+
+
+def _table_from_rows(rows, page_number, write, paragraphs):
+    """Lay out table rows, reporting each cell as a paragraph like the real service does"""
+    cells = []
+    table_start = None
+    for row_index, row in enumerate(rows):
+        for column_index, text in enumerate(row.split(TABLE_SEPARATOR)):
+            start = write(text)
+            table_start = start if table_start is None else table_start
+            span = _span(start, text)
+            cells.append(SimpleNamespace(
+                row_index=row_index, column_index=column_index, content=text, spans=[span]
+            ))
+            paragraphs.append(SimpleNamespace(
+                content=text, role=None, spans=[span], bounding_regions=[_region(page_number)]
+            ))
+    last = cells[-1].spans[0]
+    return SimpleNamespace(
+        row_count=len(rows),
+        column_count=max(cell.column_index for cell in cells) + 1,
+        cells=cells,
+        spans=[SimpleNamespace(offset=table_start, length=last.offset + last.length - table_start)],
+        bounding_regions=[_region(page_number)],
+    )
+
+
+class FakeLayoutPoller:
+    def __init__(self, result, delay=0.0):
+        self._result = result
+        self._delay = delay
+
+    def result(self):
+        # Like the real poller, block until the analysis "finishes"
+        time.sleep(self._delay)
+        return self._result
+
+
+class FakeDocumentIntelligenceClient:
+    """Stand-in for DocumentIntelligenceClient that analyzes text PDFs locally.
+
+    The simulated analysis takes latency + latency_per_page * pages seconds,
+    plus up to `jitter` seconds of random extra delay, and fails with an
+    HttpResponseError with probability error_rate.
+    """
+
+    def __init__(self, latency=0.0, latency_per_page=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.latency_per_page = latency_per_page
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self.pages_analyzed = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def begin_analyze_document(self, model_id, body, content_type=None, **kwargs):
+        data = body if isinstance(body, bytes) else body.read()
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        pages = [
+            [line for line in (page.extract_text() or "").splitlines() if line.strip()]
+            for page in reader.pages
+        ]
+        with self._lock:
+            self.calls += 1
+            self.pages_analyzed += len(pages)
+            failed = self._random.random() < self.error_rate
+            self.errors += failed
+            delay = self.latency + self.latency_per_page * len(pages) + self._random.uniform(0, self.jitter)
+        if failed:
+            raise HttpResponseError(message="Simulated Document Intelligence failure")
+        return FakeLayoutPoller(layout_from_pages(pages), delay=delay)
+
+
+def synthetic_pages(paragraphs, tables, rows_per_table=5, lines_per_page=25, seed=0):
+    """Text lines for a synthetic report with the given paragraph and table counts.
+
+    Tables are spread evenly through the text and never split across pages.
+    """
+    rng = random.Random(seed)
+    topics = [
+        "flood barriers near the port", "wildfire response and fire stations",
+        "employees and administrative support", "community programs and software systems",
+    ]
+    blocks = [[f"Paragraph {i}: update on {rng.choice(topics)}, item {rng.randint(1, 999)}."]
+              for i in range(paragraphs)]
+    table_every = max(1, paragraphs // max(tables, 1))
+    for t in reversed(range(tables)):
+        rows = ["Facility | Staff | Budget"] + [
+            f"Site {t}-{r} | {rng.randint(1, 90)} | ${rng.randint(1, 900)}k" for r in range(rows_per_table)
+        ]
+        blocks.insert(min(t * table_every, len(blocks)), rows)
+
+    pages = [[]]
+    for block in blocks:
+        if pages[-1] and len(pages[-1]) + len(block) > lines_per_page:
+            pages.append([])
+        pages[-1].extend(block)
+    return pages
+
+
+def fake_section(text):
+    """Keyword-based stand-in for the LLM's section choice"""
+    text = text.lower()
+    if "flood" in text or "port" in text:
+        return "Water"
+    if "fire" in text:
+        return "Fire"
+    if "employee" in text or "administrative" in text or "staff" in text:
+        return "Administrative"
+    return "Other"
+
+
+def prompt_kind(prompt):
+    """Which pipeline stage a prompt belongs to, used to count calls per stage"""
+    if prompt.startswith("Write a summary"):
+        return "single_pass"
+    if "numbered paragraphs" in prompt:
+        return "classify_batch"
+    if prompt.startswith("Which section"):
+        return "classify"
+    if prompt.startswith("Analyze this table"):
+        return "table_summary"
+    if prompt.startswith("Summarize") or prompt.startswith("Combine"):
+        return "section_reduce"
+    if prompt.startswith("Compare these two sections"):
+        return "evaluate"
+    return "section"
+
+
+def fake_reply(prompt):
+    kind = prompt_kind(prompt)
+    if kind == "single_pass":
+        names = re.search(r"with these keys: (.*?)\.", prompt).group(1).split(", ")
+        document = prompt.split("Document:")[-1].split("When referring to tables")[0]
+        items = re.findall(r"^\s*\[\d+\] (.*)$", document, re.MULTILINE)
+        tables = re.search(r"mapping each of the tables ([\d, ]+) to", prompt)
+        return json.dumps({
+            "labels": [fake_section(text) for text in items],
+            "tables": {
+                index: "This table tracks staff and budget per facility site."
+                for index in (tables.group(1).split(", ") if tables else [])
+            },
+            "sections": {name: "Generated summary text. " * 20 for name in names},
+        })
+    if kind == "classify_batch":
+        texts = re.findall(r"^\s*\[\d+\] (.*)$", prompt.split("Paragraphs:")[-1], re.MULTILINE)
+        return json.dumps([fake_section(text) for text in texts])
+    if kind == "classify":
+        return fake_section(prompt.split("Text:")[-1].split("summary:")[-1])
+    if kind == "table_summary":
+        return "This table tracks staff and budget per facility site."
+    if kind == "evaluate":
+        return json.dumps({"score": 7, "reason": "Covers the same points in less detail."})
+    return "Generated summary text. " * 20
+
+
+def _usage(prompt, reply):
+    return SimpleNamespace(
+        prompt_tokens=len(prompt) // 4 + 1, completion_tokens=len(reply) // 4 + 1,
+        total_tokens=(len(prompt) + len(reply)) // 4 + 2
+    )
+
+
+def _completion(reply, prompt):
+    message = SimpleNamespace(role="assistant", content=reply)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message)], usage=_usage(prompt, reply))
+
+
+def _stream_chunks(reply, prompt, stream_options=None):
+    for word in re.findall(r"\S+\s*", reply):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))], usage=None)
+    if (stream_options or {}).get("include_usage"):
+        yield SimpleNamespace(choices=[], usage=_usage(prompt, reply))
+
+
+def _embedding(text):
+    text = text.lower()
+    keywords = [("flood", "water", "port"), ("fire",), ("administrative", "staff", "employee"),
+                ("other", "miscellaneous", "community")]
+    return [sum(text.count(word) for word in words) + 0.01 for words in keywords]
+
+
+def _rate_limit_error(retry_after):
+    request = httpx.Request("POST", "https://fake-openai.invalid/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": str(retry_after)}, request=request)
+    return openai.RateLimitError("Simulated rate limit", response=response, body=None)
+
+
+class _FakeOpenAIBase:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _begin(self, kind):
+        """Count a call and decide its delay; raises a 429 with probability error_rate"""
+        with self._lock:
+            self.calls[kind] += 1
+            if self._random.random() < self.error_rate:
+                self.errors += 1
+                raise _rate_limit_error(self.retry_after)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def _end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class FakeAzureOpenAI(_FakeOpenAIBase):
+    """Synchronous stand-in for AzureOpenAI (chat completions and embeddings)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    def _create_completion(self, model, messages, stream=False, stream_options=None, **kwargs):
+        prompt = messages[-1]["content"]
+        delay = self._begin(prompt_kind(prompt))
+        try:
+            time.sleep(delay)
+            reply = fake_reply(prompt)
+            return _stream_chunks(reply, prompt, stream_options) if stream else _completion(reply, prompt)
+        finally:
+            self._end()
+
+    def _create_embedding(self, model, input, **kwargs):
+        delay = self._begin("embedding")
+        try:
+            time.sleep(delay)
+            return SimpleNamespace(data=[SimpleNamespace(embedding=_embedding(text)) for text in input])
+        finally:
+            self._end()
+
+
+class FakeAsyncAzureOpenAI(_FakeOpenAIBase):
+    """Async stand-in for AsyncAzureOpenAI (chat completions and embeddings)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    async def _create_completion(self, model, messages, stream=False, stream_options=None, **kwargs):
+        prompt = messages[-1]["content"]
+        delay = self._begin(prompt_kind(prompt))
+        try:
+            await asyncio.sleep(delay)
+            reply = fake_reply(prompt)
+        finally:
+            self._end()
+        if stream:
+            return self._astream(reply, prompt, stream_options)
+        return _completion(reply, prompt)
+
+    async def _astream(self, reply, prompt, stream_options):
+        for chunk in _stream_chunks(reply, prompt, stream_options):
+            yield chunk
+
+    async def _create_embedding(self, model, input, **kwargs):
+        delay = self._begin("embedding")
+        try:
+            await asyncio.sleep(delay)
+            return SimpleNamespace(data=[SimpleNamespace(embedding=_embedding(text)) for text in input])
+        finally:
+            self._end()
@@ -0,0 +1,86 @@
+import os
+from types import SimpleNamespace
+
+import pypdf
+
+
+def page_count(pdf_path):
+    return len(pypdf.PdfReader(pdf_path).pages)
+
+
+def write_page_shards(pdf_path, shard_pages, directory):
+    """Split a PDF into files of at most shard_pages pages.
+
+    Returns a list of (shard_path, first_page_index) in page order.
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    shards = []
+    for first in range(0, len(reader.pages), shard_pages):
+        writer = pypdf.PdfWriter()
+        for page in reader.pages[first:first + shard_pages]:
+            writer.add_page(page)
+        shard_path = os.path.join(directory, f"shard_{first:06d}.pdf")
+        with open(shard_path, "wb") as f:
+            writer.write(f)
+        shards.append((shard_path, first))
+    return shards
+
+
+def _shift_spans(spans, delta):
+    return [SimpleNamespace(offset=span.offset + delta, length=span.length) for span in spans or []]
+
+
+def _shift_regions(regions, page_delta):
+    return [
+        SimpleNamespace(page_number=region.page_number + page_delta, polygon=getattr(region, "polygon", None))
+        for region in regions or []
+    ]
+
+
+def merge_layout_results(shards):
+    """Merge per-shard layout results into one result over the whole document.
+
+    `shards` is a list of (result, first_page_index) in page order. Shard
+    contents are joined with a newline, and every paragraph, table, cell and
+    page span is shifted by the length of the content before it, so offsets
+    index into the merged content exactly as if the whole file had been
+    analyzed at once. Page numbers are shifted by each shard's first page.
+    A table that crosses a shard boundary comes back as two tables.
+    """
+    contents, paragraphs, tables, pages = [], [], [], []
+    offset = 0
+    for result, first_page in shards:
+        for page in result.pages or []:
+            pages.append(SimpleNamespace(
+                page_number=page.page_number + first_page,
+                spans=_shift_spans(page.spans, offset)
+            ))
+        for paragraph in result.paragraphs or []:
+            paragraphs.append(SimpleNamespace(
+                content=paragraph.content,
+                role=paragraph.role,
+                spans=_shift_spans(paragraph.spans, offset),
+                bounding_regions=_shift_regions(paragraph.bounding_regions, first_page)
+            ))
+        for table in result.tables or []:
+            tables.append(SimpleNamespace(
+                row_count=table.row_count,
+                column_count=table.column_count,
+                cells=[
+                    SimpleNamespace(
+                        row_index=cell.row_index,
+                        column_index=cell.column_index,
+                        content=cell.content,
+                        spans=_shift_spans(cell.spans, offset)
+                    )
+                    for cell in table.cells
+                ],
+                spans=_shift_spans(table.spans, offset),
+                bounding_regions=_shift_regions(table.bounding_regions, first_page)
+            ))
+        contents.append(result.content or "")
+        offset += len(result.content or "") + 1
+
+    return SimpleNamespace(
+        content="\n".join(contents), pages=pages, paragraphs=paragraphs, tables=tables
+    )
@@ -0,0 +1,290 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+METRIC_HELP = {
+    "summary_stage_duration_seconds": "Time spent in each document processing stage",
+    "summary_jobs_total": "Summary jobs finished, by final status",
+    "summary_job_queue_seconds": "Time summary jobs waited for a worker",
+    "summary_job_duration_seconds": "Time summary jobs spent running",
+    "summary_plans_total": "Documents processed, by plan (single_pass or multi_stage)",
+    "summary_plan_duration_seconds": "Time from the chosen plan to a finished document, by plan",
+    "summary_plan_round_seconds": "Multi-stage plan time per round of concurrent OpenAI calls",
+    "layout_requests_total": "Document Intelligence layout analyses",
+    "layout_request_duration_seconds": "Document Intelligence layout analysis latency",
+    "layout_cache_hits_total": "Layouts served from the layout cache",
+    "openai_requests_total": "OpenAI requests sent, by stage, endpoint and model",
+    "openai_request_duration_seconds": "OpenAI request latency",
+    "openai_request_errors_total": "OpenAI requests that raised",
+    "openai_retries_total": "OpenAI requests retried by the scheduler, by error type",
+    "openai_tokens_total": "OpenAI tokens reported in response usage",
+    "openai_cache_hits_total": "Chat completions served from the response cache",
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(DURATION_BUCKETS, value)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Process-wide counters and duration histograms, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def value(self, name, **labels):
+        """Current value of a counter, or the observation count of a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key in self._histograms:
+                return self._histograms[key].count
+            return self._counters.get(key, 0)
+
+    def mean(self, name, **labels):
+        """Mean of a histogram's observations, or None before the first"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            return histogram.sum / histogram.count if histogram else None
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(h.buckets), h.sum, h.count) for key, h in self._histograms.items()
+            )
+
+        lines, described = [], set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), buckets, total, count in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class Trace:
+    """Timing and usage breakdown for a single document run.
+
+    Install one with tracing() and every stage and OpenAI call made in that
+    context, including from worker threads started with asyncio.to_thread,
+    is added to it as well as to the process-wide registry.
+    """
+
+    def __init__(self):
+        self.stages = {}  # stage name -> seconds
+        self.calls = Counter()  # stage name -> OpenAI requests sent
+        self.layout_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.retries = 0
+        self.plan = None  # the planner's choice, see record_plan
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+                "openai_calls": dict(self.calls),
+                "layout_calls": self.layout_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cache_hits": self.cache_hits,
+                "errors": self.errors,
+                "retries": self.retries,
+                "plan": self._plan_report(),
+            }
+
+    def _plan_report(self):
+        if self.plan is None:
+            return None
+        report = dict(self.plan)
+        if report["mode"] == "single_pass":
+            report["openai_calls_saved"] = max(0, report["multi_stage_calls"] - sum(self.calls.values()))
+        return report
+
+    def server_timing(self):
+        """The stage breakdown as a Server-Timing header value"""
+        with self._lock:
+            return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_stage = contextvars.ContextVar("current_stage", default="other")
+
+
+@contextmanager
+def tracing(trace):
+    """Record stages and calls made in this context into trace"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time a processing stage; OpenAI calls made inside it are labelled with its name"""
+    token = _current_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_stage.reset(token)
+        metrics.observe("summary_stage_duration_seconds", elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            with trace._lock:
+                trace.stages[name] = trace.stages.get(name, 0.0) + elapsed
+
+
+def record_openai_call(endpoint, model, seconds, usage=None, error=False):
+    """Record one OpenAI request against the current stage and trace"""
+    stage_name = _current_stage.get()
+    metrics.inc("openai_requests_total", stage=stage_name, endpoint=endpoint, model=model)
+    metrics.observe("openai_request_duration_seconds", seconds, endpoint=endpoint, model=model)
+    if error:
+        metrics.inc("openai_request_errors_total", stage=stage_name, endpoint=endpoint, model=model)
+
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    if prompt_tokens:
+        metrics.inc("openai_tokens_total", prompt_tokens, stage=stage_name, model=model, type="prompt")
+    if completion_tokens:
+        metrics.inc("openai_tokens_total", completion_tokens, stage=stage_name, model=model, type="completion")
+
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.calls[stage_name] += 1
+            trace.prompt_tokens += prompt_tokens
+            trace.completion_tokens += completion_tokens
+            trace.errors += bool(error)
+
+
+def record_plan(plan, seconds):
+    """Record the processing plan chosen for a document and how long it took after layout.
+
+    Multi-stage runs record their time per round of concurrent calls. A
+    single-pass run is compared against that: the multi-stage plan's rounds
+    for the same document at the mean round time seen so far give the
+    seconds it would have taken, and so the seconds saved.
+    """
+    metrics.inc("summary_plans_total", plan=plan["mode"])
+    metrics.observe("summary_plan_duration_seconds", seconds, plan=plan["mode"])
+    report = {**plan, "seconds": round(seconds, 4)}
+    rounds = plan.get("multi_stage_rounds")
+    if plan["mode"] == "multi_stage" and rounds and not plan.get("fallback"):
+        # A fallback run also waited for the failed single-pass call
+        metrics.observe("summary_plan_round_seconds", seconds / rounds)
+    elif plan["mode"] == "single_pass" and rounds:
+        round_seconds = metrics.mean("summary_plan_round_seconds")
+        if round_seconds is not None:
+            report["multi_stage_seconds_estimate"] = round(round_seconds * rounds, 4)
+            report["seconds_saved"] = round(max(0.0, round_seconds * rounds - seconds), 4)
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.plan = report
+
+
+def record_cache_hit():
+    """Record a chat completion answered from the response cache"""
+    metrics.inc("openai_cache_hits_total", stage=_current_stage.get())
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.cache_hits += 1
+
+
+def record_layout_call(seconds):
+    """Record one Document Intelligence layout analysis"""
+    metrics.inc("layout_requests_total")
+    metrics.observe("layout_request_duration_seconds", seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.layout_calls += 1
+
+
+def record_retry(reason):
+    """Record an OpenAI request that is about to be retried"""
+    metrics.inc("openai_retries_total", reason=reason)
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.retries += 1
@@ -1,14 +1,31 @@
-import base64
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.core.credentials import AzureKeyCredential
-from dataclasses import dataclass
+import asyncio
+import contextvars
+import hashlib
+import inspect
+import logging
+import math
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from openai import AzureOpenAI
-from typing import List, Dict, Any
-from dotenv import load_dotenv
-import os
+from typing import List, Dict
 import json
+from config import settings
+from pipeline.cache import LayoutCache, ResponseCache, file_sha256
+from pipeline.chunking import estimate_tokens, split_into_windows
+from pipeline.classifier import EmbeddingSectionClassifier
+from pipeline.content import Chunk, Table
+from pipeline.clients import create_document_client, create_sync_openai_client
+from pipeline.layout import merge_layout_results, page_count, write_page_shards
+from pipeline.metrics import (
+    metrics, record_cache_hit, record_layout_call, record_openai_call, record_plan, stage
+)
+from pipeline.progress import ProgressEvent
+from pipeline.scheduler import PRIORITY_EVALUATION, PRIORITY_INTERACTIVE, RequestScheduler, shared_scheduler
+from pipeline.spans import SpanIndex
+from pipeline.versions import DocumentVersion, chunk_fingerprints, section_fingerprint, table_fingerprint
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 # Output document sections
 # Section 1: Water (floods, ports)
@@ -16,137 +33,767 @@ load_dotenv()
 # Section 3: Administrative (employees, establishments, admin supprt, etc.)
 # Section 4: Other (anything else)
 
+SECTION_NAMES = ["Water", "Fire", "Administrative", "Other"]
+
+SECTION_CLASSIFIERS = ["llm", "embedding"]
+
+SECTION_OPTIONS = """Options are:
+        - Water (floods, ports)
+        - Fire (wildfires, fire stations)
+        - Administrative (employees, establishments, admin support, etc.)
+        - Other (anything else)"""
+
+
+def table_grid(table):
+    """Lay a layout table's flat cell list out as rows of stripped cell text"""
+    grid = [[''] * table.column_count for _ in range(table.row_count)]
+    for cell in table.cells:
+        grid[cell.row_index][cell.column_index] = cell.content.strip()
+    return grid
+
+
+def parse_section_labels(reply, count):
+    """Parse a JSON array of section names, returning None for unusable entries"""
+    # Tolerate code fences or chatter around the array
+    try:
+        labels = json.loads(reply[reply.find("["):reply.rfind("]") + 1])
+    except ValueError:
+        return [None] * count
+    return _section_labels(labels, count)
+
+
+def _section_labels(labels, count):
+    """`count` labels from a parsed JSON value, None where it has no valid section name"""
+    if not isinstance(labels, list):
+        return [None] * count
+
+    parsed = []
+    for i in range(count):
+        label = labels[i] if i < len(labels) else None
+        if isinstance(label, str) and label.strip() in SECTION_NAMES:
+            parsed.append(label.strip())
+        else:
+            parsed.append(None)
+    return parsed
+
+
+def parse_score(reply):
+    """Read a 1-10 score from a {"score": ...} JSON reply; None if the reply has no such key.
+
+    Other numbers in the reply (e.g. "on a scale of 1 to 10") are never taken
+    as the score, so a malformed reply counts as a failure, not a low score.
+    """
+    try:
+        data = json.loads(reply[reply.find("{"):reply.rfind("}") + 1])
+    except ValueError:
+        return None
+    score = data.get("score") if isinstance(data, dict) else None
+    if isinstance(score, bool):
+        return None
+    try:
+        score = float(score)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(score):
+        return None
+    return min(10.0, max(1.0, score))
+
+
+def _reply_object(reply):
+    """The JSON object in a reply, tolerating code fences or chatter around it; None if there is none"""
+    try:
+        data = json.loads(reply[reply.find("{"):reply.rfind("}") + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_sections(reply, section_names):
+    """Read {"sections": {name: text}} from a single-pass reply, in section_names order.
+
+    Sections that are missing, empty or not in section_names are dropped;
+    returns None if no section is usable.
+    """
+    return _reply_sections(_reply_object(reply), section_names)
+
+
+def _reply_sections(data, section_names):
+    if data is None:
+        return None
+    sections = data.get("sections", data)
+    if not isinstance(sections, dict):
+        return None
+
+    parsed = {
+        name: sections[name].strip()
+        for name in section_names
+        if isinstance(sections.get(name), str) and sections[name].strip()
+    }
+    return parsed or None
+
+
+def parse_single_pass(reply, section_names, chunk_count):
+    """Read a single-pass reply into (sections, labels, table summaries).
+
+    Sections are read as by parse_sections, and None means none is usable.
+    Labels are one section name per numbered chunk, None where the reply
+    has no valid one; table summaries map table index to text.
+    """
+    data = _reply_object(reply)
+    if data is None:
+        return None, [None] * chunk_count, {}
+    labels = _section_labels(data.get("labels"), chunk_count)
+    table_summaries = {}
+    tables = data.get("tables")
+    for index, summary in (tables.items() if isinstance(tables, dict) else []):
+        if str(index).isdigit() and isinstance(summary, str) and summary.strip():
+            table_summaries[int(index)] = summary.strip()
+    return _reply_sections(data, section_names), labels, table_summaries
+
+
+class PartialStreamError(Exception):
+    """A streamed reply failed after part of it had gone to on_delta.
+
+    The scheduler doesn't retry it: a second attempt would send its deltas
+    after the ones already emitted.
+    """
+
+
+async def request_chat(openai_client, prompt, model, on_delta=None, **options):
+    """Send one chat completion request, returning the stripped reply and its usage.
+
+    Works with both AzureOpenAI and AsyncAzureOpenAI clients; sync clients are
+    called from a worker thread. Extra options are passed to create().
+    """
+    create = openai_client.chat.completions.create
+    messages = [{"role": "user", "content": prompt}]
+    usage = None
+    start = time.perf_counter()
+    try:
+        if not inspect.iscoroutinefunction(inspect.unwrap(create)):
+            response = await asyncio.to_thread(create, model=model, messages=messages, **options)
+            reply = response.choices[0].message.content.strip()
+            usage = getattr(response, "usage", None)
+            if on_delta:
+                on_delta(reply)
+        elif on_delta:
+            parts = []
+            stream = await create(
+                model=model, messages=messages, stream=True,
+                stream_options={"include_usage": True}, **options
+            )
+            try:
+                async for chunk in stream:
+                    # Azure sends content-filter chunks with no choices, and the
+                    # usage arrives on a final chunk with no choices either
+                    usage = getattr(chunk, "usage", None) or usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        on_delta(delta)
+            except Exception as e:
+                if parts:
+                    raise PartialStreamError(f"Reply stream failed after {len(parts)} deltas: {e}") from e
+                raise
+            reply = "".join(parts).strip()
+        else:
+            response = await create(model=model, messages=messages, **options)
+            reply = response.choices[0].message.content.strip()
+            usage = getattr(response, "usage", None)
+    except Exception:
+        record_openai_call("chat", model, time.perf_counter() - start, error=True)
+        raise
+    record_openai_call("chat", model, time.perf_counter() - start, usage)
+    return reply, usage
+
+
+async def scheduled_chat(scheduler, openai_client, prompt, model, priority, on_delta=None, **options):
+    """request_chat through a RequestScheduler, settling its token estimate with the real usage"""
+    estimated = estimate_tokens(prompt) + settings.OPENAI_COMPLETION_TOKENS_ESTIMATE
+    reply, usage = await scheduler.run(
+        lambda: request_chat(openai_client, prompt, model, on_delta, **options), estimated, priority
+    )
+    actual = getattr(usage, "total_tokens", None)
+    if actual is not None:
+        scheduler.settle(estimated, actual)
+    return reply
+
+
+def group_sections(content, labels):
+    """Group chunks by section label, keeping document order within each section"""
+    section_chunks = {}
+    for chunk, section in zip(content, labels):
+        if section not in section_chunks:
+            section_chunks[section] = []
+        section_chunks[section].append(chunk)
+    return section_chunks
+
+
+def section_fingerprints(section_names, fingerprints, labels, example_document):
+    """Fingerprint of each section's chunks (by label) and template example"""
+    return {
+        section_name: section_fingerprint(
+            [fingerprint for fingerprint, label in zip(fingerprints, labels) if label == section_name],
+            example_document.sections.get(section_name)
+        )
+        for section_name in section_names
+    }
+
+
 class Document:
-    def __init__(self, sections: Dict[str, str], tables: List[Dict[str, Any]] = None):
+    def __init__(self, sections: Dict[str, str], tables: List[Table] = None,
+                 version: DocumentVersion = None):
         self.sections = sections
         self.tables = tables or []
+        # Set on processed documents, for re-summarizing the next revision
+        self.version = version
 
 
 class DocumentProcessor:
-    def __init__(self, doc_client, openai_client):
+    def __init__(self, doc_client, openai_client, max_concurrency: int = None,
+                 layout_cache: LayoutCache = None, response_cache: ResponseCache = None,
+                 scheduler: RequestScheduler = None, priority: int = PRIORITY_INTERACTIVE):
         self.doc_client = doc_client
+        self.layout_cache = layout_cache
+        self.response_cache = response_cache
+        # Every OpenAI request goes through the scheduler, which enforces the
+        # deployment's quotas and retries rate limits and transient errors
+        self.scheduler = scheduler or shared_scheduler()
+        self.priority = priority
+        # Either an AzureOpenAI or an AsyncAzureOpenAI client. Sync clients are
+        # driven from worker threads so the async stages work with both.
         self.openai_client = openai_client
+        self.max_concurrency = max_concurrency or settings.OPENAI_MAX_CONCURRENCY
+        self.embedding_classifier = EmbeddingSectionClassifier(
+            self._embed,
+            min_margin=settings.EMBEDDING_MIN_MARGIN,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_concurrency=self.max_concurrency
+        )
 
-    def process_document(self, pdf_path, example_document):
+    def process_document(self, pdf_path, example_document, progress=None, previous=None):
         """Extract text from a PDF file and process it into sections"""
-        content, tables = self._extract_content(pdf_path)
-        
-        section_chunks = {}
-        for chunk in content:
-            if chunk.get('role') == 'table':
-                table_index = chunk.get('table_index')
-                table_summary = tables[table_index]['metadata']['summary']
-                section = self._ask_gpt_which_section(
-                    chunk['text'],
-                    is_table=True,
-                    table_summary=table_summary
+        return asyncio.run(self.aprocess_document(pdf_path, example_document, progress, previous=previous))
+
+    async def aprocess_document(self, pdf_path, example_document, progress=None,
+                                stream_sections=False, classifier=None, previous=None):
+        """Async version of process_document, fanning LLM calls out concurrently.
+
+        `progress` is called with a ProgressEvent as each stage advances. With
+        stream_sections, section text is also reported token by token as
+        section_delta events while it is generated. `classifier` picks the
+        section classifier ("llm" or "embedding"), defaulting to
+        settings.SECTION_CLASSIFIER.
+
+        `previous` is the DocumentVersion of an earlier revision of the same
+        document. Table summaries and section labels are then reused for
+        tables and chunks that are unchanged, and only sections whose chunks
+        changed are regenerated. The returned Document's `version` is what
+        to pass as `previous` for the next revision.
+        """
+        progress = progress or (lambda event: None)
+
+        with stage('layout'):
+            content, tables = await asyncio.to_thread(self._extract_content, pdf_path)
+        progress(ProgressEvent(
+            'layout_extracted',
+            f'Extracted {len(content)} chunks and {len(tables)} tables',
+            data={'chunks': len(content), 'tables': len(tables)}
+        ))
+
+        previous = previous or DocumentVersion(version=0)
+        version = DocumentVersion(version=previous.version + 1)
+        # Table summaries and chunk labels carried over from the previous revision
+        table_fingerprints = [table_fingerprint(table_data) for table_data in tables]
+        for table_data, fingerprint in zip(tables, table_fingerprints):
+            table_data.summary = previous.table_summaries.get(fingerprint)
+        fingerprints = chunk_fingerprints(content, table_fingerprints)
+        labels = [previous.labels.get(fingerprint) for fingerprint in fingerprints]
+
+        # Small documents are classified and summarized in one call
+        plan = self._plan(content, tables, example_document, stream_sections, classifier)
+        progress(ProgressEvent(
+            'plan_chosen', f"Using the {plan['mode']} plan for ~{plan['estimated_tokens']} tokens", data=plan
+        ))
+        start = time.perf_counter()
+        if plan['mode'] == 'single_pass':
+            with stage('single_pass'):
+                sections = await self._process_single_pass(
+                    content, tables, table_fingerprints, example_document, previous, version,
+                    fingerprints, labels, progress
                 )
-                if section not in section_chunks:
-                    section_chunks[section] = []
-                section_chunks[section].append({
-                    'text': chunk['text'],
-                    'is_table': True,
-                    'table_index': table_index
-                })
-            else:
-                section = self._ask_gpt_which_section(chunk['text'])
-                if section not in section_chunks:
-                    section_chunks[section] = []
-                section_chunks[section].append({
-                    'text': chunk['text'],
-                    'is_table': False
-                })
+            if sections is not None:
+                record_plan(plan, time.perf_counter() - start)
+                return Document(sections, tables, version)
+            plan = {**plan, 'mode': 'multi_stage', 'fallback': True}
+            progress(ProgressEvent(
+                'plan_chosen', 'The single-pass reply had no usable sections, falling back to the multi_stage plan',
+                data=plan
+            ))
 
-        sections = {}
-        for section_name, section_content in section_chunks.items():
-            example_content = example_document.sections.get(section_name)
-            sections[section_name] = self._generate_section(section_content, example_content, tables)
+        with stage('table_summaries'):
+            pending = [table_data for table_data in tables if table_data.summary is None]
+            await self._summarize_tables(pending, progress)
+            version.table_summaries = {
+                fingerprint: table_data.summary
+                for table_data, fingerprint in zip(tables, table_fingerprints)
+            }
+            version.reused['tables'] = len(tables) - len(pending)
 
-        return Document(sections, tables)
+        with stage('classification'):
+            pending = [i for i, label in enumerate(labels) if label is None]
+            if pending:
+                new_labels = await self._classify_labels(
+                    [content[i] for i in pending], tables, progress, classifier
+                )
+                for i, label in zip(pending, new_labels):
+                    labels[i] = label
+            section_chunks = group_sections(content, labels)
+            version.labels = dict(zip(fingerprints, labels))
+            version.reused['chunks'] = len(content) - len(pending)
 
-    def _extract_content(self, pdf_path):
-        """Extract and process content from a PDF file"""
-        with open(pdf_path, "rb") as doc:
-            file_content = doc.read()
-            file_content_base64 = base64.b64encode(file_content).decode("utf-8")
+        with stage('section_generation'):
+            fingerprint_of = section_fingerprints(section_chunks, fingerprints, labels, example_document)
+            reuse = {}
+            for section_name, fingerprint in fingerprint_of.items():
+                text = previous.section_text(section_name, fingerprint)
+                if text is not None:
+                    reuse[section_name] = text
+            sections = await self._generate_sections(
+                section_chunks, example_document, tables, progress, stream_sections, reuse
+            )
+            version.sections = {
+                section_name: {'fingerprint': fingerprint, 'text': sections[section_name]}
+                for section_name, fingerprint in fingerprint_of.items()
+            }
+            version.reused['sections'] = len(reuse)
+
+        record_plan(plan, time.perf_counter() - start)
+        return Document(sections, tables, version)
+
+    def _plan(self, content, tables, example_document, stream_sections=False, classifier=None):
+        """Choose between one single-pass call and the multi-stage pipeline.
+
+        Documents whose source text (tables included in full) is estimated
+        at no more than SINGLE_PASS_MAX_TOKENS go single pass, unless section
+        text is streamed or the embedding classifier is asked for, which only
+        the multi-stage pipeline does. The plan also counts the calls the
+        multi-stage pipeline would make and in how many rounds, so the saving
+        in calls and time can be reported.
+        """
+        estimated = estimate_tokens(self._single_pass_source(content, tables))
+        threshold = settings.SINGLE_PASS_MAX_TOKENS
+        if settings.CLASSIFICATION_BATCH_SIZE > 1:
+            classification_calls = len(self._batch_chunks(content, tables))
+        else:
+            classification_calls = len(content)
+        llm_classifier = (classifier or settings.SECTION_CLASSIFIER) == 'llm'
+        single_pass = bool(content) and 0 < estimated <= threshold and not stream_sections and llm_classifier
+        stage_calls = [len(tables), classification_calls, len(example_document.sections)]
+        return {
+            'mode': 'single_pass' if single_pass else 'multi_stage',
+            'estimated_tokens': estimated,
+            'threshold': threshold,
+            # A summary per table, the classification calls and one call per section
+            'multi_stage_calls': sum(stage_calls),
+            # The stages run one after the other, each in rounds of up to max_concurrency calls
+            'multi_stage_rounds': sum(math.ceil(calls / self.max_concurrency) for calls in stage_calls),
+        }
+
+    async def _process_single_pass(self, content, tables, table_fingerprints, example_document,
+                                   previous, version, fingerprints, labels, progress):
+        """The single-pass plan: classify, summarize tables and write sections in one call.
 
-        analyze_request = {
-            "base64Source": file_content_base64
+        `labels` holds the labels known from `previous`. If every chunk has
+        one, sections whose chunks and example are unchanged keep their
+        previous text and only the others are asked for. Fills in `version`
+        like the multi-stage pipeline and returns the sections in template
+        order, or None (leaving tables and labels as they were) if the reply
+        has no usable section.
+        """
+        section_names = list(example_document.sections)
+        reuse = {}
+        if all(labels):
+            fingerprint_of = section_fingerprints(section_names, fingerprints, labels, example_document)
+            for section_name, fingerprint in fingerprint_of.items():
+                text = previous.section_text(section_name, fingerprint)
+                if text is not None:
+                    reuse[section_name] = text
+
+        wanted = [section_name for section_name in section_names if section_name not in reuse]
+        pending_tables = [i for i, table_data in enumerate(tables) if table_data.summary is None]
+        known = sum(1 for label in labels if label)
+        generated = {}
+        if wanted:
+            reply = await self._single_pass(content, tables, example_document, wanted, pending_tables)
+            generated, new_labels, table_summaries = parse_single_pass(reply, wanted, len(content))
+            if generated is None:
+                return None
+            labels = [label or new_label for label, new_label in zip(labels, new_labels)]
+            for i in pending_tables:
+                tables[i].summary = table_summaries.get(i)
+
+        if tables:
+            progress(ProgressEvent('tables_summarized', f'Summarized {len(tables)}/{len(tables)} tables',
+                                   current=len(tables), total=len(tables)))
+        progress(ProgressEvent('chunks_classified', f'Classified {len(content)}/{len(content)} chunks',
+                               current=len(content), total=len(content)))
+        sections = {
+            section_name: reuse[section_name] if section_name in reuse else generated[section_name]
+            for section_name in section_names
+            if section_name in reuse or section_name in generated
+        }
+        for done, section_name in enumerate(sections, 1):
+            progress(ProgressEvent(
+                'section_generated', f'Generated section {section_name}',
+                current=done, total=len(sections), data={'section': section_name}
+            ))
+
+        version.table_summaries = {
+            fingerprint: table_data.summary
+            for table_data, fingerprint in zip(tables, table_fingerprints)
+            if table_data.summary is not None
+        }
+        version.labels = {fingerprint: label for fingerprint, label in zip(fingerprints, labels) if label}
+        # Section fingerprints depend on every chunk's label, so sections are
+        # only stored for reuse when every chunk has one
+        if all(labels):
+            fingerprint_of = section_fingerprints(sections, fingerprints, labels, example_document)
+            version.sections = {
+                section_name: {'fingerprint': fingerprint, 'text': sections[section_name]}
+                for section_name, fingerprint in fingerprint_of.items()
+            }
+        version.reused = {
+            'tables': len(tables) - len(pending_tables), 'chunks': known, 'sections': len(reuse)
         }
-        poller = self.doc_client.begin_analyze_document(
-            "prebuilt-layout", 
-            analyze_request=analyze_request
+        return sections
+
+    def _single_pass_source(self, content, tables):
+        """The document in reading order, numbered by chunk, with each table written out in full"""
+        parts = []
+        for i, chunk in enumerate(content):
+            if chunk.is_table:
+                table = tables[chunk.table_index]
+                lines = [' | '.join(table.headers)] + [' | '.join(row) for row in table.rows()]
+                parts.append(f"[{i + 1}] [Table {chunk.table_index}]\n" + '\n'.join(lines))
+            else:
+                parts.append(f"[{i + 1}] {chunk.text}")
+        return '\n\n'.join(parts)
+
+    async def _single_pass(self, content, tables, example_document, section_names, table_indexes):
+        """Label every chunk, summarize the tables in table_indexes and write section_names in one call.
+
+        The call is made in JSON mode; the raw reply is returned for parse_single_pass.
+        """
+        examples = '\n\n'.join(f"{name}:\n{example_document.sections[name]}" for name in section_names)
+        table_request = ''
+        if table_indexes:
+            table_request = f"""
+        - "tables": an object mapping each of the tables {', '.join(map(str, table_indexes))} to a 2-3 sentence summary of what it tracks and what its columns contain"""
+        prompt = f"""Write a summary of the following document, sorting its numbered paragraphs and tables into sections. {SECTION_OPTIONS}
+
+        Here's an example of what each section should look like:
+        {examples}
+
+        Document:
+        {self._single_pass_source(content, tables)}
+
+        When referring to tables, incorporate the table information naturally into the narrative.
+        Respond with a JSON object like {{"labels": ["Water", ...], "sections": {{"Water": "section text", ...}}}} containing:
+        - "labels": a list of {len(content)} section names, the section of each numbered paragraph or table in order{table_request}
+        - "sections": the section texts with these keys: {', '.join(section_names)}. Use null for a section the document has nothing for."""
+
+        return await self._chat(prompt, response_format={"type": "json_object"})
+
+    async def _summarize_tables(self, tables, progress=None):
+        """Generate all table summaries concurrently, storing them on each table"""
+        progress = progress or (lambda event: None)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        done = 0
+
+        async def summarize(table_data):
+            nonlocal done
+            async with semaphore:
+                summary = await self._generate_table_summary(table_data)
+            done += 1
+            progress(ProgressEvent('tables_summarized', f'Summarized {done}/{len(tables)} tables',
+                                   current=done, total=len(tables)))
+            return summary
+
+        summaries = await asyncio.gather(*(summarize(table_data) for table_data in tables))
+        for table_data, summary in zip(tables, summaries):
+            table_data.summary = summary
+
+    async def _generate_sections(self, section_chunks, example_document, tables,
+                                 progress=None, stream_sections=False, reuse=None):
+        """Generate every section concurrently, keeping the classification order of sections.
+
+        Sections in `reuse` (section name -> text) keep that text instead.
+        """
+        reuse = reuse or {}
+        progress = progress or (lambda event: None)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        done = 0
+
+        async def generate(section_name, section_content):
+            nonlocal done
+            on_delta = None
+            if stream_sections:
+                def on_delta(text):
+                    progress(ProgressEvent('section_delta', text, data={'section': section_name}))
+
+            if section_name in reuse:
+                text = reuse[section_name]
+                if on_delta:
+                    on_delta(text)
+            else:
+                # The semaphore is taken per call inside, so map-reduce calls share the same limit
+                example_content = example_document.sections.get(section_name)
+                text = await self._generate_section(section_content, example_content, tables,
+                                                    on_delta, semaphore)
+            done += 1
+            progress(ProgressEvent(
+                'section_generated', f'Generated section {section_name}',
+                current=done, total=len(section_chunks), data={'section': section_name}
+            ))
+            return text
+
+        generated = await asyncio.gather(*(
+            generate(section_name, section_content)
+            for section_name, section_content in section_chunks.items()
+        ))
+        return dict(zip(section_chunks, generated))
+
+    async def _classify_chunks(self, content, tables, progress=None, classifier=None):
+        """Classify every chunk concurrently, keeping document order within each section"""
+        labels = await self._classify_labels(content, tables, progress, classifier)
+        return group_sections(content, labels)
+
+    async def _classify_labels(self, content, tables, progress=None, classifier=None):
+        """Section label of every chunk, in content order"""
+        progress = progress or (lambda event: None)
+        classifier = classifier or settings.SECTION_CLASSIFIER
+        if classifier not in SECTION_CLASSIFIERS:
+            raise ValueError(f"Unknown section classifier: {classifier}")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        done = 0
+
+        def classified(count):
+            nonlocal done
+            done += count
+            progress(ProgressEvent('chunks_classified', f'Classified {done}/{len(content)} chunks',
+                                   current=done, total=len(content)))
+
+        async def classify(chunk):
+            async with semaphore:
+                if chunk.is_table:
+                    table_summary = tables[chunk.table_index].summary
+                    return await self._ask_gpt_which_section(
+                        chunk.text,
+                        is_table=True,
+                        table_summary=table_summary
+                    )
+                return await self._ask_gpt_which_section(chunk.text)
+
+        async def classify_one(chunk):
+            label = await classify(chunk)
+            classified(1)
+            return label
+
+        async def classify_batch(batch):
+            async with semaphore:
+                labels = await self._ask_gpt_which_sections(
+                    [self._classification_text(chunk, tables) for chunk in batch]
+                )
+            # Fall back to one call per chunk for anything the batch reply didn't cover
+            missing = [i for i, label in enumerate(labels) if label is None]
+            fallback = await asyncio.gather(*(classify(batch[i]) for i in missing))
+            for i, label in zip(missing, fallback):
+                labels[i] = label
+            classified(len(batch))
+            return labels
+
+        if classifier == 'embedding':
+            labels, _ = await self.embedding_classifier.classify(
+                [self._classification_text(chunk, tables) for chunk in content]
+            )
+            classified(sum(label is not None for label in labels))
+            # Escalate chunks too close to call to the LLM
+            missing = [i for i, label in enumerate(labels) if label is None]
+            fallback = await asyncio.gather(*(classify_one(content[i]) for i in missing))
+            for i, label in zip(missing, fallback):
+                labels[i] = label
+        elif settings.CLASSIFICATION_BATCH_SIZE > 1:
+            batches = self._batch_chunks(content, tables)
+            batch_labels = await asyncio.gather(*(classify_batch(batch) for batch in batches))
+            labels = [label for batch in batch_labels for label in batch]
+        else:
+            labels = await asyncio.gather(*(classify_one(chunk) for chunk in content))
+        return list(labels)
+
+    def _classification_text(self, chunk, tables):
+        """Text the classifier sees for a chunk; tables are represented by their summary"""
+        if chunk.is_table:
+            table_summary = tables[chunk.table_index].summary
+            return f"{chunk.text}. Summary: {table_summary}"
+        return chunk.text
+
+    def _batch_chunks(self, content, tables):
+        """Group chunks into batches bounded by CLASSIFICATION_BATCH_SIZE and _BATCH_TOKENS"""
+        batches = []
+        batch, batch_tokens = [], 0
+        for chunk in content:
+            tokens = estimate_tokens(self._classification_text(chunk, tables))
+            if batch and (len(batch) >= settings.CLASSIFICATION_BATCH_SIZE
+                          or batch_tokens + tokens > settings.CLASSIFICATION_BATCH_TOKENS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(chunk)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _chat(self, prompt, model="gpt-4o-mini", on_delta=None, **options):
+        """Run a single-prompt chat completion and return the stripped reply.
+
+        If on_delta is given it receives the reply text incrementally; async
+        clients stream it token by token, otherwise it arrives in one piece.
+        Extra options are passed to create().
+        """
+        if self.response_cache is not None:
+            cached = self.response_cache.get(model, prompt)
+            if cached is not None:
+                record_cache_hit()
+                if on_delta:
+                    on_delta(cached)
+                return cached
+
+        reply = await scheduled_chat(
+            self.scheduler, self.openai_client, prompt, model, self.priority, on_delta, **options
         )
+
+        if self.response_cache is not None:
+            self.response_cache.set(model, prompt, reply)
+        return reply
+
+    async def _embed(self, texts, model=None):
+        """Embed a list of texts, returning one vector per text"""
+        model = model or settings.EMBEDDING_MODEL
+        create = self.openai_client.embeddings.create
+
+        async def request():
+            start = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(inspect.unwrap(create)):
+                    response = await create(model=model, input=texts)
+                else:
+                    response = await asyncio.to_thread(create, model=model, input=texts)
+            except Exception:
+                record_openai_call("embeddings", model, time.perf_counter() - start, error=True)
+                raise
+            record_openai_call("embeddings", model, time.perf_counter() - start, getattr(response, "usage", None))
+            return response
+
+        estimated = sum(estimate_tokens(text) for text in texts)
+        response = await self.scheduler.run(request, estimated, self.priority)
+        actual = getattr(getattr(response, "usage", None), "total_tokens", None)
+        if actual is not None:
+            self.scheduler.settle(estimated, actual)
+        return [item.embedding for item in response.data]
+
+    def _extract_content(self, pdf_path):
+        """Extract and process content from a PDF file, reusing cached layouts when possible"""
+        if self.layout_cache is None:
+            return self._analyze_layout(pdf_path)
+
+        key = file_sha256(pdf_path)
+        cached = self.layout_cache.get(key)
+        if cached is not None:
+            metrics.inc("layout_cache_hits_total")
+            return cached
+
+        content, tables = self._analyze_layout(pdf_path)
+        self.layout_cache.set(key, content, tables)
+        return content, tables
+
+    def _run_layout(self, pdf_path):
+        """Run prebuilt-layout on a single PDF file and wait for the result"""
+        # Stream the file as the raw request body rather than building a base64 copy
+        start = time.perf_counter()
+        with open(pdf_path, "rb") as doc:
+            poller = self.doc_client.begin_analyze_document(
+                "prebuilt-layout",
+                body=doc,
+                content_type="application/octet-stream"
+            )
         result = poller.result()
+        record_layout_call(time.perf_counter() - start)
+        return result
+
+    def _run_sharded_layout(self, pdf_path, shard_pages):
+        """Analyze page-range shards of a PDF concurrently and merge them into one result"""
+        with tempfile.TemporaryDirectory() as shard_dir:
+            shards = write_page_shards(pdf_path, shard_pages, shard_dir)
+            with ThreadPoolExecutor(max_workers=settings.LAYOUT_SHARD_CONCURRENCY) as pool:
+                # Each shard runs in a copy of this context so it is counted in the current trace
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._run_layout, path)
+                    for path, _ in shards
+                ]
+                results = [future.result() for future in futures]
+        return merge_layout_results([
+            (result, first_page) for result, (_, first_page) in zip(results, shards)
+        ])
+
+    def _analyze_layout(self, pdf_path):
+        """Run prebuilt-layout on a PDF and split it into content chunks and tables"""
+        shard_pages = settings.LAYOUT_SHARD_PAGES
+        if shard_pages and page_count(pdf_path) > shard_pages:
+            result = self._run_sharded_layout(pdf_path, shard_pages)
+        else:
+            result = self._run_layout(pdf_path)
+
+        result_tables = [table for table in result.tables or [] if len(table.cells) > 0]
 
-        # Get spans of all tables
-        table_spans = []
-        for table in result.tables:
-            if len(table.cells) > 0:
-                table_spans.append((table.spans[0].offset, table.spans[0].offset + table.spans[0].length))
+        # Index every span of every table so each paragraph is a couple of bisects
+        table_spans = SpanIndex(
+            (span.offset, span.offset + span.length)
+            for table in result_tables
+            for span in table.spans
+        )
 
         # Filter paragraphs to exclude table content
         content = []
         tables = []  # New list to store table data separately
 
-        for paragraph in result.paragraphs:
-            # Check if paragraph overlaps with any table
-            para_start = paragraph.spans[0].offset
-            para_end = para_start + paragraph.spans[0].length
-            
+        for paragraph in result.paragraphs or []:
+            # Check if any part of the paragraph overlaps with a table
             is_in_table = any(
-                (table_start <= para_start < table_end) or 
-                (table_start < para_end <= table_end)
-                for table_start, table_end in table_spans
+                table_spans.overlaps(span.offset, span.offset + span.length)
+                for span in paragraph.spans
             )
-            
+
             if not is_in_table:
-                content.append({
-                    'text': paragraph.content,
-                    'role': paragraph.role
-                })
-
-        # Updated table processing
-        for table in result.tables:
-            if len(table.cells) > 0:
-                headers = [cell.content.strip() for cell in table.cells[0]]
-                table_content = {
-                    'headers': headers,
-                    'rows': []
-                }
-                
-                for row_cells in table.cells[1:]:
-                    row_data = {}
-                    for header, cell in zip(headers, row_cells):
-                        row_data[header] = cell.content.strip()
-                    table_content['rows'].append(row_data)
-                
-                table_data = {
-                    'content': table_content,
-                    'metadata': {
-                        'summary': None,
-                        'description': None
-                    }
-                }
-                table_data['metadata']['summary'] = self._generate_table_summary(table_data)
-
-                tables.append(table_data)  # Store structured table data
-                # Add table reference to content for section classification
-                content.append({
-                    'text': f"Table with columns: {', '.join(headers)}",
-                    'role': 'table',
-                    'table_index': len(tables) - 1
-                })
+                content.append(Chunk(paragraph.content, paragraph.role))
+
+        # Tables are stored column by column, the first grid row being the headers
+        for table in result_tables:
+            grid = table_grid(table)
+            headers = grid[0]
+            tables.append(Table.from_rows(headers, grid[1:]))
+            # Add table reference to content for section classification
+            content.append(Chunk(
+                f"Table with columns: {', '.join(headers)}",
+                role='table',
+                table_index=len(tables) - 1
+            ))
 
         return content, tables
 
-    def _ask_gpt_which_section(self, text, is_table=False, table_summary=None):
+    async def _ask_gpt_which_section(self, text, is_table=False, table_summary=None):
         """Ask GPT which section the text belongs to"""
-        base_prompt = f"""Which section does the following text belong to? Options are:
-        - Water (floods, ports)
-        - Fire (wildfires, fire stations)
-        - Administrative (employees, establishments, admin support, etc.)
-        - Other (anything else)"""
+        base_prompt = f"""Which section does the following text belong to? {SECTION_OPTIONS}"""
 
         if is_table:
             prompt = f"""{base_prompt}
@@ -161,22 +808,41 @@ class DocumentProcessor:
 
             Return only the section name, nothing else."""
 
-        response = self.openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return response.choices[0].message.content.strip()
+        return await self._chat(prompt)
+
+    async def _ask_gpt_which_sections(self, texts):
+        """Ask GPT to classify several numbered paragraphs in one call.
+
+        Returns one label per text; entries the reply doesn't answer with a
+        valid section name are None so the caller can retry them individually.
+        """
+        numbered = "\n\n".join(f"[{i + 1}] {text}" for i, text in enumerate(texts))
+        prompt = f"""Which section does each of the following numbered paragraphs belong to? {SECTION_OPTIONS}
 
-    def _generate_section(self, section_content, example_content, tables):
+        Paragraphs:
+        {numbered}
+
+        Return only a JSON array of {len(texts)} section names, one per paragraph in order, nothing else."""
+
+        reply = await self._chat(prompt)
+        return parse_section_labels(reply, len(texts))
+
+    async def _generate_section(self, section_content, example_content, tables, on_delta=None, semaphore=None):
+        """Generate one section; every OpenAI call it makes holds a slot of `semaphore`"""
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
         # Modify content processing to handle table references
         processed_content = []
         for chunk in section_content:
-            if chunk['is_table']:
-                table = tables[chunk['table_index']]
-                table_summary = table['metadata']['summary']
-                processed_content.append(f"[Table {chunk['table_index']}: {table_summary}]")
+            if chunk.is_table:
+                table_summary = tables[chunk.table_index].summary
+                processed_content.append(f"[Table {chunk.table_index}: {table_summary}]")
             else:
-                processed_content.append(chunk['text'])
+                processed_content.append(chunk.text)
+
+        # Large sections are summarized window by window, then reduced until they fit
+        budget = settings.SECTION_TOKEN_BUDGET
+        if estimate_tokens(' '.join(processed_content)) > budget:
+            processed_content = await self._reduce_section_content(processed_content, budget, semaphore)
 
         prompt = f"""Generate a section using these text chunks as source material.
         Here's an example of what the section should look like:
@@ -187,56 +853,130 @@ class DocumentProcessor:
 
         When referring to tables, incorporate the table information naturally into the narrative."""
 
-        response = self.openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return response.choices[0].message.content.strip()
+        async with semaphore:
+            return await self._chat(prompt, on_delta=on_delta)
+
+    async def _reduce_section_content(self, pieces, budget, semaphore):
+        """Map-reduce source chunks into partial summaries that fit within budget.
+
+        The map step summarizes each budget-sized window concurrently; each
+        reduce step merges up to SECTION_REDUCE_FAN_OUT partial summaries at
+        a time, repeating until everything fits in one window. Calls hold a
+        slot of the caller's semaphore, so they count against the same limit
+        as the other sections being generated.
+        """
+
+        async def summarize(window, instructions):
+            prompt = f"""{instructions}
+        Keep every fact, figure, name and table reference; drop only repetition.
+
+        Source:
+        {' '.join(window)}"""
+            async with semaphore:
+                return await self._chat(prompt)
 
-    def _generate_table_summary(self, table_data):
+        async def combine(window):
+            if len(window) == 1:
+                return window[0]
+            return await summarize(
+                window, "Combine these partial summaries of the same report section into one."
+            )
+
+        windows = split_into_windows(pieces, budget)
+        pieces = await asyncio.gather(*(
+            summarize(window, "Summarize these source chunks for one section of a report.")
+            for window in windows
+        ))
+
+        fan_out = max(settings.SECTION_REDUCE_FAN_OUT, 2)
+        while len(pieces) > 1 and estimate_tokens(' '.join(pieces)) > budget:
+            windows = split_into_windows(pieces, budget, max_items=fan_out)
+            if len(windows) == len(pieces):
+                # Every summary fills a window on its own, merging can't shrink them further
+                break
+            pieces = await asyncio.gather(*(combine(window) for window in windows))
+        return list(pieces)
+
+    async def _generate_table_summary(self, table_data):
         """Generate a summary description for a table"""
-        headers = table_data['content']['headers']
-        example_rows = table_data['content']['rows'][:3]
+        headers = table_data.headers
+        example_rows = table_data.row_dicts(limit=3)
         prompt = f"""Analyze this table and provide a brief summary of its purpose and content.
 
         Table Headers: {', '.join(headers)}
         Example Rows:
-        {json.dumps(example_rows, index=2)}
+        {json.dumps(example_rows, indent=2)}
 
         Provide a concise summary (2-3 sentences) that explains:
         1. What this table appears to be tracking or documenting
         2. What key information the columsn contain
         """
-        response = self.openai_client.chat.completions.create(
-            model="gpt-40-mini",
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        return response.choices[0].message.content.strip()
+        return await self._chat(prompt)
 
 
 
 class DocumentEvaluator:
-    def __init__(self, openai_client: AzureOpenAI):
+    """Scores generated sections against a template's sections with an LLM judge.
+
+    Sections are scored concurrently at evaluation priority. Scores are
+    cached by a hash of the judge model, prompt version and both texts, so
+    re-running an unchanged corpus costs nothing.
+    """
+
+    # Bump when the scoring prompt changes so cached scores aren't reused
+    PROMPT_VERSION = 2
+
+    def __init__(self, openai_client: AzureOpenAI, response_cache: ResponseCache = None,
+                 scheduler: RequestScheduler = None, max_concurrency: int = None,
+                 model: str = "gpt-4o-mini"):
         self.openai_client = openai_client
+        self.response_cache = response_cache
+        self.scheduler = scheduler or shared_scheduler()
+        self.max_concurrency = max_concurrency or settings.OPENAI_MAX_CONCURRENCY
+        self.model = model
 
     def compare_documents(self, generated_document, example_document):
-        scores = {}
-        for section_name in example_document.sections:
-            if section_name in generated_document.sections:
-                scores[section_name] = self._compare_sections(
+        return asyncio.run(self.acompare_documents(generated_document, example_document))
+
+    async def acompare_documents(self, generated_document, example_document):
+        """Score every section concurrently; missing sections score 0.
+
+        Sections whose reply has no usable score are listed under `unscored`
+        and left out of the overall score.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def score(section_name):
+            if section_name not in generated_document.sections:
+                return 0
+            async with semaphore:
+                return await self._compare_sections(
                     generated_document.sections[section_name],
                     example_document.sections[section_name]
                 )
-            else:
-                scores[section_name] = 0
+
+        section_names = list(example_document.sections)
+        scores = dict(zip(section_names, await asyncio.gather(*(score(name) for name in section_names))))
+        scored = [value for value in scores.values() if value is not None]
 
         return {
             'section_scores': scores,
-            'overall_score': sum(scores.values()) / len(scores)
+            'overall_score': sum(scored) / len(scored) if scored else 0,
+            'unscored': [name for name, value in scores.items() if value is None]
         }
 
-    def _compare_sections(self, generated_section, example_section):
+    def _score_key(self, generated_section, example_section):
+        content = json.dumps([self.PROMPT_VERSION, self.model, example_section, generated_section])
+        return "score:" + hashlib.sha256(content.encode()).hexdigest()
+
+    async def _compare_sections(self, generated_section, example_section):
+        key = self._score_key(generated_section, example_section)
+        if self.response_cache is not None:
+            cached = self.response_cache.get(self.model, key)
+            if cached is not None:
+                record_cache_hit()
+                return float(cached)
+
         prompt = f"""Compare these two sections and rate the generated section on a scale of 1 to 10.
         Here's the example section:
         {example_section}
@@ -244,27 +984,26 @@ class DocumentEvaluator:
         Here's the generated section:
         {generated_section}
 
-        Return only the score, nothing else."""
+        Respond with a JSON object like {{"score": 7, "reason": "one short sentence"}}."""
 
-        response = self.openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        reply = await scheduled_chat(
+            self.scheduler, self.openai_client, prompt, self.model, PRIORITY_EVALUATION,
+            response_format={"type": "json_object"}
         )
-        return float(response.choices[0].message.content.strip())
-            
+        score = parse_score(reply)
+        if score is None:
+            logger.warning("Could not parse a score from evaluation reply: %r", reply)
+            return None
 
+        if self.response_cache is not None:
+            self.response_cache.set(self.model, key, str(score))
+        return score
 
-def main():
-    doc_client = DocumentIntelligenceClient(
-        endpoint=os.getenv("AZURE_ENDPOINT"),
-        credential=AzureKeyCredential(os.getenv("AZURE_API_KEY"))
-    )
 
-    openai_client = AzureOpenAI(
-        api_version="2024-08-01-preview",
-        azure_endpoint=os.getenv("OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY")
-    )
+def main():
+    # Same pooled clients as the API builds
+    doc_client = create_document_client()
+    openai_client = create_sync_openai_client()
 
     # Example document 
     example_document = Document({
@@ -0,0 +1,59 @@
+import asyncio
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class ProgressEvent:
+    """A structured progress update emitted while a document is processed.
+
+    Stages are: layout_extracted, plan_chosen (sent again if a single-pass
+    reply is unusable and the multi-stage plan takes over), tables_summarized,
+    chunks_classified, section_delta (streamed section text),
+    section_generated, document_versioned (for jobs with a document_id) and
+    docx_written.
+    """
+    stage: str
+    message: str
+    current: Optional[int] = None
+    total: Optional[int] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class ProgressStream:
+    """Progress callback that records events and replays them as async iterators.
+
+    Pass the stream itself as the `progress` callback; any number of
+    consumers can then `async for event in stream` and will see every event
+    from the start until close() is called.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def __call__(self, event: ProgressEvent):
+        self.events.append(event)
+        self._notify()
+
+    def close(self):
+        self.closed = True
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def __aiter__(self):
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.closed:
+                return
+            await self._changed.wait()
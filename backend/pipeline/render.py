@@ -0,0 +1,137 @@
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from config import settings
+
+# python-docx is imported where documents are built, keeping it out of the
+# API's startup imports
+
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+ZIP_MEDIA_TYPE = "application/zip"
+
+# Characters XML 1.0 does not allow, which python-docx would reject cell by cell
+_INVALID_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def docx_bytes(doc):
+    """Serialize a Word document in memory instead of writing it to disk"""
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _run_xml(text):
+    text = _INVALID_XML_CHARS.sub('', str(text))
+    # Same line and tab handling as python-docx's cell.text setter
+    parts = []
+    for i, line in enumerate(text.split('\n')):
+        if i:
+            parts.append('<w:br/>')
+        for j, segment in enumerate(line.split('\t')):
+            if j:
+                parts.append('<w:tab/>')
+            if segment:
+                parts.append(f'<w:t xml:space="preserve">{escape(segment)}</w:t>')
+    return f"<w:r>{''.join(parts)}</w:r>"
+
+
+def add_table_bulk(doc, headers, rows, style='Table Grid'):
+    """Append a table to doc, building all of its body rows as one XML fragment.
+
+    python-docx's add_row() and cell.text walk the table's XML for every
+    cell, which gets slow for tables with thousands of rows. Here the
+    header row is made the normal way and the remaining rows (any iterable
+    of cell sequences) are rendered to a string and parsed once.
+    """
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls, qn
+
+    table = doc.add_table(rows=1, cols=len(headers))
+    table.style = style
+    for cell, header in zip(table.rows[0].cells, headers):
+        cell.text = _INVALID_XML_CHARS.sub('', str(header))
+
+    # Reuse the column widths python-docx gave the header cells
+    widths = [cell._tc.tcPr.find(qn('w:tcW')) for cell in table.rows[0].cells]
+    cell_props = [
+        f'<w:tcPr><w:tcW w:w="{width.get(qn("w:w"))}" w:type="{width.get(qn("w:type"))}"/></w:tcPr>'
+        if width is not None else ''
+        for width in widths
+    ]
+
+    body = ''.join(
+        '<w:tr>' + ''.join(
+            f'<w:tc>{props}<w:p>{_run_xml(value)}</w:p></w:tc>'
+            for props, value in zip(cell_props, row)
+        ) + '</w:tr>'
+        for row in rows
+    )
+    if body:
+        fragment = parse_xml(f'<w:tbl {nsdecls("w")}>{body}</w:tbl>')
+        table._tbl.extend(list(fragment))
+    return table
+
+
+def table_csv(headers, rows):
+    """CSV bytes for a table, with a BOM so spreadsheet apps detect UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+def build_summary_docx(processed_content, filename, type, summary_type, include_tables,
+                       attachments=None):
+    """Render a processed Document into a Word document.
+
+    If an `attachments` dict is given, tables with more than
+    settings.DOCX_TABLE_ATTACHMENT_ROWS rows are written into it as CSV
+    files (name -> bytes) and the document refers to them instead.
+    """
+    from docx import Document as DocxDocument
+
+    doc = DocxDocument()
+    doc.add_heading(f'Document Summary', 0)
+    doc.add_paragraph(f'Summary Type: {summary_type}')
+
+    # Add document information
+    doc.add_heading(f'Document: {filename}', level=1)
+    doc.add_paragraph(f'Type: {type}')
+
+    # Add each section to the Word document
+    for section_name, content in processed_content.sections.items():
+        doc.add_heading(section_name, level=2)
+        doc.add_paragraph(content)
+
+    # Add tables only if include_tables is True
+    if include_tables and processed_content.tables:
+        doc.add_heading('Extracted Tables', level=1)
+        threshold = settings.DOCX_TABLE_ATTACHMENT_ROWS
+        for i, table_data in enumerate(processed_content.tables):
+            doc.add_heading(f'Table {i + 1}', level=2)
+
+            if attachments is not None and threshold and len(table_data) > threshold:
+                name = f'table_{i + 1}.csv'
+                attachments[name] = table_csv(table_data.headers, table_data.rows())
+                doc.add_paragraph(f'This table has {len(table_data):,} rows and is attached as {name}.')
+            else:
+                add_table_bulk(doc, table_data.headers, table_data.rows())
+
+    return doc
+
+
+def summary_package(content, attachments, filename="generated_summary.docx"):
+    """The .docx alone, or a zip of it and its attachments: (bytes, media type, filename)"""
+    if not attachments:
+        return content, DOCX_MEDIA_TYPE, filename
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(filename, content)
+        for name, data in attachments.items():
+            archive.writestr(name, data)
+    return buffer.getvalue(), ZIP_MEDIA_TYPE, filename.rsplit('.', 1)[0] + '.zip'
@@ -0,0 +1,211 @@
+import asyncio
+import bisect
+import itertools
+import random
+import threading
+import time
+
+import openai
+
+from config import settings
+from pipeline.metrics import record_retry
+
+# Lower values are served first when capacity is short
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_EVALUATION = 2
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Longest a waiter sleeps before re-checking, so newly freed capacity is noticed
+MAX_POLL_SECONDS = 1.0
+
+
+class TokenBucket:
+    """Refills continuously to `per_minute` units; a per_minute of 0 never limits"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A request larger than the whole bucket goes through once the bucket is full
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        if self.capacity:
+            self.level = min(self.capacity, self.level - amount)
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After style header on the error's response, if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        # HTTP-date values fall back to exponential backoff
+        pass
+    return None
+
+
+class RequestScheduler:
+    """Admits OpenAI requests within per-minute request and token quotas.
+
+    Requests wait in priority order: a request only goes once there is
+    capacity for it and for every request queued ahead of it, so batch and
+    evaluation traffic cannot starve interactive jobs. Rate limits, timeouts
+    and 5xx errors are retried, waiting for the Retry-After header when the
+    service sends one and jittered exponential backoff otherwise. A 429
+    pauses every request through the scheduler until the service's
+    Retry-After has passed. State is guarded by a thread lock and waits
+    are plain sleeps, so one scheduler can be shared across event loops
+    and threads.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_retries=6,
+                 backoff_base=1.0, backoff_max=60.0, seed=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._waiters = []  # sorted (priority, sequence, tokens)
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            requests_per_minute=settings.OPENAI_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.OPENAI_TOKENS_PER_MINUTE,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            backoff_base=settings.OPENAI_BACKOFF_BASE_SECONDS,
+            backoff_max=settings.OPENAI_BACKOFF_MAX_SECONDS
+        )
+
+    def _enqueue(self, tokens, priority):
+        waiter = (priority, next(self._sequence), tokens)
+        with self._lock:
+            bisect.insort(self._waiters, waiter)
+        return waiter
+
+    def _dequeue(self, waiter):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _try_acquire(self, waiter):
+        """Take capacity for waiter and return 0, or return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            position = self._waiters.index(waiter)
+            queued = self._waiters[:position + 1]
+            wait = max(
+                self._paused_until - now,
+                self.requests.wait_time(len(queued), now),
+                self.tokens.wait_time(sum(tokens for _, _, tokens in queued), now)
+            )
+            if wait > 0:
+                return min(wait, MAX_POLL_SECONDS)
+            del self._waiters[position]
+            self.requests.take(1)
+            self.tokens.take(waiter[2])
+            return 0
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Correct the token bucket once a response reports how many tokens it really used"""
+        with self._lock:
+            self.tokens.take(actual_tokens - estimated_tokens)
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before retrying after error, or None to give up"""
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+            return None
+        delay = _retry_after(error)
+        if delay is None:
+            # Full jitter keeps retrying clients from synchronizing
+            delay = self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if isinstance(error, openai.RateLimitError):
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        record_retry(type(error).__name__)
+        return delay
+
+    async def acquire(self, tokens=0, priority=PRIORITY_INTERACTIVE):
+        waiter = self._enqueue(tokens, priority)
+        try:
+            while wait := self._try_acquire(waiter):
+                await asyncio.sleep(wait)
+        finally:
+            self._dequeue(waiter)
+
+    def acquire_sync(self, tokens=0, priority=PRIORITY_INTERACTIVE):
+        waiter = self._enqueue(tokens, priority)
+        try:
+            while wait := self._try_acquire(waiter):
+                time.sleep(wait)
+        finally:
+            self._dequeue(waiter)
+
+    async def run(self, call, tokens=0, priority=PRIORITY_INTERACTIVE):
+        """Await call() once there is capacity for it, retrying transient failures"""
+        attempt = 0
+        while True:
+            await self.acquire(tokens, priority)
+            try:
+                return await call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def run_sync(self, call, tokens=0, priority=PRIORITY_INTERACTIVE):
+        """Blocking version of run() for synchronous callers"""
+        attempt = 0
+        while True:
+            self.acquire_sync(tokens, priority)
+            try:
+                return call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            attempt += 1
+            time.sleep(delay)
+
+
+_shared_scheduler = None
+_shared_lock = threading.Lock()
+
+
+def shared_scheduler():
+    """The process-wide scheduler, created from settings on first use"""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = RequestScheduler.from_settings()
+        return _shared_scheduler
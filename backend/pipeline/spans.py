@@ -0,0 +1,32 @@
+from bisect import bisect_right
+
+
+class SpanIndex:
+    """Sorted index of character intervals answering overlap queries in O(log n).
+
+    Intervals are half-open (start, end) offsets into the analyzed document's
+    content. Overlapping or touching intervals are merged on construction,
+    so the starts and ends lists are both sorted and a single bisect finds
+    the only interval that can overlap a query.
+    """
+
+    def __init__(self, intervals):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            if end <= start:
+                continue
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        """True if [start, end) overlaps any indexed interval"""
+        # First interval that ends after the query starts
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
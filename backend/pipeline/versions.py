@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict
+
+from pipeline.cache import evict_lru
+
+
+def _digest(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def table_fingerprint(table_data):
+    """Fingerprint of an extracted table's headers and rows"""
+    return _digest(json.dumps([table_data.headers, table_data.columns]))
+
+
+def chunk_fingerprints(content, table_fingerprints):
+    """Fingerprint every content chunk.
+
+    Table chunks are fingerprinted by their table's content rather than the
+    chunk text (just the column names), since the table's summary is what
+    classification and section generation see. The table index is included
+    because section prompts refer to tables by number.
+    """
+    fingerprints = []
+    for chunk in content:
+        if chunk.is_table:
+            index = chunk.table_index
+            fingerprints.append(_digest("table", index, table_fingerprints[index]))
+        else:
+            fingerprints.append(_digest(chunk.role, chunk.text))
+    return fingerprints
+
+
+def section_fingerprint(chunk_fingerprints, example_content):
+    """Fingerprint of everything a section's generated text depends on"""
+    return _digest(example_content, *chunk_fingerprints)
+
+
+@dataclass
+class DocumentVersion:
+    """What is needed to re-summarize the next revision of a document incrementally.
+
+    Everything is keyed by fingerprint: table summaries by table content,
+    section labels by chunk, and generated section text by the fingerprint
+    of the section's chunks and template example. `reused` counts what the
+    run that produced this version took from the previous one.
+    """
+    version: int = 1
+    table_summaries: Dict[str, str] = field(default_factory=dict)
+    labels: Dict[str, str] = field(default_factory=dict)
+    sections: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    reused: Dict[str, int] = field(default_factory=dict)
+
+    def section_text(self, section_name, fingerprint):
+        """Previously generated text for a section, if its inputs are unchanged"""
+        section = self.sections.get(section_name)
+        if section and section["fingerprint"] == fingerprint:
+            return section["text"]
+        return None
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class VersionStore:
+    """Latest DocumentVersion of each document, one JSON file per document id.
+
+    Bounded by total size on disk like LayoutCache: past max_bytes, the
+    versions least recently read or written (by mtime) are evicted, and the
+    next upload of that document is processed from scratch.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, document_id):
+        # Ids come from clients, so never use them as file names directly
+        return os.path.join(self.directory, f"{_digest(document_id)}.json")
+
+    def get(self, document_id):
+        """The stored version for document_id, or None if there isn't one"""
+        path = self._path(document_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                version = DocumentVersion.from_dict(json.load(f))
+            os.utime(path)
+        except (OSError, ValueError, TypeError):
+            return None
+        return version
+
+    def put(self, document_id, version):
+        path = self._path(document_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(version.to_dict(), f)
+            os.replace(tmp_path, path)
+            evict_lru(self.directory, self.max_bytes)
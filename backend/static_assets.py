@@ -0,0 +1,225 @@
+"""In-memory index of the React build, served with precompressed variants.
+
+Usage (from backend/, after `npm run build`):
+
+    python -m static_assets ../frontend/build
+
+writes .gz and .br files next to every compressible build file, at the
+highest compression levels, so the API doesn't have to compress them when
+it starts. Files without them are compressed at a faster level when the
+index is built.
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from fastapi.responses import FileResponse, Response
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # Precompressed .br files are still served without it
+    brotli = None
+
+# Served in order of preference when the client accepts them
+ENCODINGS = ["br", "gzip"]
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript", "application/json", "application/manifest+json",
+    "application/xml", "image/svg+xml", "image/x-icon",
+}
+
+# Webpack and Vite put a content hash in the names of the files they emit
+# under static/ and assets/: hex after a dot (static/js/main.3f2a9c1b.js,
+# static/js/787.d3b1c2a4.chunk.js) or 8 base64 characters after a dash
+# (assets/index-Bx7kP2qd.css). The hash must contain a digit, so names like
+# vendor-bootstrap.js or app.component.js are not mistaken for one and cached
+# forever.
+HASHED_ASSET = re.compile(
+    r"^(static|assets)/.*"
+    r"(\.(?=[a-f]*[0-9])[0-9a-f]{8,}|-(?=[A-Za-z_]*[0-9])[0-9A-Za-z_]{8})"
+    r"(\.chunk)?\.[a-z0-9]+(\.map)?$"
+)
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+
+def content_type(path):
+    if path.endswith(".map"):
+        return "application/json"
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def compressible(path):
+    kind = content_type(path)
+    return kind.startswith("text/") or kind in COMPRESSIBLE_TYPES
+
+
+def compress(data, encoding, best=False):
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+    return brotli.compress(data, quality=11 if best else 5)
+
+
+def variant_etag(etag, encoding):
+    """Each encoding is a different representation, so it gets its own ETag"""
+    if encoding == "identity":
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def accepted_encodings(header):
+    """Encodings an Accept-Encoding header allows, ignoring those with q=0"""
+    accepted = set()
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class StaticAsset:
+    __slots__ = ("path", "content_type", "etag", "cache_control", "variants")
+
+    def __init__(self, path, content_type, etag, cache_control, variants):
+        self.path = path
+        self.content_type = content_type
+        self.etag = etag
+        self.cache_control = cache_control
+        # encoding ("identity", "gzip", "br") -> bytes; empty for files streamed from disk
+        self.variants = variants
+
+
+class StaticAssets:
+    """Every file under the build directories, with its ETag and compressed variants.
+
+    Built once at startup; lookups and 304s never touch the disk. Files over
+    STATIC_MAX_MEMORY_FILE_BYTES (usually source maps) are indexed but
+    streamed from disk when sent. A new frontend build needs a restart.
+    """
+
+    def __init__(self, roots):
+        # url prefix -> directory
+        self.roots = roots
+        self.assets = {}
+
+    @classmethod
+    def from_settings(cls):
+        return cls({
+            "": settings.BUILD_DIR,
+            "static/": settings.STATIC_DIR,
+            "assets/": settings.ASSETS_DIR,
+        })
+
+    def load(self):
+        """Index every file under the roots, reading and compressing it once"""
+        seen = {}
+        for prefix, directory in self.roots.items():
+            if not os.path.isdir(directory):
+                continue
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if name.endswith((".gz", ".br")):
+                        continue
+                    path = os.path.join(root, name)
+                    url = prefix + os.path.relpath(path, directory).replace(os.sep, "/")
+                    real_path = os.path.realpath(path)
+                    # static/ and assets/ are normally inside the build dir too
+                    if real_path not in seen:
+                        seen[real_path] = self._index(path, url)
+                    self.assets[url] = seen[real_path]
+        return self
+
+    def _index(self, path, url):
+        size = os.path.getsize(path)
+        cache_control = IMMUTABLE_CACHE if HASHED_ASSET.match(url) else REVALIDATE_CACHE
+        if size > settings.STATIC_MAX_MEMORY_FILE_BYTES:
+            stat = os.stat(path)
+            etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+            return StaticAsset(path, content_type(path), etag, cache_control, {})
+
+        with open(path, "rb") as f:
+            data = f.read()
+        variants = {"identity": data}
+        if compressible(path) and size >= settings.STATIC_COMPRESS_MIN_BYTES:
+            for encoding in ENCODINGS:
+                precompressed = path + SUFFIXES[encoding]
+                if os.path.isfile(precompressed):
+                    with open(precompressed, "rb") as f:
+                        variants[encoding] = f.read()
+                elif encoding != "br" or brotli is not None:
+                    variants[encoding] = compress(data, encoding)
+                # Keep a variant only if it is actually smaller
+                if encoding in variants and len(variants[encoding]) >= size:
+                    del variants[encoding]
+        etag = f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+        return StaticAsset(path, content_type(path), etag, cache_control, variants)
+
+    def get(self, url_path):
+        return self.assets.get(url_path)
+
+    def response(self, asset, headers):
+        """Response for an asset given the request headers: 304, a compressed variant, or the file"""
+        encodings = [encoding for encoding in ENCODINGS if encoding in asset.variants]
+        accepted = accepted_encodings(headers.get("accept-encoding"))
+        encoding = next((encoding for encoding in encodings if encoding in accepted), "identity")
+        etag = variant_etag(asset.etag, encoding)
+        response_headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if encodings:
+            response_headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip() for tag in if_none_match.split(",")}
+            tags |= {tag[2:] for tag in tags if tag.startswith("W/")}
+            if "*" in tags or etag in tags:
+                return Response(status_code=304, headers=response_headers)
+
+        if not asset.variants:
+            return FileResponse(asset.path, media_type=asset.content_type, headers=response_headers)
+
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return Response(asset.variants[encoding], media_type=asset.content_type, headers=response_headers)
+
+
+def precompress(directory, log=print):
+    """Write best-compression .gz (and .br, with brotli installed) files for a build"""
+    encodings = [encoding for encoding in ENCODINGS if encoding != "br" or brotli is not None]
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith((".gz", ".br")) or not compressible(path):
+                continue
+            if os.path.getsize(path) < settings.STATIC_COMPRESS_MIN_BYTES:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            for encoding in encodings:
+                with open(path + SUFFIXES[encoding], "wb") as f:
+                    f.write(compress(data, encoding, best=True))
+            log(f"compressed {os.path.relpath(path, directory)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompress a frontend build for static_assets")
+    parser.add_argument("directory", nargs="?", default=settings.BUILD_DIR)
+    args = parser.parse_args(argv)
+    if brotli is None:
+        print("brotli is not installed, writing .gz files only")
+    precompress(args.directory)
+
+
+if __name__ == "__main__":
+    main()
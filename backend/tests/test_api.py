@@ -0,0 +1,99 @@
+import io
+import os
+import zipfile
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config import settings
+from pipeline import clients
+from pipeline.fakes import FakeAsyncAzureOpenAI, FakeDocumentIntelligenceClient, make_text_pdf, synthetic_pages
+
+FORM = {'type': 'Report', 'summary_type': 'brief'}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """The app on fake Azure clients, with empty caches so every request does real work"""
+    monkeypatch.setattr(clients, 'create_document_client', FakeDocumentIntelligenceClient)
+    monkeypatch.setattr(clients, 'create_openai_client', FakeAsyncAzureOpenAI)
+    monkeypatch.setattr(settings, 'LAYOUT_CACHE_DIR', '')
+    monkeypatch.setattr(settings, 'RESPONSE_CACHE_DB', None)
+    monkeypatch.setattr(settings, 'VERSION_STORE_DIR', str(tmp_path / 'versions'))
+    with TestClient(main.app) as client:
+        yield client
+
+
+def upload(paragraphs=10, tables=1):
+    pdf = make_text_pdf(synthetic_pages(paragraphs, tables))
+    return {'file': ('report.pdf', pdf, 'application/pdf')}
+
+
+def test_large_tables_come_back_as_a_named_zip(client, monkeypatch):
+    monkeypatch.setattr(settings, 'DOCX_TABLE_ATTACHMENT_ROWS', 2)
+
+    response = client.post('/generate_summary', files=upload(), data=FORM,
+                           headers={'Origin': 'http://localhost:3000'})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/zip'
+    assert response.headers['content-disposition'] == 'attachment; filename="generated_summary.zip"'
+    # The frontend can only read the filename if CORS exposes the header
+    assert 'content-disposition' in response.headers['access-control-expose-headers'].lower()
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+    assert 'generated_summary.docx' in names and any(name.endswith('.csv') for name in names)
+
+
+def test_generate_summary_does_not_keep_the_finished_job(client):
+    response = client.post('/generate_summary', files=upload(), data=FORM)
+
+    assert response.status_code == 200
+    assert main.job_manager.jobs == {}
+
+
+def test_uploads_missing_a_required_field_are_rejected(client):
+    response = client.post('/jobs', files=upload(), data={'type': 'Report'})
+
+    assert response.status_code == 422
+    assert main.job_manager.jobs == {}
+
+
+def test_oversized_content_length_is_rejected_before_the_upload(client, monkeypatch):
+    monkeypatch.setattr(settings, 'MAX_UPLOAD_BYTES', 1024)
+
+    response = client.post('/generate_summary', files=upload(), data=FORM)
+
+    assert response.status_code == 413
+    assert main.job_manager.jobs == {}
+
+
+def test_oversized_streamed_upload_stops_reading_at_the_limit(client, monkeypatch):
+    # A chunked body has no Content-Length, so the limit is enforced while reading
+    monkeypatch.setattr(settings, 'MAX_UPLOAD_BYTES', 64 * 1024)
+    sent = []
+
+    async def body():
+        yield (b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="big.pdf"\r\n'
+               b'Content-Type: application/pdf\r\n\r\n')
+        for _ in range(100):
+            sent.append(1)
+            yield b'x' * 16 * 1024
+
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as http:
+            return await http.post('/generate_summary', content=body(),
+                                   headers={'Content-Type': 'multipart/form-data; boundary=boundary'})
+
+    os.makedirs(main.JOBS_DIR, exist_ok=True)
+    workdirs = set(os.listdir(main.JOBS_DIR))
+    response = client.portal.call(post)
+
+    assert response.status_code == 413
+    assert len(sent) < 10
+    # Nothing of the partial upload is left behind
+    assert main.job_manager.jobs == {}
+    assert set(os.listdir(main.JOBS_DIR)) == workdirs
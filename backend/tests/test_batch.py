@@ -0,0 +1,54 @@
+import pytest
+
+from config import settings
+from pipeline import batch
+from pipeline.batch import BatchOptions, Checkpoint, create_batch_processor, discover_inputs, run_batch
+from pipeline.fakes import FakeAzureOpenAI, FakeDocumentIntelligenceClient, make_text_pdf, synthetic_pages
+from pipeline.pipeline import DocumentProcessor
+
+
+def test_batch_writes_outputs_and_resumes_from_checkpoint(tmp_path):
+    source = tmp_path / 'filings'
+    (source / '2024').mkdir(parents=True)
+    for name in ('a.pdf', '2024/b.pdf', 'broken.pdf'):
+        pages = synthetic_pages(paragraphs=10, tables=1, seed=len(name))
+        (source / name).write_bytes(make_text_pdf(pages) if name != 'broken.pdf' else b'not a pdf')
+    (source / 'notes.txt').write_text('ignored')
+    output = tmp_path / 'out'
+
+    doc_client = FakeDocumentIntelligenceClient()
+    processor = DocumentProcessor(doc_client, FakeAzureOpenAI())
+    inputs = discover_inputs(str(source))
+    assert [name for _, name in inputs] == ['2024/b', 'a', 'broken']
+
+    totals = run_batch(inputs, str(output), BatchOptions(), workers=0, processor=processor, log=lambda _: None)
+    assert (totals['ok'], totals['failed'], totals['skipped']) == (2, 1, 0)
+    assert (output / '2024' / 'b.docx').exists() and (output / 'a.json').exists()
+
+    # Finished documents are skipped on the next run; the failed one is retried
+    (source / 'broken.pdf').write_bytes(make_text_pdf(synthetic_pages(paragraphs=5, tables=0)))
+    totals = run_batch(inputs, str(output), BatchOptions(formats=('json',)), workers=0,
+                       processor=processor, log=lambda _: None)
+    assert (totals['ok'], totals['failed'], totals['skipped']) == (1, 0, 2)
+    assert doc_client.calls == 3
+    assert len(Checkpoint(str(output / 'checkpoint.jsonl')).completed) == 3
+
+
+def test_worker_quotas_add_up_to_the_global_quota(monkeypatch):
+    monkeypatch.setattr(batch, 'create_document_client', FakeDocumentIntelligenceClient)
+    monkeypatch.setattr(batch, 'create_sync_openai_client', FakeAzureOpenAI)
+    monkeypatch.setattr(settings, 'LAYOUT_CACHE_DIR', None)
+    monkeypatch.setattr(settings, 'RESPONSE_CACHE_DB', None)
+    monkeypatch.setattr(settings, 'OPENAI_REQUESTS_PER_MINUTE', 3)
+    monkeypatch.setattr(settings, 'OPENAI_TOKENS_PER_MINUTE', 0)
+
+    # More workers than requests per minute would round some shares down to 0 (unlimited)
+    assert batch.quota_workers(8) == 3
+    with pytest.raises(ValueError):
+        create_batch_processor(workers=8)
+
+    monkeypatch.setattr(settings, 'OPENAI_REQUESTS_PER_MINUTE', 10)
+    schedulers = [create_batch_processor(workers=4, index=i).scheduler for i in range(4)]
+
+    assert [s.requests.capacity for s in schedulers] == [3, 3, 2, 2]
+    assert all(s.tokens.capacity == 0 for s in schedulers)
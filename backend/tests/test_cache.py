@@ -0,0 +1,90 @@
+import time
+
+from pipeline.cache import LayoutCache, ResponseCache, file_sha256
+from pipeline.content import Chunk, Table
+from pipeline.versions import DocumentVersion, VersionStore
+
+
+def test_layout_cache_hits_misses_and_lru_eviction(tmp_path):
+    cache = LayoutCache(str(tmp_path / 'layout'), max_bytes=2500)
+    content = [Chunk('x' * 1000)]
+
+    assert cache.get('a') is None
+    cache.set('a', content, [])
+    time.sleep(0.01)
+    cache.set('b', content, [])
+    time.sleep(0.01)
+    # Touch 'a' so 'b' becomes the least recently used entry
+    assert cache.get('a') == (content, [])
+    time.sleep(0.01)
+    cache.set('c', content, [])
+
+    assert cache.get('b') is None
+    assert cache.get('c') == (content, [])
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 2, 2)
+
+
+def test_version_store_evicts_least_recently_used_documents(tmp_path):
+    store = VersionStore(str(tmp_path / 'versions'), max_bytes=2500)
+    version = DocumentVersion(sections={'Water': {'fingerprint': 'f', 'text': 'x' * 900}})
+
+    store.put('a', version)
+    time.sleep(0.01)
+    store.put('b', version)
+    time.sleep(0.01)
+    # Reading 'a' makes 'b' the least recently used
+    assert store.get('a') == version
+    time.sleep(0.01)
+    store.put('c', version)
+
+    assert store.get('b') is None
+    assert store.get('a') == version and store.get('c') == version
+
+
+def test_layout_cache_round_trips_columnar_tables(tmp_path):
+    cache = LayoutCache(str(tmp_path / 'layout'), max_bytes=10 ** 6)
+    # Repeated header names used to collapse into one key per row
+    table = Table.from_rows(['Year', 'Value', 'Value'], [['2023', '1', '2'], ['2024', '3']])
+    content = [Chunk('Intro', 'title'), Chunk('Table with columns: Year, Value, Value', 'table', 0)]
+    cache.set('a', content, [table])
+
+    cached_content, cached_tables = cache.get('a')
+
+    assert cached_content == content
+    assert list(cached_tables[0].rows()) == [('2023', '1', '2'), ('2024', '3', '')]
+
+    # Entries written in the old dict layout are misses, not errors
+    (tmp_path / 'layout' / 'old.json').write_text('{"content": [{"text": "x"}], "tables": []}')
+    assert cache.get('old') is None
+
+
+def test_file_sha256_matches_for_identical_files(tmp_path):
+    first, second = tmp_path / 'one.pdf', tmp_path / 'two.pdf'
+    first.write_bytes(b'%PDF-1.7 same bytes')
+    second.write_bytes(b'%PDF-1.7 same bytes')
+    assert file_sha256(str(first)) == file_sha256(str(second))
+
+
+def test_response_cache_memory_lru_and_sqlite_tier(tmp_path):
+    db_path = str(tmp_path / 'responses.sqlite3')
+    cache = ResponseCache(max_entries=2, db_path=db_path)
+    cache.set('gpt-4o-mini', 'footer', 'Other')
+    cache.set('gpt-4o-mini', 'flood', 'Water')
+    cache.set('gpt-4o-mini', 'fire', 'Fire')
+
+    assert len(cache._memory) == 2
+    # Evicted from memory but still served by SQLite
+    assert cache.get('gpt-4o-mini', 'footer') == 'Other'
+    assert cache.get('gpt-4', 'footer') is None
+
+    reopened = ResponseCache(db_path=db_path)
+    assert reopened.get('gpt-4o-mini', 'fire') == 'Fire'
+
+
+def test_response_cache_ttl(monkeypatch):
+    cache = ResponseCache(ttl=60)
+    cache.set('gpt-4o-mini', 'prompt', 'reply')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert cache.get('gpt-4o-mini', 'prompt') is None
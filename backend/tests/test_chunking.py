@@ -0,0 +1,20 @@
+from pipeline.chunking import estimate_tokens, split_into_windows, split_text
+
+
+def test_split_into_windows_respects_budget_and_order():
+    pieces = [f'paragraph {i} ' + 'word ' * 30 for i in range(20)]
+
+    windows = split_into_windows(pieces, max_tokens=100)
+
+    assert [piece for window in windows for piece in window] == pieces
+    assert all(sum(estimate_tokens(p) for p in window) <= 100 for window in windows)
+    assert len(split_into_windows(pieces, max_tokens=10_000, max_items=8)) == 3
+
+
+def test_oversized_piece_is_split_on_whitespace():
+    text = ' '.join(f'w{i}' for i in range(500))
+
+    parts = split_text(text, max_tokens=50)
+
+    assert ' '.join(parts) == text
+    assert all(estimate_tokens(part) <= 50 for part in parts)
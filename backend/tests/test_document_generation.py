@@ -1,5 +1,7 @@
 from docx import Document as DocxDocument
+from pipeline.content import Table
 from pipeline.pipeline import Document
+from pipeline.render import build_summary_docx
 import os
 
 def test_document_generation():
@@ -12,62 +14,43 @@ def test_document_generation():
             "Other": "Miscellaneous information goes here."
         },
         tables=[
-            {
-                'headers': ['Name', 'Position', 'Department'],
-                'rows': [
-                    {'Name': 'John Doe', 'Position': 'Manager', 'Department': 'Sales'},
-                    {'Name': 'Jane Smith', 'Position': 'Engineer', 'Department': 'IT'},
+            Table.from_rows(
+                ['Name', 'Position', 'Department'],
+                [
+                    ['John Doe', 'Manager', 'Sales'],
+                    ['Jane Smith', 'Engineer', 'IT'],
                 ]
-            },
-            {
-                'headers': ['Item', 'Quantity', 'Cost'],
-                'rows': [
-                    {'Item': 'Laptop', 'Quantity': '5', 'Cost': '$5000'},
-                    {'Item': 'Printer', 'Quantity': '2', 'Cost': '$1000'},
+            ),
+            Table.from_rows(
+                ['Item', 'Quantity', 'Cost'],
+                [
+                    ['Laptop', '5', '$5000'],
+                    ['Printer', '2', '$1000'],
                 ]
-            }
+            )
         ]
     )
 
-    # Create Word document
-    doc = DocxDocument()
-    doc.add_heading('Document Summary', 0)
-    doc.add_paragraph('Summary Type: Test Summary')
-    
-    # Add document information
-    doc.add_heading('Document: test_document.pdf', level=1)
-    doc.add_paragraph('Type: Test Document')
-    
-    # Add each section to the Word document
-    for section_name, content in mock_document.sections.items():
-        doc.add_heading(section_name, level=2)
-        doc.add_paragraph(content)
-    
-    # Add tables
-    doc.add_heading('Extracted Tables', level=1)
-    for i, table_data in enumerate(mock_document.tables):
-        doc.add_heading(f'Table {i + 1}', level=2)
-        
-        # Create table in Word document
-        table = doc.add_table(rows=1, cols=len(table_data['headers']))
-        table.style = 'Table Grid'
-        
-        # Add headers
-        header_cells = table.rows[0].cells
-        for i, header in enumerate(table_data['headers']):
-            header_cells[i].text = header
-        
-        # Add data rows
-        for row_data in table_data['rows']:
-            row_cells = table.add_row().cells
-            for i, header in enumerate(table_data['headers']):
-                row_cells[i].text = row_data[header]
-    
+    # Create Word document the same way the API does
+    doc = build_summary_docx(
+        mock_document, 'test_document.pdf', 'Test Document', 'Test Summary', include_tables=True
+    )
+
     # Save the generated summary
     os.makedirs('test_output', exist_ok=True)
     output_path = 'test_output/test_summary.docx'
     doc.save(output_path)
     print(f"Test document generated at: {output_path}")
 
+    # Read it back: every section and table row should be there
+    saved = DocxDocument(output_path)
+    text = [paragraph.text for paragraph in saved.paragraphs]
+    assert 'Document: test_document.pdf' in text
+    for section_name, content in mock_document.sections.items():
+        assert section_name in text and content in text
+    assert [[cell.text for cell in row.cells] for row in saved.tables[1].rows] == [
+        ['Item', 'Quantity', 'Cost'], ['Laptop', '5', '$5000'], ['Printer', '2', '$1000']
+    ]
+
 if __name__ == "__main__":
     test_document_generation()
@@ -0,0 +1,77 @@
+import asyncio
+
+from config import settings
+from pipeline import clients
+from pipeline.cache import ResponseCache
+from pipeline.evaluation import evaluate_corpus, run_corpus
+from pipeline.fakes import (
+    FakeAsyncAzureOpenAI, FakeDocumentIntelligenceClient, make_text_pdf, synthetic_pages
+)
+from pipeline.pipeline import Document, DocumentEvaluator, DocumentProcessor, parse_score
+from pipeline.template import EXAMPLE_TEMPLATES
+
+
+def test_parse_score():
+    assert parse_score('{"score": 8, "reason": "close"}') == 8.0
+    assert parse_score('```json\n{"score": "6.5"}\n```') == 6.5
+    # Only the "score" key counts, never other numbers in the reply
+    assert parse_score('Score: 7/10') is None
+    assert parse_score('{"reason": "rated 3 of 10"}') is None
+    assert parse_score('{"score": 14}') == 10.0
+    assert parse_score('I cannot rate this.') is None
+
+
+def test_evaluator_scores_sections_concurrently_and_caches_scores():
+    openai_client = FakeAsyncAzureOpenAI(latency=0.05)
+    evaluator = DocumentEvaluator(openai_client, response_cache=ResponseCache(max_entries=100))
+    example = EXAMPLE_TEMPLATES['brief']
+    generated = Document({name: f'Generated {name}' for name in ['Water', 'Fire', 'Administrative']})
+
+    evaluation = asyncio.run(evaluator.acompare_documents(generated, example))
+
+    assert evaluation['section_scores'] == {'Water': 7.0, 'Fire': 7.0, 'Administrative': 7.0, 'Other': 0}
+    assert evaluation['overall_score'] == 21 / 4
+    assert openai_client.max_in_flight == 3
+
+    evaluator.compare_documents(generated, example)
+    assert openai_client.calls['evaluate'] == 3
+
+
+def test_evaluate_corpus_reports_per_template(tmp_path):
+    paths = []
+    for i in range(2):
+        path = tmp_path / f'doc{i}.pdf'
+        path.write_bytes(make_text_pdf(synthetic_pages(paragraphs=10, tables=1, seed=i)))
+        paths.append(str(path))
+    paths.append(str(tmp_path / 'missing.pdf'))
+    openai_client = FakeAsyncAzureOpenAI()
+    processor = DocumentProcessor(FakeDocumentIntelligenceClient(), openai_client)
+    evaluator = DocumentEvaluator(openai_client)
+
+    report = asyncio.run(evaluate_corpus(
+        processor, evaluator, paths, EXAMPLE_TEMPLATES, concurrency=2, log=lambda _: None
+    ))
+
+    assert len(report['results']) == 6
+    for summary in report['templates'].values():
+        assert (summary['documents'], summary['failures']) == (3, 1)
+        assert summary['mean_score'] == 7.0
+        assert set(summary['section_mean_scores']) == {'Water', 'Fire', 'Administrative', 'Other'}
+
+
+def test_rerunning_an_unchanged_corpus_makes_no_model_calls(tmp_path, monkeypatch):
+    path = tmp_path / 'doc.pdf'
+    path.write_bytes(make_text_pdf(synthetic_pages(paragraphs=10, tables=1)))
+    openai_client = FakeAsyncAzureOpenAI()
+    monkeypatch.setattr(clients, 'create_document_client', FakeDocumentIntelligenceClient)
+    monkeypatch.setattr(clients, 'create_openai_client', lambda: openai_client)
+    monkeypatch.setattr(settings, 'RESPONSE_CACHE_DB', str(tmp_path / 'responses.db'))
+
+    first = asyncio.run(run_corpus([str(path)], EXAMPLE_TEMPLATES, concurrency=2))
+    calls = sum(openai_client.calls.values())
+    second = asyncio.run(run_corpus([str(path)], EXAMPLE_TEMPLATES, concurrency=2))
+
+    assert calls > 0
+    assert sum(openai_client.calls.values()) == calls
+    for name, summary in second['templates'].items():
+        assert summary['mean_score'] == first['templates'][name]['mean_score']
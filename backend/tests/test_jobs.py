@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from jobs import JobManager
+from pipeline.progress import ProgressEvent
+
+
+def test_job_manager_bounds_concurrency_and_records_failures(tmp_path):
+    running = []
+    peak = []
+
+    async def work(job, value):
+        running.append(job.id)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(job.id)
+        if value == 'boom':
+            raise ValueError('bad input')
+        return value * 2
+
+    async def scenario():
+        manager = JobManager(workers=2, ttl=60)
+        await manager.start()
+        jobs = [manager.submit(manager.create(str(tmp_path)), work, v) for v in (1, 2, 'boom', 4)]
+        for job in jobs:
+            await manager.wait(job)
+        await manager.stop()
+        return jobs
+
+    jobs = asyncio.run(scenario())
+
+    assert [job.status for job in jobs] == ['succeeded', 'succeeded', 'failed', 'succeeded']
+    assert [job.result for job in jobs if job.status == 'succeeded'] == [2, 4, 8]
+    assert jobs[2].error == 'bad input'
+    assert max(peak) == 2
+
+
+def test_cancel_running_job_closes_its_event_stream(tmp_path):
+    async def work(job):
+        job.events(ProgressEvent('layout_extracted', 'started'))
+        await asyncio.sleep(10)
+
+    async def scenario():
+        manager = JobManager(workers=1, ttl=60)
+        await manager.start()
+        job = manager.submit(manager.create(str(tmp_path)), work)
+        queued = manager.submit(manager.create(str(tmp_path)), work)
+        await asyncio.sleep(0.01)
+        manager.cancel(job)
+        manager.cancel(queued)
+        seen = [event.stage async for event in job.events]
+        await manager.wait(job)
+        await manager.stop()
+        return job, queued, seen
+
+    job, queued, seen = asyncio.run(scenario())
+
+    assert (job.status, queued.status) == ('cancelled', 'cancelled')
+    assert seen == ['layout_extracted']
+
+
+def test_stop_cancels_running_jobs_and_returns(tmp_path):
+    async def work(job):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        manager = JobManager(workers=1, ttl=60)
+        await manager.start()
+        job = manager.submit(manager.create(str(tmp_path)), work)
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(manager.stop(), timeout=1)
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job.status == 'cancelled'
+    assert job.finished.is_set()
+
+
+def test_expired_jobs_are_pruned_on_lookup(tmp_path):
+    async def work(job):
+        return b'result'
+
+    async def scenario():
+        manager = JobManager(workers=1, ttl=60)
+        await manager.start()
+        job = await manager.wait(manager.submit(manager.create(str(tmp_path)), work))
+        assert manager.get(job.id) is job
+        job.finished_at = time.time() - 61
+        found = manager.get(job.id)
+        await manager.stop()
+        return manager, found
+
+    manager, found = asyncio.run(scenario())
+
+    assert found is None
+    assert manager.jobs == {}
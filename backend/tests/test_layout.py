@@ -0,0 +1,48 @@
+from config import settings
+from pipeline.fakes import FakeDocumentIntelligenceClient, make_text_pdf
+from pipeline.layout import merge_layout_results
+from pipeline.pipeline import DocumentProcessor
+
+
+def make_pages(n):
+    pages = []
+    for i in range(n):
+        lines = [f'Page {i + 1} flood update', f'Fire station {i} report']
+        if i % 2 == 0:
+            lines += ['Port | Depth', f'Dock {i} | {i + 10}m']
+        lines.append(f'Closing note {i}')
+        pages.append(lines)
+    return pages
+
+
+def test_sharded_layout_matches_single_pass(tmp_path, monkeypatch):
+    pdf_path = tmp_path / 'report.pdf'
+    pdf_path.write_bytes(make_text_pdf(make_pages(7)))
+    client = FakeDocumentIntelligenceClient()
+    processor = DocumentProcessor(client, None)
+
+    monkeypatch.setattr(settings, 'LAYOUT_SHARD_PAGES', 0)
+    single = processor._analyze_layout(str(pdf_path))
+    monkeypatch.setattr(settings, 'LAYOUT_SHARD_PAGES', 2)
+    sharded = processor._analyze_layout(str(pdf_path))
+
+    assert sharded == single
+    assert client.calls == 1 + 4
+    assert len(single[1]) == 4
+
+
+def test_merged_spans_index_merged_content():
+    client = FakeDocumentIntelligenceClient()
+    pages = make_pages(5)
+    shards = [
+        (client.begin_analyze_document('prebuilt-layout', make_text_pdf(pages[first:first + 2])).result(), first)
+        for first in range(0, 5, 2)
+    ]
+
+    merged = merge_layout_results(shards)
+
+    for paragraph in merged.paragraphs:
+        span = paragraph.spans[0]
+        assert merged.content[span.offset:span.offset + span.length] == paragraph.content
+    assert [page.page_number for page in merged.pages] == [1, 2, 3, 4, 5]
+    assert merged.tables[-1].bounding_regions[0].page_number == 5
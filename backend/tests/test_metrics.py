@@ -0,0 +1,57 @@
+import asyncio
+
+from config import settings
+from pipeline.fakes import (
+    FakeAsyncAzureOpenAI, FakeDocumentIntelligenceClient, make_text_pdf, synthetic_pages
+)
+from pipeline.metrics import MetricsRegistry, Trace, metrics, tracing
+from pipeline.pipeline import DocumentProcessor
+from pipeline.template import EXAMPLE_TEMPLATES
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    registry.inc('openai_requests_total', stage='classification', model='gpt-4o-mini')
+    registry.inc('openai_requests_total', 2, stage='classification', model='gpt-4o-mini')
+    registry.observe('summary_stage_duration_seconds', 0.3, stage='layout')
+    registry.observe('summary_stage_duration_seconds', 700, stage='layout')
+
+    text = registry.render()
+
+    assert '# TYPE openai_requests_total counter' in text
+    assert 'openai_requests_total{model="gpt-4o-mini",stage="classification"} 3' in text
+    assert 'summary_stage_duration_seconds_bucket{stage="layout",le="0.25"} 0' in text
+    assert 'summary_stage_duration_seconds_bucket{stage="layout",le="0.5"} 1' in text
+    assert 'summary_stage_duration_seconds_bucket{stage="layout",le="+Inf"} 2' in text
+    assert 'summary_stage_duration_seconds_count{stage="layout"} 2' in text
+
+
+def test_trace_records_stages_calls_and_streamed_usage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SINGLE_PASS_MAX_TOKENS', 0)
+    pdf_path = tmp_path / 'synthetic.pdf'
+    pdf_path.write_bytes(make_text_pdf(synthetic_pages(paragraphs=30, tables=2)))
+    openai_client = FakeAsyncAzureOpenAI()
+    processor = DocumentProcessor(FakeDocumentIntelligenceClient(), openai_client)
+    trace = Trace()
+    before = metrics.value('openai_requests_total', stage='section_generation',
+                           endpoint='chat', model='gpt-4o-mini')
+
+    async def run():
+        with tracing(trace):
+            return await processor.aprocess_document(
+                str(pdf_path), EXAMPLE_TEMPLATES['brief'], stream_sections=True
+            )
+
+    asyncio.run(run())
+    timings = trace.to_dict()
+
+    assert list(timings['stages']) == ['layout', 'table_summaries', 'classification', 'section_generation']
+    assert timings['layout_calls'] == 1
+    assert timings['openai_calls']['table_summaries'] == 2
+    assert timings['openai_calls']['section_generation'] == 4
+    assert sum(timings['openai_calls'].values()) == sum(openai_client.calls.values())
+    # Streamed sections report usage on their final chunk
+    assert timings['prompt_tokens'] > 0 and timings['completion_tokens'] > 0
+    assert metrics.value('openai_requests_total', stage='section_generation',
+                         endpoint='chat', model='gpt-4o-mini') == before + 4
+    assert trace.server_timing().startswith('layout;dur=')
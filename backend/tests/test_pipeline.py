@@ -0,0 +1,369 @@
+import asyncio
+import json
+import random
+import re
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from config import settings
+from pipeline.fakes import (
+    FakeAzureOpenAI, FakeDocumentIntelligenceClient, make_text_pdf, synthetic_pages
+)
+from pipeline.content import Chunk, Table
+from pipeline import metrics as metrics_module
+from pipeline.metrics import MetricsRegistry, Trace, tracing
+from pipeline.pipeline import (
+    Document, DocumentProcessor, PartialStreamError, parse_section_labels, parse_sections, scheduled_chat
+)
+from pipeline.scheduler import RequestScheduler
+from pipeline.template import EXAMPLE_TEMPLATES
+
+
+def label_for(text):
+    return 'Water' if 'flood' in text else 'Fire' if 'fire' in text else 'Other'
+
+
+class FakeAsyncCompletions:
+    """Answers section prompts by keyword, with random latency"""
+
+    def __init__(self, drop_batch_items=()):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self.drop_batch_items = drop_batch_items
+
+    async def create(self, model, messages, **kwargs):
+        self.in_flight += 1
+        self.calls += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.01))
+            prompt = messages[-1]['content']
+            if 'Paragraphs:' in prompt:
+                texts = re.findall(r'\[\d+\] (.*)', prompt.split('Paragraphs:')[-1])
+                labels = [label_for(t) for i, t in enumerate(texts) if i not in self.drop_batch_items]
+                reply = json.dumps(labels)
+            else:
+                reply = label_for(prompt.split('Text:')[-1])
+            message = SimpleNamespace(content=reply)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        finally:
+            self.in_flight -= 1
+
+
+class FakeAsyncEmbeddings:
+    """Embeds text as keyword counts, one dimension per section"""
+
+    KEYWORDS = [('flood', 'water', 'port'), ('fire',), ('administrative', 'staff'), ('other', 'miscellaneous')]
+
+    async def create(self, model, input, **kwargs):
+        data = []
+        for text in input:
+            text = text.lower()
+            vector = [sum(text.count(word) for word in words) + 0.01 for words in self.KEYWORDS]
+            data.append(SimpleNamespace(embedding=vector))
+        return SimpleNamespace(data=data)
+
+
+def make_processor(max_concurrency=3, **fake_kwargs):
+    completions = FakeAsyncCompletions(**fake_kwargs)
+    openai_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=completions),
+        embeddings=FakeAsyncEmbeddings()
+    )
+    return DocumentProcessor(None, openai_client, max_concurrency=max_concurrency), completions
+
+
+def make_content(n):
+    return [
+        Chunk(f"{['flood', 'fire', 'budget'][i % 3]} paragraph {i}")
+        for i in range(n)
+    ]
+
+
+def test_classify_chunks_preserves_order_and_limit(monkeypatch):
+    monkeypatch.setattr(settings, 'CLASSIFICATION_BATCH_SIZE', 1)
+    processor, completions = make_processor(max_concurrency=3)
+
+    section_chunks = asyncio.run(processor._classify_chunks(make_content(30), []))
+
+    assert list(section_chunks) == ['Water', 'Fire', 'Other']
+    assert [c.text for c in section_chunks['Water']] == [
+        f'flood paragraph {i}' for i in range(0, 30, 3)
+    ]
+    assert completions.max_in_flight <= 3
+
+
+def test_batched_classification_falls_back_per_item(monkeypatch):
+    monkeypatch.setattr(settings, 'CLASSIFICATION_BATCH_SIZE', 10)
+    # The fake leaves the last label off every batch reply
+    processor, completions = make_processor(drop_batch_items=(9,))
+
+    section_chunks = asyncio.run(processor._classify_chunks(make_content(30), []))
+
+    assert [c.text for c in section_chunks['Water']] == [
+        f'flood paragraph {i}' for i in range(0, 30, 3)
+    ]
+    assert sum(len(chunks) for chunks in section_chunks.values()) == 30
+    # 3 batch calls plus one fallback call per batch
+    assert completions.calls == 6
+
+
+def test_parse_section_labels():
+    assert parse_section_labels('```json\n["Water", "Fire"]\n```', 2) == ['Water', 'Fire']
+    assert parse_section_labels('["Water", "Lava"]', 3) == ['Water', None, None]
+    assert parse_section_labels('Water', 2) == [None, None]
+
+
+def test_process_document_fans_out_tables_and_sections(monkeypatch):
+    # Small enough for the single-pass plan otherwise
+    monkeypatch.setattr(settings, 'SINGLE_PASS_MAX_TOKENS', 0)
+    processor, completions = make_processor(max_concurrency=4)
+    tables = [Table.from_rows(['Port', 'Depth'], [['A', '12']]) for _ in range(5)]
+    content = make_content(6) + [
+        Chunk('Table with columns: Port, Depth', role='table', table_index=i)
+        for i in range(5)
+    ]
+    monkeypatch.setattr(processor, '_extract_content', lambda pdf_path: (content, tables))
+    example = Document({'Water': 'w', 'Fire': 'f', 'Other': 'o'})
+
+    events = []
+
+    document = processor.process_document('report.pdf', example, progress=events.append)
+
+    assert list(document.sections) == ['Water', 'Fire', 'Other']
+    assert all(table.summary for table in document.tables)
+    assert completions.max_in_flight > 1
+    stages = [event.stage for event in events]
+    assert stages[0] == 'layout_extracted'
+    assert stages.count('tables_summarized') == 5
+    assert events[-1].stage == 'section_generated' and events[-1].current == 3
+
+
+def test_embedding_classifier_escalates_low_margin_chunks():
+    processor, completions = make_processor()
+    processor.embedding_classifier.min_margin = 0.2
+    content = [
+        Chunk('flood barriers at the port'),
+        Chunk('fire station equipment'),
+        Chunk('flood and fire damage'),
+    ]
+
+    section_chunks = asyncio.run(processor._classify_chunks(content, [], classifier='embedding'))
+
+    assert [c.text for c in section_chunks['Water']] == [
+        'flood barriers at the port', 'flood and fire damage'
+    ]
+    assert [c.text for c in section_chunks['Fire']] == ['fire station equipment']
+    # Only the ambiguous chunk reached the LLM
+    assert completions.calls == 1
+
+
+def test_large_sections_are_map_reduced_within_budget(monkeypatch):
+    monkeypatch.setattr(settings, 'SECTION_TOKEN_BUDGET', 200)
+    monkeypatch.setattr(settings, 'SECTION_REDUCE_FAN_OUT', 3)
+    processor, _ = make_processor()
+    prompts = []
+
+    async def fake_chat(prompt, model='gpt-4o-mini', on_delta=None):
+        prompts.append(prompt)
+        return 'partial summary ' * 20
+
+    monkeypatch.setattr(processor, '_chat', fake_chat)
+    section_content = [Chunk('flood report ' * 40) for _ in range(12)]
+
+    asyncio.run(processor._generate_section(section_content, 'example', []))
+
+    map_calls = [p for p in prompts if p.startswith('Summarize')]
+    reduce_calls = [p for p in prompts if p.startswith('Combine')]
+    assert len(map_calls) == 12
+    assert reduce_calls
+    assert prompts[-1].startswith('Generate a section')
+    assert prompts[-1].count('partial summary') <= 200 * 4 // len('partial summary ')
+
+
+def test_map_reduce_calls_share_the_section_concurrency_limit(monkeypatch):
+    monkeypatch.setattr(settings, 'SECTION_TOKEN_BUDGET', 200)
+    processor, _ = make_processor(max_concurrency=2)
+    in_flight = max_in_flight = 0
+
+    async def fake_chat(prompt, model='gpt-4o-mini', on_delta=None):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return 'partial summary'
+
+    monkeypatch.setattr(processor, '_chat', fake_chat)
+    section_chunks = {name: [Chunk('flood report ' * 40) for _ in range(6)] for name in ('Water', 'Fire', 'Other')}
+
+    asyncio.run(processor._generate_sections(section_chunks, EXAMPLE_TEMPLATES['brief'], []))
+
+    assert max_in_flight == 2
+
+
+def test_end_to_end_with_fake_azure_clients(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SINGLE_PASS_MAX_TOKENS', 0)
+    pdf_path = tmp_path / 'synthetic.pdf'
+    pdf_path.write_bytes(make_text_pdf(synthetic_pages(paragraphs=40, tables=3)))
+    doc_client = FakeDocumentIntelligenceClient()
+    openai_client = FakeAzureOpenAI()
+
+    document = DocumentProcessor(doc_client, openai_client).process_document(
+        str(pdf_path), EXAMPLE_TEMPLATES['brief']
+    )
+
+    assert set(document.sections) == {'Water', 'Fire', 'Administrative', 'Other'}
+    assert len(document.tables) == 3
+    assert openai_client.calls['table_summary'] == 3
+    assert openai_client.calls['section'] == 4
+
+
+def test_revision_reprocesses_only_changed_chunks_and_sections(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SINGLE_PASS_MAX_TOKENS', 0)
+    pages = synthetic_pages(paragraphs=40, tables=3)
+    first_path = tmp_path / 'v1.pdf'
+    first_path.write_bytes(make_text_pdf(pages))
+    processor = DocumentProcessor(FakeDocumentIntelligenceClient(), FakeAzureOpenAI())
+    first = processor.process_document(str(first_path), EXAMPLE_TEMPLATES['brief'])
+
+    # Reword one paragraph on the last page, keeping its topic
+    line = next(i for i, text in enumerate(pages[-1]) if text.startswith('Paragraph'))
+    pages[-1][line] = pages[-1][line].replace('item', 'revised item')
+    second_path = tmp_path / 'v2.pdf'
+    second_path.write_bytes(make_text_pdf(pages))
+    openai_client = FakeAzureOpenAI()
+    processor.openai_client = openai_client
+    second = processor.process_document(str(second_path), EXAMPLE_TEMPLATES['brief'], previous=first.version)
+
+    assert second.version.version == 2
+    assert openai_client.calls['table_summary'] == 0
+    assert openai_client.calls['classify_batch'] == 1
+    assert openai_client.calls['section'] == 1
+    assert second.version.reused == {'tables': 3, 'chunks': 42, 'sections': 3}
+    assert list(second.sections) == list(first.sections)
+
+
+def test_small_documents_are_summarized_in_one_call(tmp_path):
+    pdf_path = tmp_path / 'short.pdf'
+    pdf_path.write_bytes(make_text_pdf(synthetic_pages(paragraphs=12, tables=1)))
+    openai_client = FakeAzureOpenAI()
+    processor = DocumentProcessor(FakeDocumentIntelligenceClient(), openai_client)
+    trace = Trace()
+
+    with tracing(trace):
+        document = processor.process_document(str(pdf_path), EXAMPLE_TEMPLATES['brief'])
+
+    assert list(document.sections) == list(EXAMPLE_TEMPLATES['brief'].sections)
+    assert dict(openai_client.calls) == {'single_pass': 1}
+    plan = trace.to_dict()['plan']
+    assert plan['mode'] == 'single_pass'
+    assert plan['estimated_tokens'] <= settings.SINGLE_PASS_MAX_TOKENS
+    assert plan['openai_calls_saved'] == plan['multi_stage_calls'] - 1 > 0
+    # The one reply also labels every chunk and summarizes the table, so the
+    # next revision can be processed incrementally
+    version = document.version
+    assert document.tables[0].summary
+    assert len(version.table_summaries) == 1
+    assert len(version.labels) == 13
+    assert set(version.sections) == set(document.sections)
+
+    again = processor.process_document(str(pdf_path), EXAMPLE_TEMPLATES['brief'], previous=version)
+    assert again.sections == document.sections
+    assert again.version.reused == {'tables': 1, 'chunks': 13, 'sections': 4}
+    assert dict(openai_client.calls) == {'single_pass': 1}
+
+
+def test_streamed_sections_and_embedding_classifier_use_the_multi_stage_plan(monkeypatch):
+    processor, _ = make_processor()
+    content = make_content(6)
+    example = Document({'Water': 'w', 'Fire': 'f', 'Other': 'o'})
+
+    assert processor._plan(content, [], example)['mode'] == 'single_pass'
+    assert processor._plan(content, [], example, stream_sections=True)['mode'] == 'multi_stage'
+    assert processor._plan(content, [], example, classifier='embedding')['mode'] == 'multi_stage'
+
+
+def test_unusable_single_pass_reply_falls_back_to_multi_stage(monkeypatch):
+    processor, completions = make_processor()
+    content = make_content(6)
+    monkeypatch.setattr(processor, '_extract_content', lambda pdf_path: (content, []))
+    example = Document({'Water': 'w', 'Fire': 'f', 'Other': 'o'})
+    trace = Trace()
+
+    events = []
+
+    # The keyword fake answers the single-pass prompt with a bare section name
+    with tracing(trace):
+        document = processor.process_document('report.pdf', example, progress=events.append)
+
+    assert list(document.sections) == ['Water', 'Fire', 'Other']
+    assert trace.to_dict()['plan']['mode'] == 'multi_stage'
+    assert trace.to_dict()['plan']['fallback']
+    plans = [event.data for event in events if event.stage == 'plan_chosen']
+    assert [plan['mode'] for plan in plans] == ['single_pass', 'multi_stage']
+    assert len(document.version.labels) == 6
+    # The one failed single-pass call, then the whole multi-stage pipeline
+    assert completions.calls == 1 + trace.to_dict()['plan']['multi_stage_calls']
+
+
+def test_parse_sections_keeps_known_non_empty_sections():
+    assert parse_sections('{"sections": {"Fire": " f ", "Water": null, "Lava": "x"}}', ['Water', 'Fire']) == {
+        'Fire': 'f'
+    }
+
+
+def test_single_pass_reports_time_saved_against_multi_stage_rounds(tmp_path, monkeypatch):
+    pdf_path = tmp_path / 'short.pdf'
+    pdf_path.write_bytes(make_text_pdf(synthetic_pages(paragraphs=12, tables=1)))
+    monkeypatch.setattr(metrics_module, 'metrics', MetricsRegistry())
+    processor = DocumentProcessor(FakeDocumentIntelligenceClient(), FakeAzureOpenAI(latency=0.02))
+    single_pass_tokens = settings.SINGLE_PASS_MAX_TOKENS
+
+    def run():
+        trace = Trace()
+        with tracing(trace):
+            processor.process_document(str(pdf_path), EXAMPLE_TEMPLATES['brief'])
+        return trace.to_dict()['plan']
+
+    # Nothing to compare with until a multi-stage run has been timed
+    assert 'seconds_saved' not in run()
+    monkeypatch.setattr(settings, 'SINGLE_PASS_MAX_TOKENS', 0)
+    multi_stage = run()
+    monkeypatch.setattr(settings, 'SINGLE_PASS_MAX_TOKENS', single_pass_tokens)
+    single_pass = run()
+
+    assert multi_stage['mode'] == 'multi_stage' and single_pass['mode'] == 'single_pass'
+    assert single_pass['multi_stage_seconds_estimate'] == pytest.approx(multi_stage['seconds'], abs=0.001)
+    assert single_pass['seconds_saved'] == pytest.approx(
+        single_pass['multi_stage_seconds_estimate'] - single_pass['seconds'], abs=0.001
+    )
+    assert single_pass['seconds_saved'] > 0
+
+
+def test_streams_that_fail_after_a_delta_are_not_retried():
+    scheduler = RequestScheduler(max_retries=3, backoff_base=0.01, seed=0)
+    attempts = []
+
+    async def create(model, messages, **kwargs):
+        attempts.append(len(attempts))
+
+        async def stream():
+            # The first attempt fails before any text, the second halfway through
+            if len(attempts) > 1:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content='Floods '))], usage=None)
+            raise openai.APIConnectionError(request=httpx.Request('POST', 'https://fake-openai.invalid'))
+        return stream()
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    deltas = []
+
+    with pytest.raises(PartialStreamError):
+        asyncio.run(scheduled_chat(scheduler, client, 'prompt', 'gpt-4o-mini', 0, deltas.append))
+
+    assert len(attempts) == 2
+    assert deltas == ['Floods ']
@@ -0,0 +1,49 @@
+import io
+import zipfile
+
+import docx
+
+from config import settings
+from pipeline.content import Table
+from pipeline.pipeline import Document
+from pipeline.render import (
+    DOCX_MEDIA_TYPE, ZIP_MEDIA_TYPE, build_summary_docx, docx_bytes, summary_package
+)
+
+
+def make_table(rows, headers=('Site', 'Notes')):
+    return Table.from_rows(headers, rows)
+
+
+def test_bulk_tables_read_back_like_python_docx_tables():
+    rows = [['A & B', '<tag> "quoted"'], ['two\nlines', 'tab\there'], ['ctrl\x01char', '']]
+    document = Document({'Water': 'Floods'}, [make_table(rows)])
+
+    doc = build_summary_docx(document, 'report.pdf', 'Report', 'brief', include_tables=True)
+    table = docx.Document(io.BytesIO(docx_bytes(doc))).tables[0]
+
+    assert [cell.text for cell in table.rows[0].cells] == ['Site', 'Notes']
+    assert [[cell.text for cell in row.cells] for row in table.rows[1:]] == [
+        ['A & B', '<tag> "quoted"'], ['two\nlines', 'tab\there'], ['ctrlchar', '']
+    ]
+
+
+def test_large_tables_become_zipped_csv_attachments(monkeypatch):
+    monkeypatch.setattr(settings, 'DOCX_TABLE_ATTACHMENT_ROWS', 3)
+    small = make_table([['s', '1']])
+    large = make_table([[f'site {i}', str(i)] for i in range(5)])
+    document = Document({'Water': 'Floods'}, [small, large])
+
+    attachments = {}
+    doc = build_summary_docx(document, 'report.pdf', 'Report', 'brief', True, attachments)
+    content, media_type, filename = summary_package(docx_bytes(doc), attachments)
+
+    assert (media_type, filename) == (ZIP_MEDIA_TYPE, 'generated_summary.zip')
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        assert archive.namelist() == ['generated_summary.docx', 'table_2.csv']
+        csv_text = archive.read('table_2.csv').decode('utf-8-sig')
+        rendered = docx.Document(io.BytesIO(archive.read('generated_summary.docx')))
+    assert csv_text.splitlines()[:2] == ['Site,Notes', 'site 0,0']
+    assert len(rendered.tables) == 1
+
+    assert summary_package(b'docx', {})[1] == DOCX_MEDIA_TYPE
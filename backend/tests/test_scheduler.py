@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+from pipeline.fakes import _rate_limit_error
+from pipeline.scheduler import (
+    PRIORITY_BATCH, PRIORITY_EVALUATION, PRIORITY_INTERACTIVE, RequestScheduler
+)
+
+
+def test_rate_limits_are_retried_after_retry_after():
+    scheduler = RequestScheduler(max_retries=3, seed=0)
+    attempts = []
+
+    async def call():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise _rate_limit_error(0.05)
+        return 'ok'
+
+    assert asyncio.run(scheduler.run(call)) == 'ok'
+    assert len(attempts) == 3
+    assert attempts[1] - attempts[0] >= 0.05
+    assert attempts[2] - attempts[1] >= 0.05
+
+
+def test_gives_up_after_max_retries_and_on_other_errors():
+    scheduler = RequestScheduler(max_retries=1, seed=0)
+    calls = []
+
+    def limited():
+        calls.append(1)
+        raise _rate_limit_error(0.01)
+
+    with pytest.raises(Exception, match='Simulated rate limit'):
+        scheduler.run_sync(limited)
+    assert len(calls) == 2
+
+    def broken():
+        calls.append(1)
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        scheduler.run_sync(broken)
+    assert len(calls) == 3
+
+
+def test_requests_are_admitted_in_priority_order_within_quota():
+    # 600 requests per minute refills one request every 0.1s
+    scheduler = RequestScheduler(requests_per_minute=600)
+    scheduler.requests.level = 0
+    order = []
+
+    async def request(name, priority, delay):
+        await asyncio.sleep(delay)
+        await scheduler.acquire(priority=priority)
+        order.append(name)
+
+    async def run():
+        await asyncio.gather(
+            request('evaluation', PRIORITY_EVALUATION, 0),
+            request('batch', PRIORITY_BATCH, 0.01),
+            request('interactive', PRIORITY_INTERACTIVE, 0.02),
+        )
+
+    asyncio.run(run())
+    assert order == ['interactive', 'batch', 'evaluation']
+
+
+def test_token_quota_is_settled_with_actual_usage():
+    scheduler = RequestScheduler(tokens_per_minute=1000)
+    asyncio.run(scheduler.acquire(tokens=600))
+    assert scheduler.tokens.level == pytest.approx(400, abs=1)
+
+    scheduler.settle(estimated_tokens=600, actual_tokens=100)
+    assert scheduler.tokens.level == pytest.approx(900, abs=1)
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from pipeline.pipeline import DocumentProcessor
+from pipeline.spans import SpanIndex
+
+
+def span(offset, length):
+    return SimpleNamespace(offset=offset, length=length)
+
+
+def test_span_index_merges_and_finds_overlaps():
+    index = SpanIndex([(50, 60), (10, 20), (15, 30), (30, 35)])
+
+    assert (index.starts, index.ends) == ([10, 50], [35, 60])
+    assert index.overlaps(0, 11)
+    assert index.overlaps(34, 40)
+    assert not index.overlaps(35, 50)
+    assert index.overlaps(40, 100)
+    assert not index.overlaps(60, 70)
+
+
+def test_analyze_layout_skips_paragraphs_in_any_table_span(tmp_path):
+    cells = [
+        SimpleNamespace(row_index=0, column_index=0, content='Port '),
+        SimpleNamespace(row_index=0, column_index=1, content='Depth'),
+        SimpleNamespace(row_index=1, column_index=0, content='North'),
+        SimpleNamespace(row_index=1, column_index=1, content='12m'),
+    ]
+    # The table is split over two spans, e.g. across a page break
+    table = SimpleNamespace(row_count=2, column_count=2, cells=cells, spans=[span(20, 10), span(40, 10)])
+    paragraphs = [
+        SimpleNamespace(content='Intro', role='title', spans=[span(0, 10)]),
+        SimpleNamespace(content='Port', role=None, spans=[span(20, 4)]),
+        SimpleNamespace(content='Footer', role='pageFooter', spans=[span(31, 5)]),
+        SimpleNamespace(content='12m', role=None, spans=[span(45, 3)]),
+    ]
+    result = SimpleNamespace(paragraphs=paragraphs, tables=[table])
+    poller = SimpleNamespace(result=lambda: result)
+    doc_client = SimpleNamespace(begin_analyze_document=lambda *args, **kwargs: poller)
+    pdf_path = tmp_path / 'report.pdf'
+    pdf_path.write_bytes(b'%PDF')
+
+    content, tables = DocumentProcessor(doc_client, None)._analyze_layout(str(pdf_path))
+
+    assert [chunk.text for chunk in content] == [
+        'Intro', 'Footer', 'Table with columns: Port, Depth'
+    ]
+    assert tables[0].headers == ['Port', 'Depth']
+    assert list(tables[0].rows()) == [('North', '12m')]
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from config import settings
+from pipeline import clients
+from pipeline.fakes import FakeAsyncAzureOpenAI, FakeDocumentIntelligenceClient
+
+
+def wait_for_ready(client, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get('/ready')
+        if response.status_code == 200 or response.json()['error'] or time.monotonic() > deadline:
+            return response
+        time.sleep(0.01)
+
+
+def test_importing_the_app_skips_heavy_sdks_and_the_disk(tmp_path):
+    env = {key: value for key, value in os.environ.items() if 'AZURE' not in key and 'OPENAI' not in key}
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "import sys, main; "
+        "print(sorted(m for m in ('openai', 'azure', 'docx', 'numpy') if m in sys.modules))"
+    )
+    # Run from elsewhere: caches are created at startup, under backend/, never in the working directory
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env,
+                            cwd=str(tmp_path))
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '[]'
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_app_starts_without_credentials_and_reports_not_ready(monkeypatch):
+    monkeypatch.setattr(settings, 'AZURE_ENDPOINT', None)
+
+    with TestClient(main.app) as client:
+        response = wait_for_ready(client)
+        assert response.status_code == 503
+        assert 'AZURE_ENDPOINT' in response.json()['error']
+        assert client.get('/metrics').status_code == 200
+
+
+def test_ready_once_clients_are_warm(monkeypatch):
+    monkeypatch.setattr(clients, 'create_document_client', FakeDocumentIntelligenceClient)
+    monkeypatch.setattr(clients, 'create_openai_client', FakeAsyncAzureOpenAI)
+
+    with TestClient(main.app) as client:
+        response = wait_for_ready(client)
+        assert response.status_code == 200
+        assert response.json() == {'ready': True, 'clients': True, 'error': None}
@@ -0,0 +1,77 @@
+import gzip
+
+from fastapi.testclient import TestClient
+
+import main
+from config import settings
+from static_assets import HASHED_ASSET, IMMUTABLE_CACHE, REVALIDATE_CACHE, StaticAssets
+
+SCRIPT = b"function render() { return 'summary'; }\n" * 200
+
+
+def make_build(tmp_path):
+    build = tmp_path / 'build'
+    (build / 'static' / 'js').mkdir(parents=True)
+    (build / 'static' / 'css').mkdir()
+    (build / 'index.html').write_text('<div id="root"></div>')
+    (build / 'asset-manifest.json').write_text('{}')
+    (build / 'static' / 'js' / 'main.3f2a9c1b.js').write_bytes(SCRIPT)
+    (build / 'static' / 'css' / 'main.77c1d2e0.css').write_bytes(b'body { margin: 0; }\n' * 100)
+    # Written by `python -m static_assets` at build time and served as is
+    (build / 'static' / 'css' / 'main.77c1d2e0.css.br').write_bytes(b'precompressed')
+    return build
+
+
+def test_hashed_assets_are_compressed_cached_and_revalidated_from_memory(tmp_path):
+    build = make_build(tmp_path)
+    assets = StaticAssets({'': str(build)}).load()
+    script = assets.get('static/js/main.3f2a9c1b.js')
+
+    response = assets.response(script, {'accept-encoding': 'gzip, deflate'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['etag'] == script.etag[:-1] + '-gzip"'
+    assert response.headers['cache-control'] == IMMUTABLE_CACHE
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.body) == SCRIPT
+
+    assert 'content-encoding' not in assets.response(script, {'accept-encoding': 'gzip;q=0'}).headers
+    css = assets.get('static/css/main.77c1d2e0.css')
+    assert assets.response(css, {'accept-encoding': 'gzip, br'}).body == b'precompressed'
+    assert assets.get('index.html').cache_control == REVALIDATE_CACHE
+    assert assets.get('asset-manifest.json').cache_control == REVALIDATE_CACHE
+
+    # Conditional requests are answered from the index, even with the file gone
+    (build / 'static' / 'js' / 'main.3f2a9c1b.js').unlink()
+    not_modified = assets.response(script, {'if-none-match': f'W/{script.etag}'})
+    assert not_modified.status_code == 304
+    assert not_modified.headers['etag'] == script.etag
+    # A gzip ETag only validates the gzip representation
+    gzip_tag = response.headers['etag']
+    assert assets.response(script, {'if-none-match': gzip_tag}).status_code == 200
+    assert assets.response(script, {'if-none-match': gzip_tag, 'accept-encoding': 'gzip'}).status_code == 304
+
+
+def test_only_content_hashed_names_are_cached_forever():
+    for hashed in ('static/js/main.3f2a9c1b.js', 'static/js/787.d3b1c2a4.chunk.js',
+                   'static/css/main.77c1d2e0.css.map', 'assets/index-Bx7kP2qd.css'):
+        assert HASHED_ASSET.match(hashed), hashed
+    for plain in ('static/js/vendor-bootstrap.js', 'assets/app.component.js', 'static/js/app.facebook.js',
+                  'static/media/logo.svg', 'assets/index-Bx7kP2q.css'):
+        assert not HASHED_ASSET.match(plain), plain
+
+
+def test_app_serves_build_and_falls_back_to_index(tmp_path, monkeypatch):
+    build = make_build(tmp_path)
+    monkeypatch.setattr(settings, 'BUILD_DIR', str(build))
+    monkeypatch.setattr(settings, 'STATIC_DIR', str(build / 'static'))
+
+    with TestClient(main.app) as client:
+        script = client.get('/static/js/main.3f2a9c1b.js')
+        assert script.status_code == 200
+        assert script.content == SCRIPT
+        assert script.headers['content-type'].startswith('text/javascript')
+
+        assert client.get('/static/js/main.missing.js').status_code == 404
+        page = client.get('/reports/42')
+        assert page.text == '<div id="root"></div>'
+        assert client.get('/', headers={'if-none-match': page.headers['etag']}).status_code == 304
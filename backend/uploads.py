@@ -0,0 +1,155 @@
+"""Multipart uploads streamed straight from the request to disk.
+
+With UploadFile, Starlette spools the whole body to a temporary file before
+the endpoint runs, so a size check there comes after everything was read and
+the upload is written twice. receive_upload parses the request stream
+itself instead: a Content-Length over MAX_UPLOAD_BYTES is rejected before the
+body is read, bytes are counted as they arrive, and the file part is written
+directly to its destination.
+"""
+import os
+import tempfile
+
+from fastapi import HTTPException
+
+from config import settings
+
+try:
+    import python_multipart as multipart
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import parse_options_header
+
+TRUE_VALUES = {"true", "1", "yes", "on"}
+FALSE_VALUES = {"false", "0", "no", "off"}
+
+def too_large():
+    return HTTPException(status_code=413, detail=f"Upload exceeds {settings.MAX_UPLOAD_BYTES} bytes")
+
+class MultipartUpload:
+    """Parser callbacks that keep the form fields and write one file field to disk"""
+
+    def __init__(self, directory, file_field):
+        self.directory = directory
+        self.file_field = file_field
+        self.fields = {}
+        self.filename = None
+        self.file_location = None
+        self._file = None
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name = None
+        self._value = None
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._name = None
+        self._value = None
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options:
+            self._value = bytearray()
+        elif self._name == self.file_field and self.file_location is None:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            suffix = os.path.splitext(self.filename)[1]
+            fd, self.file_location = tempfile.mkstemp(dir=self.directory, suffix=suffix)
+            self._file = os.fdopen(fd, "wb")
+        # Any other file part is skipped
+
+    def on_part_data(self, data, start, end):
+        if self._file is not None:
+            self._file.write(data[start:end])
+        elif self._value is not None:
+            self._value += data[start:end]
+
+    def on_part_end(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self._value is not None:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+        if self.file_location is not None:
+            os.remove(self.file_location)
+
+async def receive_upload(request, directory, file_field="file"):
+    """Stream a multipart/form-data request, writing its file to a uniquely named file in directory.
+
+    Returns (fields, file_location, filename), fields being the other form
+    fields as strings. Raises 413 as soon as the body passes MAX_UPLOAD_BYTES,
+    without reading the rest of it.
+    """
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > settings.MAX_UPLOAD_BYTES:
+        raise too_large()
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    upload = MultipartUpload(directory, file_field)
+    parser = multipart.MultipartParser(params[b"boundary"], upload.callbacks())
+    size = 0
+    try:
+        async for chunk in request.stream():
+            # Chunked bodies have no Content-Length, so count what actually arrives
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_BYTES:
+                raise too_large()
+            parser.write(chunk)
+        parser.finalize()
+        if upload.file_location is None:
+            raise HTTPException(status_code=422, detail=f"Missing file field: {file_field}")
+    except MultipartParseError as e:
+        upload.discard()
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+    except BaseException:
+        upload.discard()
+        raise
+    return upload.fields, upload.file_location, upload.filename
+
+def required_field(fields, name):
+    value = fields.get(name)
+    if not value:
+        raise HTTPException(status_code=422, detail=f"Missing form field: {name}")
+    return value
+
+def bool_field(fields, name, default):
+    value = fields.get(name)
+    if value is None:
+        return default
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise HTTPException(status_code=422, detail=f"Form field {name} must be a boolean")
@@ -24,5 +24,7 @@ echo "=== Setting up backend ==="
 cd ../backend
 echo "Installing Python dependencies..."
 pip install -r requirements.txt
+echo "Precompressing frontend build..."
+python -m static_assets ../frontend/build
 
 echo "=== Build completed successfully ==="
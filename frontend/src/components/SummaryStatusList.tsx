@@ -7,6 +7,7 @@ interface SummaryRequest {
   id: string;
   status: 'processing' | 'complete' | 'error';
   downloadUrl: string | null;
+  filename: string | null;
 }
 
 interface SummaryStatusListProps {
@@ -14,10 +15,10 @@ interface SummaryStatusListProps {
 }
 
 const SummaryStatusList: React.FC<SummaryStatusListProps> = ({ requests }) => {
-  const downloadSummary = (url: string) => {
+  const downloadSummary = (url: string, filename: string | null) => {
     const link = document.createElement('a');
     link.href = url;
-    link.download = 'summary.docx';
+    link.download = filename || 'summary.docx';
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
@@ -37,7 +38,7 @@ const SummaryStatusList: React.FC<SummaryStatusListProps> = ({ requests }) => {
                 <Loader2 className="h-4 w-4 animate-spin" />
               )}
               {request.status === 'complete' && request.downloadUrl && (
-                <Button onClick={() => downloadSummary(request.downloadUrl!)}>
+                <Button onClick={() => downloadSummary(request.downloadUrl!, request.filename)}>
                   Download
                 </Button>
               )}
@@ -22,12 +22,24 @@ interface SummaryRequest {
   id: string;
   status: "processing" | "complete" | "error";
   downloadUrl: string | null;
+  filename: string | null;
 }
 
 interface SummaryOptions {
   includeTables: boolean;
 }
 
+// The summary is a .docx, or a .zip of it and CSV files for very large tables
+const responseFilename = (response: Response): string => {
+  const disposition = response.headers.get("Content-Disposition") || "";
+  const match = disposition.match(/filename="?([^";]+)"?/);
+  if (match) {
+    return match[1];
+  }
+  const contentType = response.headers.get("Content-Type") || "";
+  return contentType.startsWith("application/zip") ? "summary.zip" : "summary.docx";
+};
+
 const DocumentUpload: React.FC<{
   onFileUpload: (event: React.ChangeEvent<HTMLInputElement>) => void;
 }> = ({ onFileUpload }) => (
@@ -135,6 +147,7 @@ const Summary: React.FC = () => {
     "idle" | "uploading" | "processing" | "complete" | "error"
   >("idle");
   const [downloadUrl, setDownloadUrl] = useState<string | null>(null);
+  const [downloadFilename, setDownloadFilename] = useState<string>("summary.docx");
   const [summaryRequests, setSummaryRequests] = useState<SummaryRequest[]>([]);
   const [summaryOptions, setSummaryOptions] = useState<SummaryOptions>({
     includeTables: true,
@@ -176,6 +189,7 @@ const Summary: React.FC = () => {
       id: requestId,
       status: "processing",
       downloadUrl: null,
+      filename: null,
     };
     setSummaryRequests([...summaryRequests, newRequest]);
 
@@ -200,11 +214,14 @@ const Summary: React.FC = () => {
 
       const blob = await response.blob();
       const url = window.URL.createObjectURL(blob);
+      const filename = responseFilename(response);
+      setDownloadUrl(url);
+      setDownloadFilename(filename);
 
       setSummaryRequests((prevRequests) =>
         prevRequests.map((req) =>
           req.id === requestId
-            ? { ...req, status: "complete", downloadUrl: url }
+            ? { ...req, status: "complete", downloadUrl: url, filename }
             : req,
         ),
       );
@@ -217,7 +234,7 @@ const Summary: React.FC = () => {
       setSummaryRequests((prevRequests) =>
         prevRequests.map((req) =>
           req.id === requestId
-            ? { ...req, status: "error", downloadUrl: null }
+            ? { ...req, status: "error", downloadUrl: null, filename: null }
             : req,
         ),
       );
@@ -232,7 +249,7 @@ const Summary: React.FC = () => {
     if (downloadUrl) {
       const link = document.createElement("a");
       link.href = downloadUrl;
-      link.download = "summary.docx";
+      link.download = downloadFilename;
       document.body.appendChild(link);
       link.click();
       document.body.removeChild(link);
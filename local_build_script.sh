@@ -41,6 +41,9 @@ source env/bin/activate
 echo "Installing/updating dependencies..."
 pip install -r requirements.txt
 
+# Write .gz/.br files next to the build so the server doesn't compress at startup
+python -m static_assets ../frontend/build
+
 # Add trap to handle cleanup when script is interrupted
 cleanup() {
     echo "Cleaning up..."